@@ -1,4 +1,4 @@
-from PyQt5.QtCore import QTimer, QSettings, Qt, pyqtSignal
+from PyQt5.QtCore import QBuffer, QByteArray, QIODevice, QPoint, QSize, QTimer, QSettings, Qt, pyqtSignal
 from PyQt5.QtWidgets import (
     QApplication,
     QWidget,
@@ -16,18 +16,47 @@ from PyQt5.QtWidgets import (
     QFileDialog,
     QMessageBox,
     QSplitter,
+    QInputDialog,
 )
-from PyQt5.QtGui import QPixmap, QImage, QIcon, QTextCursor
+from PyQt5.QtGui import QPixmap, QImage, QImageReader, QIcon, QTextCursor
 from yt_dlp import YoutubeDL
+from yt_dlp.utils import (
+    DownloadCancelled,
+    DownloadError,
+    download_range_func,
+    formatSeconds,
+    parse_duration,
+)
+import asyncio
+import collections
+import collections.abc
+import concurrent.futures
 import queue
-import copy
+import csv
+import functools
+import hashlib
+import hmac
+import ipaddress
+import itertools
+import json
+import select
+import contextlib
 import sys
 import os
 import subprocess
 import time
 import ctypes
 import re
-import urllib.request
+import shutil
+import socket
+import ssl
+import threading
+import types
+import urllib.parse
+import uuid
+import zlib
+from xml.etree import ElementTree
+from yt_dlp.postprocessor import get_postprocessor
 
 
 def resource_path(filename: str) -> str:
@@ -47,6 +76,174 @@ def _global_excepthook(exc_type, exc_value, exc_tb):
         traceback.print_exception(exc_type, exc_value, exc_tb, file=f)
 
 
+class Tracer:
+    MAX_EVENTS = 1_000_000
+
+    def __init__(self):
+        self.enabled = False
+        self.dropped = 0
+        self._events = []
+        self._thread_names = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._async_ids = itertools.count(1)
+
+    def start(self):
+        with self._lock:
+            self._events = []
+            self._thread_names = {}
+            self.dropped = 0
+            self._origin = time.perf_counter()
+        self.enabled = True
+
+    def stop(self, path):
+        self.enabled = False
+        with self._lock:
+            events, self._events = self._events, []
+            thread_names = dict(self._thread_names)
+        pid = os.getpid()
+        metadata = [
+            {"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "YT Media Downloader"}}
+        ]
+        metadata += [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in thread_names.items()
+        ]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+    def span(self, name, cat="job", **args):
+        if not self.enabled:
+            return _NO_SPAN
+        return self._span(name, cat, args)
+
+    @contextlib.contextmanager
+    def _span(self, name, cat, args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.complete(name, start, cat=cat, **args)
+
+    def async_span(self, name, cat="network", **args):
+        if not self.enabled:
+            return _NO_SPAN
+        return self._async_span(name, cat, args)
+
+    @contextlib.contextmanager
+    def _async_span(self, name, cat, args):
+        span_id = next(self._async_ids)
+        self._record({"name": name, "cat": cat, "ph": "b", "id": span_id, "args": args})
+        try:
+            yield
+        finally:
+            self._record({"name": name, "cat": cat, "ph": "e", "id": span_id})
+
+    def complete(self, name, start, end=None, cat="job", tid=None, **args):
+        if not self.enabled:
+            return
+        end = time.perf_counter() if end is None else end
+        self._record(
+            {
+                "name": name,
+                "cat": cat,
+                "ph": "X",
+                "ts": (start - self._origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "args": args,
+            },
+            tid,
+        )
+
+    def begin(self, name, cat="job", **args):
+        if self.enabled:
+            self._record({"name": name, "cat": cat, "ph": "B", "args": args})
+
+    def end(self, name, cat="job"):
+        if self.enabled:
+            self._record({"name": name, "cat": cat, "ph": "E"})
+
+    def counter(self, name, cat="job", **values):
+        if self.enabled:
+            self._record({"name": name, "cat": cat, "ph": "C", "args": values})
+
+    def _record(self, event, tid=None):
+        thread = threading.current_thread()
+        event["pid"] = os.getpid()
+        event["tid"] = tid or thread.ident
+        event.setdefault("ts", (time.perf_counter() - self._origin) * 1e6)
+        with self._lock:
+            if len(self._events) >= self.MAX_EVENTS:
+                self.dropped += 1
+                return
+            self._events.append(event)
+            if thread.ident not in self._thread_names:
+                self._thread_names[thread.ident] = thread.name
+
+
+_NO_SPAN = contextlib.nullcontext()
+TRACER = Tracer()
+
+
+def traced(name, cat="job"):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return fn(*args, **kwargs)
+            with TRACER.span(name, cat):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class SamplingProfiler:
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self._counts = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._counts.clear()
+        self.samples = 0
+        self._thread = threading.Thread(target=self._run, name="ytmd-profiler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+                    )
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self._counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self, path):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self._counts.most_common():
+                f.write(f"{stack} {count}\n")
+        return self.samples
+
+
 def set_windows_creation_time(path, timestamp=None):
     try:
         if os.name != "nt":
@@ -77,6 +274,2808 @@ def set_windows_creation_time(path, timestamp=None):
         return
 
 
+class YoutubeDLPool:
+    def __init__(self, base_opts, size=1):
+        self._base_opts = dict(base_opts)
+        self._size = max(1, int(size))
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._available = threading.Semaphore(self._size)
+        self._instances = []
+        self._closed = False
+        self.stats = {
+            "created": 0,
+            "reused": 0,
+            "create_time": 0.0,
+            "reuse_time": 0.0,
+        }
+
+    @property
+    def size(self):
+        return self._size
+
+    def _new_instance(self):
+        ydl = YoutubeDL(dict(self._base_opts))
+        snapshot = dict(ydl.params)
+        snapshot["outtmpl"] = dict(ydl.params.get("outtmpl") or {})
+        ydl._pool_base_params = snapshot
+        ydl._pool_selectors = {}
+        with self._lock:
+            self._instances.append(ydl)
+        return ydl
+
+    # Options yt-dlp reads per call (or that _apply re-installs). Anything else
+    # may only take effect in YoutubeDL.__init__ (cookies, proxy, headers,
+    # compat_opts), so a job that changes it gets a fresh instance instead.
+    JOB_PARAMS = frozenset(
+        [
+            "format",
+            "outtmpl",
+            "progress_hooks",
+            "postprocessor_hooks",
+            "post_hooks",
+            "postprocessors",
+            "postprocessor_args",
+            "merge_output_format",
+            "download_ranges",
+            "force_keyframes_at_cuts",
+            "ignore_no_formats_error",
+            "logger",
+            "check_formats",
+            "allow_multiple_video_streams",
+            "allow_multiple_audio_streams",
+        ]
+    )
+
+    def _reusable(self, job_opts):
+        return all(
+            key in self.JOB_PARAMS or (key in self._base_opts and self._base_opts[key] == value)
+            for key, value in job_opts.items()
+        )
+
+    # Parameters build_format_selector reads while compiling; a selector built
+    # under one job's values must not be handed to a job with different ones.
+    SELECTOR_PARAMS = ("check_formats", "allow_multiple_video_streams", "allow_multiple_audio_streams")
+
+    def _format_selector(self, ydl, format_spec):
+        if format_spec in (None, "-") or callable(format_spec):
+            return format_spec
+        # Selectors close over the instance that built them, so each pooled
+        # instance keeps its own cache instead of sharing one across the pool.
+        key = (format_spec,) + tuple(ydl.params.get(name) for name in self.SELECTOR_PARAMS)
+        selector = ydl._pool_selectors.get(key)
+        if selector is None:
+            selector = ydl._pool_selectors[key] = ydl.build_format_selector(format_spec)
+        return selector
+
+    def _apply(self, ydl, job_opts):
+        params = ydl.params
+        params.clear()
+        params.update(ydl._pool_base_params)
+        params["outtmpl"] = dict(ydl._pool_base_params["outtmpl"])
+        params.update(job_opts)
+
+        ydl._progress_hooks = []
+        ydl._postprocessor_hooks = []
+        ydl._post_hooks = []
+        ydl._pps = {when: [] for when in ydl._pps}
+        ydl._download_retcode = 0
+
+        if "outtmpl" in job_opts:
+            ydl._parse_outtmpl()
+        ydl.format_selector = self._format_selector(ydl, params.get("format"))
+
+        for pp_def_raw in params.get("postprocessors", []):
+            pp_def = dict(pp_def_raw)
+            when = pp_def.pop("when", "post_process")
+            ydl.add_post_processor(
+                get_postprocessor(pp_def.pop("key"))(ydl, **pp_def), when=when
+            )
+        for ph in params.get("progress_hooks", []):
+            ydl.add_progress_hook(ph)
+        for ph in params.get("postprocessor_hooks", []):
+            ydl.add_postprocessor_hook(ph)
+        for ph in params.get("post_hooks", []):
+            ydl.add_post_hook(ph)
+
+    @contextlib.contextmanager
+    def acquire(self, job_opts=None):
+        start = time.perf_counter()
+        self._available.acquire()
+        try:
+            if self._closed:
+                raise RuntimeError("YoutubeDL pool is closed")
+            job_opts = job_opts or {}
+            if not self._reusable(job_opts):
+                with YoutubeDL({**self._base_opts, **job_opts}) as ydl:
+                    with self._lock:
+                        self.stats["created"] += 1
+                        self.stats["create_time"] += time.perf_counter() - start
+                    yield ydl
+                return
+            try:
+                ydl = self._idle.get_nowait()
+                reused = True
+            except queue.Empty:
+                ydl = self._new_instance()
+                reused = False
+            try:
+                self._apply(ydl, job_opts)
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    if reused:
+                        self.stats["reused"] += 1
+                        self.stats["reuse_time"] += elapsed
+                    else:
+                        self.stats["created"] += 1
+                        self.stats["create_time"] += elapsed
+                yield ydl
+            finally:
+                self._idle.put(ydl)
+        finally:
+            self._available.release()
+
+    def summary(self):
+        with self._lock:
+            stats = dict(self.stats)
+        created_avg = stats["create_time"] / stats["created"] if stats["created"] else 0
+        reused_avg = stats["reuse_time"] / stats["reused"] if stats["reused"] else 0
+        return (
+            f"新建 {stats['created']} 次（平均 {created_avg * 1000:.1f} ms）、"
+            f"重用 {stats['reused']} 次（平均 {reused_avg * 1000:.1f} ms）"
+        )
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            instances = list(self._instances)
+            self._instances.clear()
+        for ydl in instances:
+            try:
+                ydl.close()
+            except Exception:
+                pass
+
+
+class ResolvedInfoCache:
+    EXPIRE_RE = re.compile(r"[?&/]expire[=/](\d+)")
+    DEFAULT_TTL = 6 * 3600
+    TRIM_KEYS = frozenset(
+        [
+            "automatic_captions",
+            "subtitles",
+            "requested_subtitles",
+            "heatmap",
+            "thumbnails",
+            "requested_formats",
+            "requested_downloads",
+        ]
+    )
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._selector_lock = threading.Lock()
+        self._selector_ydl = None
+
+    @classmethod
+    def _expires_at(cls, info):
+        stamps = []
+        for f in info.get("formats") or []:
+            for key in ("url", "manifest_url", "fragment_base_url"):
+                match = cls.EXPIRE_RE.search(f.get(key) or "")
+                if match:
+                    stamps.append(int(match.group(1)))
+        if stamps:
+            return min(stamps)
+        return (info.get("epoch") or time.time()) + cls.DEFAULT_TTL
+
+    def put(self, key, url, info, format_spec=None):
+        if not key or not info:
+            return
+        with self._lock:
+            previous = self._entries.get(key)
+        format_specs = set(previous["format_specs"]) if previous else set()
+        if format_spec:
+            format_specs.add(format_spec)
+        clean, selective = self._trim(
+            YoutubeDL.sanitize_info(
+                {k: v for k, v in info.items() if k not in self.TRIM_KEYS},
+                remove_private_keys=True,
+            ),
+            format_specs,
+        )
+        entry = {
+            "url": url,
+            "blob": zlib.compress(
+                json.dumps(clean, ensure_ascii=False, separators=(",", ":")).encode(
+                    "utf-8"
+                )
+            ),
+            "format_specs": format_specs,
+            "selective": selective,
+            "expires_at": self._expires_at(clean),
+            "resolved_at": time.time(),
+        }
+        with self._lock:
+            self._entries[key] = entry
+
+    def _trim(self, info, format_specs):
+        formats = info.get("formats") or []
+        if not format_specs or not formats:
+            return info, False
+        keep = set()
+        # The selection context documented for callable "format" params.
+        context = {
+            "has_merged_format": any(
+                "none" not in (f.get("acodec"), f.get("vcodec")) for f in formats
+            ),
+            "incomplete_formats": all(f.get("vcodec") == "none" for f in formats)
+            or all(f.get("acodec") == "none" for f in formats),
+        }
+        try:
+            with self._selector_lock:
+                if self._selector_ydl is None:
+                    self._selector_ydl = YoutubeDL({"quiet": True})
+                ydl = self._selector_ydl
+                for spec in format_specs:
+                    selector = ydl.build_format_selector(spec)
+                    for selected in selector(dict(context, formats=formats)):
+                        for part in selected.get("requested_formats") or [selected]:
+                            keep.add(part.get("format_id"))
+        except Exception:
+            return info, False
+        merged = [f for f in formats if "none" not in (f.get("acodec"), f.get("vcodec"))]
+        if merged:
+            keep.add(merged[-1].get("format_id"))
+        info["formats"] = [f for f in formats if f.get("format_id") in keep]
+        return info, True
+
+    def _decode(self, entry):
+        return json.loads(zlib.decompress(entry["blob"]))
+
+    def get(self, key, min_validity=0, format_spec=None):
+        with self._lock:
+            entry = self._entries.get(key)
+        if not entry or entry["expires_at"] - time.time() < min_validity:
+            return None
+        if entry["selective"] and format_spec not in entry["format_specs"]:
+            return None
+        return self._decode(entry)
+
+    def peek(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        return self._decode(entry) if entry else None
+
+    def expiring(self, within):
+        deadline = time.time() + within
+        with self._lock:
+            return [
+                (key, entry["url"])
+                for key, entry in self._entries.items()
+                if entry["expires_at"] < deadline
+            ]
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+
+# yt-dlp offers no public hook on the bytes it writes, so this follows the
+# .part file from the progress hook and reads each newly written range once,
+# while it is still in the page cache. Outputs that ffmpeg rewrites (merges,
+# audio fan-out, tagging) are hashed by a full read in _check_integrity.
+class StreamHasher:
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self):
+        self.streams = {}
+        self.duration = None
+        self._lock = threading.Lock()
+
+    def _entry(self, tmpfilename):
+        entry = self.streams.get(tmpfilename)
+        if entry is None:
+            entry = {
+                "hash": hashlib.sha256(),
+                "offset": 0,
+                "filename": None,
+                "size": None,
+                "expected": None,
+            }
+            self.streams[tmpfilename] = entry
+        return entry
+
+    def _consume(self, entry, path, written=None):
+        try:
+            if written is None:
+                written = os.path.getsize(path)
+            if written < entry["offset"]:
+                # yt-dlp restarted the file from scratch (no range support or
+                # a failed resume), so the bytes hashed so far are gone.
+                entry["hash"] = hashlib.sha256()
+                entry["offset"] = 0
+            with open(path, "rb") as f:
+                f.seek(entry["offset"])
+                while True:
+                    chunk = f.read(self.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    entry["hash"].update(chunk)
+                    entry["offset"] += len(chunk)
+        except OSError:
+            pass
+
+    def progress_hook(self, d):
+        status = d.get("status")
+        if status not in ("downloading", "finished"):
+            return
+        info_dict = d.get("info_dict") or {}
+        clipped = info_dict.get("section_start") is not None or info_dict.get("section_end") is not None
+        if clipped:
+            self.duration = self._clip_length(info_dict)
+        elif info_dict.get("duration"):
+            self.duration = info_dict["duration"]
+        tmpfilename = d.get("tmpfilename")
+        if not tmpfilename and d.get("filename"):
+            part_name = f"{d['filename']}.part"
+            tmpfilename = part_name if part_name in self.streams else d["filename"]
+        if not tmpfilename:
+            return
+        with self._lock:
+            entry = self._entry(tmpfilename)
+            if status == "downloading":
+                self._consume(entry, tmpfilename, d.get("downloaded_bytes"))
+                return
+            filename = d.get("filename") or tmpfilename
+            self._consume(entry, filename if os.path.exists(filename) else tmpfilename)
+            entry["filename"] = os.path.abspath(filename)
+            entry["size"] = entry["offset"]
+            # A clipped section is cut by ffmpeg, so the full format's filesize
+            # says nothing about how large the written file should be.
+            entry["expected"] = None if clipped else info_dict.get("filesize") or d.get("total_bytes")
+
+    @staticmethod
+    def _clip_length(info_dict):
+        start = info_dict.get("section_start") or 0
+        end = info_dict.get("section_end")
+        duration = info_dict.get("duration")
+        if end is None or end == float("inf"):
+            end = duration
+        elif duration:
+            end = min(end, duration)
+        if end is None or end <= start:
+            return None
+        return end - start
+
+    def size_problems(self):
+        problems = []
+        with self._lock:
+            for entry in self.streams.values():
+                expected = entry["expected"]
+                if expected and entry["size"] is not None and entry["size"] != expected:
+                    problems.append(
+                        f"{os.path.basename(entry['filename'] or '')}: "
+                        f"{entry['size']} / {expected} bytes"
+                    )
+        return problems
+
+    def relocate(self, old_path, new_path):
+        old_path = os.path.abspath(old_path)
+        with self._lock:
+            for entry in self.streams.values():
+                if entry["filename"] == old_path:
+                    entry["filename"] = os.path.abspath(new_path)
+
+    def digest_for(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            for entry in self.streams.values():
+                if entry["filename"] == path and entry["size"] == os.path.getsize(path):
+                    return entry["hash"].hexdigest()
+        return None
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(StreamHasher.CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def probe_media_duration(ffprobe_path, path):
+    try:
+        completed = subprocess.run(
+            [
+                ffprobe_path,
+                "-v",
+                "error",
+                "-show_entries",
+                "format=duration",
+                "-of",
+                "default=noprint_wrappers=1:nokey=1",
+                path,
+            ],
+            capture_output=True,
+            text=True,
+            timeout=30,
+            creationflags=0x08000000 if os.name == "nt" else 0,
+        )
+        return float(completed.stdout.strip())
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return None
+
+
+class VerifiedManifest:
+    FILENAME = ".ytmd-verified.json"
+    LOCK_TIMEOUT = 5.0
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, self.FILENAME)
+        self._lock = threading.Lock()
+        self._entries = None
+        self._mtime = None
+
+    def _load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if self._entries is None or mtime != self._mtime:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+            self._mtime = mtime
+        return self._entries
+
+    def lookup(self, key):
+        with self._lock:
+            record = self._load().get(key)
+        if not record:
+            return None
+        record = dict(record, path=os.path.join(self.directory, record["path"]))
+        try:
+            st = os.stat(record["path"])
+        except OSError:
+            return None
+        if st.st_size != record["size"] or int(st.st_mtime) != record["mtime"]:
+            return None
+        return record
+
+    def store(self, key, record):
+        try:
+            relative = os.path.relpath(record["path"], self.directory)
+        except ValueError:
+            relative = os.pardir
+        if not relative.startswith(os.pardir):
+            record = dict(record, path=relative)
+        try:
+            with self._lock, exclusive_lock_file(f"{self.path}.lock", self.LOCK_TIMEOUT):
+                entries = self._load()
+                entries[key] = record
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(entries, f, ensure_ascii=False, indent=1)
+                os.replace(tmp_path, self.path)
+                self._mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return False
+        return True
+
+
+def _same_file(a, b):
+    return (a.st_dev, a.st_ino, a.st_mtime_ns) == (b.st_dev, b.st_ino, b.st_mtime_ns)
+
+
+def _break_stale_lock(path, seen):
+    # Renaming is atomic, so only one waiter can move a given lock file away.
+    # If the file moved is not the stale one that was inspected, a fresh lock
+    # was created in between: link it back without overwriting anything.
+    grave = f"{path}.{uuid.uuid4().hex}.stale"
+    try:
+        os.rename(path, grave)
+    except OSError:
+        return
+    try:
+        if not _same_file(os.stat(grave), seen):
+            with contextlib.suppress(OSError):
+                os.link(grave, path)
+    finally:
+        with contextlib.suppress(OSError):
+            os.remove(grave)
+
+
+@contextlib.contextmanager
+def exclusive_lock_file(path, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                seen = os.stat(path)
+            except OSError:
+                continue
+            if time.time() - seen.st_mtime > timeout * 4:
+                _break_stale_lock(path, seen)
+            elif time.monotonic() > deadline:
+                raise TimeoutError(f"lock file is held: {path}")
+            else:
+                time.sleep(0.05)
+    try:
+        yield
+    finally:
+        with contextlib.suppress(OSError):
+            # Only remove the lock file if it is still ours.
+            if _same_file(os.fstat(fd), os.stat(path)):
+                os.remove(path)
+        os.close(fd)
+
+
+class DirectoryLeases:
+    DIRNAME = ".ytmd-leases"
+    TTL = 120
+    RENEW_INTERVAL = 30
+    LOCK_TIMEOUT = 5.0
+
+    def __init__(self, directory, owner):
+        self.path = os.path.join(directory, self.DIRNAME)
+        self.owner = owner
+        self._held = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._renewer = None
+
+    def _lease_path(self, key):
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:24]
+        return os.path.join(self.path, f"{digest}.lease")
+
+    def _guard(self, path):
+        # Every change to an existing lease file (break, renew, release) is
+        # made while holding its lock file, so the owner check and the write
+        # cannot interleave with another instance's.
+        return exclusive_lock_file(f"{path}.lock", self.LOCK_TIMEOUT)
+
+    def _record(self, key):
+        now = time.time()
+        return {
+            "key": key,
+            "owner": self.owner,
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "renewed": now,
+            "expires": now + self.TTL,
+        }
+
+    def _read(self, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _is_stale(self, path, record):
+        if record is not None:
+            return record.get("expires", 0) < time.time()
+        try:
+            return time.time() - os.stat(path).st_mtime > self.TTL
+        except OSError:
+            return True
+
+    def acquire(self, key):
+        path = self._lease_path(key)
+        os.makedirs(self.path, exist_ok=True)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                if not self._break(path):
+                    return False
+                continue
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._record(key), f)
+            with self._lock:
+                self._held[key] = path
+                if self._renewer is None:
+                    self._renewer = threading.Thread(target=self._renew_loop, daemon=True)
+                    self._renewer.start()
+            return True
+        return False
+
+    def _break(self, path):
+        try:
+            with self._guard(path):
+                record = self._read(path)
+                if not self._is_stale(path, record):
+                    return False
+                os.remove(path)
+        except FileNotFoundError:
+            return True
+        except OSError:
+            return False
+        return True
+
+    def holder(self, key):
+        return self._read(self._lease_path(key))
+
+    def release(self, key):
+        with self._lock:
+            path = self._held.pop(key, None)
+        if path is None:
+            return
+        try:
+            with self._guard(path):
+                record = self._read(path)
+                if record and record.get("owner") == self.owner:
+                    os.remove(path)
+        except OSError:
+            pass
+
+    def release_all(self):
+        self._stop.set()
+        for key in list(self._held):
+            self.release(key)
+
+    def _renew(self, key, path):
+        tmp_path = f"{path}.{self.owner}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._record(key), f)
+            with self._guard(path):
+                record = self._read(path)
+                if not record or record.get("owner") != self.owner:
+                    return False
+                os.replace(tmp_path, path)
+        except OSError:
+            return True
+        finally:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+        return True
+
+    def _renew_loop(self):
+        while not self._stop.wait(self.RENEW_INTERVAL):
+            with self._lock:
+                held = list(self._held.items())
+            for key, path in held:
+                if not self._renew(key, path):
+                    with self._lock:
+                        self._held.pop(key, None)
+
+
+class DiskSpaceError(Exception):
+    pass
+
+
+def _format_size(f, duration):
+    size = f.get("filesize") or f.get("filesize_approx")
+    if not size and f.get("tbr") and duration:
+        size = f["tbr"] * 125 * duration
+    return int(size or 0)
+
+
+def estimate_disk_footprint(info, is_audio, format_param, ext_param):
+    if not info:
+        return 0, 0
+    duration = info.get("duration") or 0
+    formats = info.get("formats") or []
+    audio = [
+        f for f in formats
+        if f.get("vcodec") == "none" and f.get("acodec") not in ("none", None)
+    ]
+    best_audio = max((_format_size(f, duration) for f in audio), default=0)
+
+    if is_audio:
+        raw = best_audio
+        if ext_param == "webm" and format_param == "opus":
+            return int(raw * 1.1), raw
+        bitrate = {"wav": 1411, "flac": 1000, "alac": 1000}.get(ext_param, 320)
+        output = max(raw, int(bitrate * 125 * duration))
+        return int((raw + output) * 1.1), output
+
+    max_height = int(format_param) if format_param else None
+    video = [
+        f for f in formats
+        if f.get("vcodec") not in ("none", None)
+        and f.get("height")
+        and (max_height is None or f["height"] <= max_height)
+    ]
+    video_only = [f for f in video if f.get("acodec") == "none"]
+    if video_only:
+        raw = max(_format_size(f, duration) for f in video_only) + best_audio
+    else:
+        raw = max((_format_size(f, duration) for f in video), default=0)
+    return int(raw * 2 * 1.1), raw
+
+
+class DiskReservation:
+    __slots__ = ("devices", "reserved", "written")
+
+    def __init__(self):
+        self.devices = {}
+        self.reserved = {}
+        self.written = {}
+
+    def outstanding(self, device):
+        written = sum(self.written.get(device, {}).values())
+        return max(0, self.reserved.get(device, 0) - written)
+
+
+class DiskAdmission:
+    SAFETY_MARGIN = 512 * 1024 * 1024
+    RECHECK_INTERVAL = 5.0
+
+    def __init__(self):
+        self._reservations = set()
+        self._cond = threading.Condition()
+
+    @staticmethod
+    def _existing(directory):
+        # Output folders are created lazily, so stat the nearest ancestor that
+        # exists; it is on the device the folder will be created on.
+        path = os.path.abspath(directory)
+        while not os.path.exists(path):
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+        return path
+
+    def _device(self, directory):
+        return os.stat(self._existing(directory)).st_dev
+
+    def _shortfall(self, requirements, include_reserved=True):
+        needed = {}
+        for directory, nbytes in requirements.items():
+            device = self._device(directory)
+            entry = needed.setdefault(device, [directory, 0])
+            entry[1] += nbytes
+        shortfall = {}
+        for device, (directory, nbytes) in needed.items():
+            free = shutil.disk_usage(self._existing(directory)).free
+            available = free - self.SAFETY_MARGIN
+            if include_reserved:
+                # Bytes a running job has already written are gone from
+                # ``free``; only the rest of its reservation is still owed.
+                available -= sum(r.outstanding(device) for r in self._reservations)
+            if nbytes > available:
+                shortfall[directory] = nbytes - available
+        return shortfall
+
+    def reserve(self, requirements, cancelled=lambda: False, on_wait=None):
+        requirements = {d: n for d, n in requirements.items() if n > 0}
+        with self._cond:
+            while True:
+                shortfall = self._shortfall(requirements)
+                if not shortfall:
+                    break
+                if not self._reservations or self._shortfall(requirements, False):
+                    raise DiskSpaceError(shortfall)
+                if cancelled():
+                    raise JobCancelled()
+                if on_wait:
+                    on_wait(shortfall)
+                self._cond.wait(self.RECHECK_INTERVAL)
+            reservation = DiskReservation()
+            for directory, nbytes in requirements.items():
+                device = reservation.devices[directory] = self._device(directory)
+                reservation.reserved[device] = reservation.reserved.get(device, 0) + nbytes
+            self._reservations.add(reservation)
+            return reservation
+
+    def record_written(self, reservation, directory, key, nbytes):
+        device = reservation.devices.get(directory)
+        if device is None:
+            return
+        with self._cond:
+            reservation.written.setdefault(device, {})[key] = nbytes
+
+    def release(self, reservation):
+        with self._cond:
+            self._reservations.discard(reservation)
+            self._cond.notify_all()
+
+
+@traced("fs.move", "fs")
+def commit_output_file(path, directory, name=None):
+    target = os.path.join(directory, name or os.path.basename(path))
+    if os.path.dirname(os.path.abspath(path)) == os.path.abspath(directory):
+        return path
+    os.makedirs(directory, exist_ok=True)
+    staging = f"{target}.moving"
+    try:
+        os.replace(path, target)
+        return target
+    except OSError:
+        pass
+    shutil.copy2(path, staging)
+    os.replace(staging, target)
+    os.remove(path)
+    return target
+
+
+WINDOWS_RESERVED_NAMES = frozenset(
+    ["CON", "PRN", "AUX", "NUL"]
+    + [f"{prefix}{n}" for prefix in ("COM", "LPT") for n in range(1, 10)]
+)
+
+
+class OutputPathPlanner:
+    DEFAULT_TEMPLATE = "%(title)s"
+    FALLBACK_NAME = "未命名項目"
+    MAX_COMPONENT_BYTES = 200
+    MAX_PATH_CHARS = 240
+    # Room for what jobs append to a planned base, e.g. ".source.f251.webm.part",
+    # ".tagging.m4a", ".part000.ts" or ".mp4.moving".
+    SUFFIX_CHARS = 32
+    # Zero-byte file created with O_EXCL next to each planned base, so other
+    # instances sharing the folder see the name as taken.
+    MARKER_SUFFIX = ".reserved"
+    INVALID_CHARS_RE = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+    def __init__(self):
+        self._ydl = None
+        self._lock = threading.Lock()
+        self._reserved = set()
+
+    def render(self, template, info, suffix=""):
+        template = re.sub(r"\.%\(ext\)s$", "", template or self.DEFAULT_TEMPLATE)
+        with self._lock:
+            if self._ydl is None:
+                self._ydl = YoutubeDL({"quiet": True})
+            try:
+                rendered = self._ydl.evaluate_outtmpl(template, dict(info), True)
+            except (KeyError, TypeError, ValueError):
+                rendered = self._ydl.evaluate_outtmpl(
+                    self.DEFAULT_TEMPLATE, dict(info), True
+                )
+        parts = [
+            part.strip()
+            for part in re.split(r"[\\/]", rendered)
+            if part.strip() not in ("", ".", "..")
+        ]
+        components = [self._clean(part) for part in parts] or [self.FALLBACK_NAME]
+        components[-1] = self._clean(components[-1] + suffix)
+        return components
+
+    def plan(self, requests):
+        listings = {}
+        bases = []
+        with self._lock:
+            for directory, components, disambiguator in requests:
+                folder = os.path.join(directory, *components[:-1])
+                taken = listings.get(folder)
+                if taken is None:
+                    taken = listings[folder] = self._existing_stems(folder)
+                suffixes = itertools.chain(
+                    [""],
+                    [f" [{disambiguator}]"] if disambiguator else [],
+                    (f" ({n})" for n in itertools.count(2)),
+                )
+                for suffix in suffixes:
+                    name = self._fit(folder, components[-1], suffix)
+                    base = os.path.join(folder, name)
+                    if name.casefold() in taken or self._key(base) in self._reserved:
+                        continue
+                    if self._claim(base):
+                        break
+                    taken.add(name.casefold())
+                taken.add(name.casefold())
+                self._reserved.add(self._key(base))
+                bases.append(base)
+        return bases
+
+    def release(self, base):
+        with self._lock:
+            self._reserved.discard(self._key(base))
+        with contextlib.suppress(OSError):
+            os.remove(base + self.MARKER_SUFFIX)
+
+    def _claim(self, base):
+        try:
+            os.makedirs(os.path.dirname(base), exist_ok=True)
+            fd = os.open(base + self.MARKER_SUFFIX, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        except OSError:
+            # Read-only or unreachable folder: the in-process reservation is
+            # all there is, and the download will report the real error.
+            return True
+        os.close(fd)
+        return True
+
+    def _key(self, base):
+        return os.path.normcase(os.path.abspath(base)).casefold()
+
+    def _existing_stems(self, folder):
+        stems = set()
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    parts = entry.name.casefold().split(".")
+                    for i in range(1, len(parts) + 1):
+                        stems.add(".".join(parts[:i]))
+        except OSError:
+            pass
+        return stems
+
+    def _clean(self, name):
+        name = self.INVALID_CHARS_RE.sub("_", name).strip().rstrip(". ")
+        if name.split(".", 1)[0].upper() in WINDOWS_RESERVED_NAMES:
+            name = f"_{name}"
+        return self._truncate(name, self.MAX_COMPONENT_BYTES) or "_"
+
+    def _fit(self, folder, stem, suffix):
+        limit = self.MAX_COMPONENT_BYTES - len(suffix.encode("utf-8"))
+        stem = self._truncate(stem, limit)
+        if os.name == "nt":
+            room = (
+                self.MAX_PATH_CHARS
+                - len(os.path.abspath(folder))
+                - 1
+                - len(suffix)
+                - self.SUFFIX_CHARS
+            )
+            stem = stem[: max(room, 1)].rstrip(". ")
+        return f"{stem or '_'}{suffix}"
+
+    @staticmethod
+    def _truncate(name, max_bytes):
+        encoded = name.encode("utf-8")
+        if len(encoded) <= max_bytes:
+            return name
+        return encoded[:max_bytes].decode("utf-8", "ignore").rstrip(". ")
+
+
+def parse_section(start_text, end_text, chapter=None, precise=False):
+    if not start_text and not end_text:
+        return None
+    start = parse_duration(start_text) if start_text else 0.0
+    end = parse_duration(end_text) if end_text else None
+    if start is None or (end_text and end is None):
+        raise ValueError("片段時間格式錯誤，請使用 hh:mm:ss 或秒數")
+    if end is not None and end <= start:
+        raise ValueError("片段結束時間必須晚於開始時間")
+    return {"start": start, "end": end, "chapter": chapter, "precise": precise}
+
+
+def section_label(section):
+    end = section.get("end")
+    label = f"{formatSeconds(int(section['start']))}-"
+    label += formatSeconds(int(end)) if end is not None else "end"
+    if section.get("chapter"):
+        label = f"{section['chapter']} ({label})"
+    return label
+
+
+def section_length(section, duration):
+    end = section.get("end")
+    if end is None:
+        end = duration or section["start"]
+    return max(0.0, end - section["start"])
+
+
+def _windows_process_cpu_time(pid):
+    from ctypes import wintypes
+
+    # The exited process stays queryable while Popen still holds its handle.
+    handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)
+    if not handle:
+        return None
+    creation, exit_, kernel, user = (wintypes.FILETIME() for _ in range(4))
+    try:
+        ok = ctypes.windll.kernel32.GetProcessTimes(
+            wintypes.HANDLE(handle),
+            ctypes.byref(creation),
+            ctypes.byref(exit_),
+            ctypes.byref(kernel),
+            ctypes.byref(user),
+        )
+    finally:
+        ctypes.windll.kernel32.CloseHandle(handle)
+    if not ok:
+        return None
+
+    def seconds(ft):
+        return ((ft.dwHighDateTime << 32) | ft.dwLowDateTime) / 10000000
+
+    return seconds(user), seconds(kernel)
+
+
+class TranscodeManager:
+    NICENESS = 10
+    BELOW_NORMAL_PRIORITY_CLASS = 0x00004000
+
+    def __init__(self, workers=1, on_complete=None):
+        self.cpu_count = os.cpu_count() or 1
+        self.on_complete = on_complete
+        self._lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        self._running = []
+        self.configure(workers)
+
+    def configure(self, workers):
+        with self._lock:
+            self.max_processes = max(1, min(self.cpu_count, int(workers)))
+            self.threads = max(1, self.cpu_count // self.max_processes)
+            self._slots = threading.Semaphore(self.max_processes)
+
+    def load(self):
+        with self._lock:
+            return (self.active + self.waiting) / self.max_processes
+
+    def _manages(self, args):
+        if not isinstance(args, (list, tuple)) or not args:
+            return False
+        name = os.path.basename(str(args[0])).lower()
+        return name.startswith("ffmpeg") and "-i" in args
+
+    def _prepare(self, args, kwargs):
+        args = list(args)
+        if "-threads" not in args:
+            args[-1:-1] = ["-threads", str(self.threads)]
+        if os.name == "nt":
+            kwargs["creationflags"] = (
+                kwargs.get("creationflags", 0) | self.BELOW_NORMAL_PRIORITY_CLASS
+            )
+        else:
+            prefix = []
+            if shutil.which("nice"):
+                prefix += ["nice", "-n", str(self.NICENESS)]
+            if shutil.which("ionice"):
+                prefix += ["ionice", "-c", "2", "-n", "7"]
+            args = prefix + args
+        return args, kwargs
+
+    def _children_cpu(self):
+        if os.name == "nt":
+            return None
+        import resource
+
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return usage.ru_utime, usage.ru_stime
+
+    def _begin(self):
+        queued = time.perf_counter()
+        with self._lock:
+            slots = self._slots
+            self.waiting += 1
+        slots.acquire()
+        ticket = {"slots": slots, "threads": self.threads, "tid": threading.get_ident()}
+        with self._lock:
+            self.waiting -= 1
+            self.active += 1
+            # RUSAGE_CHILDREN covers every reaped child, so a delta is only
+            # attributable to this process if no other transcode overlapped it.
+            for other in self._running:
+                other["shared"] = ticket["shared"] = True
+            self._running.append(ticket)
+            ticket["cpu_before"] = self._children_cpu()
+        ticket["start"] = time.perf_counter()
+        TRACER.complete("ffmpeg.wait_slot", queued, ticket["start"], cat="ffmpeg")
+        return ticket
+
+    def _finish(self, ticket, cpu_times, args):
+        with self._lock:
+            self._running.remove(ticket)
+            self.active -= 1
+            after = self._children_cpu()
+        ticket["slots"].release()
+        before = ticket["cpu_before"]
+        if cpu_times is None and before and after and not ticket.get("shared"):
+            cpu_times = (after[0] - before[0], after[1] - before[1])
+        TRACER.complete(
+            "ffmpeg", ticket["start"], cat="ffmpeg", tid=ticket["tid"], threads=ticket["threads"]
+        )
+        if self.on_complete:
+            wall = time.perf_counter() - ticket["start"]
+            self.on_complete(args, wall, cpu_times, ticket["threads"])
+
+    def execute(self, args, *, timeout=None, input=None, **kwargs):
+        from yt_dlp.utils import Popen
+
+        if not self._manages(args):
+            return Popen.run(args, timeout=timeout, input=input, **kwargs)
+        args, kwargs = self._prepare(args, kwargs)
+        if input is not None and kwargs.get("stdin") is None:
+            kwargs["stdin"] = subprocess.PIPE
+        text = any(kwargs.get(k) for k in ("text", "encoding", "errors", "universal_newlines"))
+        ticket = self._begin()
+        cpu_times = None
+        try:
+            with Popen(args, **kwargs) as proc:
+                stdout, stderr = proc.communicate_or_kill(input=input, timeout=timeout)
+                if os.name == "nt":
+                    cpu_times = _windows_process_cpu_time(proc.pid)
+        finally:
+            self._finish(ticket, cpu_times, args)
+        default = "" if text else b""
+        return stdout or default, stderr or default, proc.returncode
+
+    def run(self, args):
+        return self.execute(
+            args,
+            text=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            stdin=subprocess.PIPE,
+        )
+
+    def install(self):
+        # yt-dlp's ffmpeg postprocessors only call Popen.run, so that public
+        # classmethod is the one thing routed through the manager; the Popen
+        # class itself and its process handling are left untouched.
+        from yt_dlp.postprocessor import ffmpeg as ffmpeg_pp
+
+        base = ffmpeg_pp.Popen
+        if getattr(base, "_transcode_manager", None) is not None:
+            base._transcode_manager = self
+            return
+
+        class ManagedPopen(base):
+            _transcode_manager = self
+
+            @classmethod
+            def run(cls, args, **kwargs):
+                return cls._transcode_manager.execute(args, **kwargs)
+
+        ffmpeg_pp.Popen = ManagedPopen
+
+
+class AdaptiveConcurrency:
+    INTERVAL = 5.0
+    PROBE_GAIN = 1.1
+    COOLDOWN_TICKS = 6
+    CEILING_TICKS = 24
+    DECREASE_HOLD_TICKS = 2
+    THROTTLE_RE = re.compile(r"HTTP Error (?:429|403)|Too Many Requests", re.IGNORECASE)
+
+    def __init__(self, minimum=1, maximum=6, initial=1, postprocess_load=None, clock=time.monotonic):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = max(minimum, min(maximum, initial))
+        self.active = 0
+        self.waiting = 0
+        self.postprocess_load = postprocess_load or (lambda: 0.0)
+        self.clock = clock
+        self.decisions = []
+        self._cond = threading.Condition()
+        self._seen = {}
+        self._speeds = {}
+        self._bytes = 0
+        self._finished = 0
+        self._errors = 0
+        self._throttled = 0
+        self._probe = None
+        self._cooldown = 0
+        self._ceiling = None
+        self._ceiling_ticks = 0
+        self._since_decrease = self.DECREASE_HOLD_TICKS
+        self._window_start = clock()
+
+    def acquire(self):
+        with self._cond:
+            self.waiting += 1
+            try:
+                while self.active >= self.limit:
+                    self._cond.wait(0.5)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+
+    def release(self, ok=None, throttled=False):
+        with self._cond:
+            self.active -= 1
+            if ok is not None:
+                self._finished += 1
+                self._errors += 0 if ok else 1
+                self._throttled += 1 if throttled else 0
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def transfer(self):
+        self.acquire()
+        ok = throttled = None
+        try:
+            yield
+            ok = True
+        except JobCancelled:
+            raise
+        except Exception as e:
+            ok = False
+            throttled = bool(self.THROTTLE_RE.search(str(e)))
+            raise
+        finally:
+            self.release(ok=ok, throttled=bool(throttled))
+
+    def record_progress(self, key, downloaded_bytes, speed=None):
+        with self._cond:
+            previous = self._seen.get(key, 0)
+            if downloaded_bytes > previous:
+                self._bytes += downloaded_bytes - previous
+                self._seen[key] = downloaded_bytes
+            if speed:
+                self._speeds[key] = speed
+
+    def forget(self, key):
+        with self._cond:
+            self._seen.pop(key, None)
+            self._speeds.pop(key, None)
+
+    def record_throttle(self):
+        with self._cond:
+            self._throttled += 1
+
+    def _set_limit(self, limit):
+        self.limit = max(self.minimum, min(self.maximum, limit))
+        self._cond.notify_all()
+
+    def _back_off(self, previous):
+        self._probe = None
+        self._cooldown = self.COOLDOWN_TICKS
+        self._ceiling = max(self.minimum, previous - 1)
+        self._ceiling_ticks = self.CEILING_TICKS
+        self._since_decrease = 0
+        self._set_limit(previous // 2)
+
+    def tick(self, pending):
+        load = self.postprocess_load()
+        with self._cond:
+            now = self.clock()
+            elapsed = max(now - self._window_start, 1e-6)
+            throughput = self._bytes / elapsed
+            speeds = list(self._speeds.values())
+            per_job = sum(speeds) / len(speeds) if speeds else 0.0
+            errors, throttled, finished = self._errors, self._throttled, self._finished
+            self._bytes = self._errors = self._throttled = self._finished = 0
+            self._window_start = now
+            previous = self.limit
+            self._cooldown = max(0, self._cooldown - 1)
+            self._since_decrease += 1
+            self._ceiling_ticks = max(0, self._ceiling_ticks - 1)
+            if not self._ceiling_ticks:
+                self._ceiling = None
+            congested = throttled or (errors >= 2 and errors * 2 >= finished)
+            recovering = self._ceiling is not None and previous < self._ceiling
+
+            if congested and self._since_decrease <= self.DECREASE_HOLD_TICKS:
+                action, reason = "hold", "已降速，等待前次調整生效"
+            elif congested:
+                self._back_off(previous)
+                action = "decrease"
+                reason = f"節流 {throttled} 次" if throttled else f"錯誤 {errors}/{finished}"
+            elif load > 1.0 and previous > self.minimum:
+                self._probe = None
+                self._set_limit(previous - 1)
+                action, reason = "decrease", f"轉檔負載 {load:.1f}"
+            elif self._probe is not None:
+                probe_limit, probe_throughput = self._probe
+                self._probe = None
+                if throughput < probe_throughput * self.PROBE_GAIN:
+                    self._cooldown = self.COOLDOWN_TICKS
+                    self._set_limit(probe_limit)
+                    action, reason = "revert", "增加並行未提升總速度"
+                else:
+                    action, reason = "keep", "增加並行提升總速度"
+            elif recovering and pending > 0 and load < 1.0:
+                self._set_limit(previous + 1)
+                action, reason = "increase", f"回升至已知上限 {self._ceiling}"
+            elif (
+                self.active >= previous
+                and pending > 0
+                and previous < self.maximum
+                and self._ceiling is None
+                and not self._cooldown
+                and load < 1.0
+            ):
+                self._probe = (previous, throughput)
+                self._set_limit(previous + 1)
+                action, reason = "increase", "試探更高並行"
+            else:
+                action, reason = "hold", ""
+            decision = {
+                "time": now,
+                "previous": previous,
+                "limit": self.limit,
+                "active": self.active,
+                "throughput": throughput,
+                "per_job": per_job,
+                "errors": errors,
+                "throttled": throttled,
+                "load": load,
+                "action": action,
+                "reason": reason,
+            }
+            self.decisions.append(decision)
+        TRACER.counter("concurrency", limit=self.limit, active=decision["active"])
+        TRACER.counter(
+            "throughput_mbps",
+            total=round(throughput / 1e6, 3),
+            per_job=round(per_job / 1e6, 3),
+        )
+        return decision
+
+    def sparkline(self, key, width=60):
+        values = [d[key] for d in self.decisions[-width:]]
+        if not values:
+            return ""
+        top = max(values) or 1
+        bars = "▁▂▃▄▅▆▇█"
+        return "".join(bars[min(len(bars) - 1, int(v / top * (len(bars) - 1)))] for v in values)
+
+
+class ThrottleLogger:
+    ANSI_RE = re.compile(r"\x1b\[[0-9;]*m")
+
+    # Per-file progress lines; the batch progress bar already covers them.
+    PROGRESS_RE = re.compile(r"^\r?\[download\]\s+[\d.]+%")
+
+    def __init__(self, on_throttle, log):
+        self.on_throttle = on_throttle
+        self.log = log
+
+    def _observe(self, msg):
+        msg = self.ANSI_RE.sub("", msg or "")
+        if AdaptiveConcurrency.THROTTLE_RE.search(msg):
+            self.on_throttle()
+        return msg
+
+    def debug(self, msg):
+        msg = self._observe(msg)
+        if msg and not self.PROGRESS_RE.match(msg):
+            self.log(f"[yt-dlp] {msg}", "info")
+
+    info = debug
+
+    def warning(self, msg):
+        self.log(f"[yt-dlp] WARNING: {self._observe(msg)}", "info")
+
+    def error(self, msg):
+        # _download_planned_job reports the failure itself.
+        self._observe(msg)
+
+
+class ExtractionTimeout(DownloadCancelled):
+    msg = "解析逾時"
+
+
+class ExtractionDeadline:
+    # asyncio.wait_for cannot stop an executor thread, so an extraction checks
+    # its deadline whenever yt-dlp reports a step and gives up once it passed.
+    # DownloadCancelled is the one exception yt-dlp passes through untouched.
+    def __init__(self, timeout):
+        self.deadline = time.monotonic() + timeout
+
+    def debug(self, msg):
+        if time.monotonic() > self.deadline:
+            raise ExtractionTimeout()
+
+    info = debug
+
+    def warning(self, msg):
+        self.debug(msg)
+        print(f"WARNING: {msg}", file=sys.stderr)
+
+    def error(self, msg):
+        print(msg, file=sys.stderr)
+
+
+AUDIO_TARGETS = {
+    "mp3": ("mp3", ["-c:a", "libmp3lame", "-q:a", "0"]),
+    "opus": ("opus", ["-c:a", "libopus", "-b:a", "160k"]),
+    "aac": ("m4a", ["-c:a", "aac", "-b:a", "256k"]),
+    "m4a": ("m4a", ["-c:a", "aac", "-b:a", "256k"]),
+    "vorbis": ("ogg", ["-c:a", "libvorbis", "-q:a", "6"]),
+    "flac": ("flac", ["-c:a", "flac"]),
+    "alac": ("m4a", ["-c:a", "alac"]),
+    "wav": ("wav", ["-c:a", "pcm_s16le"]),
+}
+LOUDNORM_TARGET = "I=-16:TP=-1.5:LRA=11"
+
+
+def parse_audio_targets(text):
+    targets = []
+    for name in re.split(r"[\s,+]+", (text or "").strip().lower()):
+        if not name:
+            continue
+        if name not in AUDIO_TARGETS:
+            raise ValueError(f"不支援的音訊輸出格式：{name}")
+        ext = AUDIO_TARGETS[name][0]
+        if any(AUDIO_TARGETS[t][0] == ext for t in targets):
+            raise ValueError(f"多個輸出格式使用相同副檔名：{ext}")
+        targets.append(name)
+    return targets
+
+
+def single_audio_target(format_param, ext_param):
+    for name in (ext_param, format_param):
+        if name in AUDIO_TARGETS:
+            return name
+    return "m4a"
+
+
+def parse_loudnorm_stats(stderr):
+    start = stderr.rfind("{")
+    end = stderr.rfind("}")
+    if start < 0 or end < start:
+        return None
+    try:
+        stats = json.loads(stderr[start : end + 1])
+    except ValueError:
+        return None
+    return (
+        f"{LOUDNORM_TARGET}:measured_I={stats['input_i']}"
+        f":measured_TP={stats['input_tp']}:measured_LRA={stats['input_lra']}"
+        f":measured_thresh={stats['input_thresh']}"
+        f":offset={stats['target_offset']}:linear=true"
+    )
+
+
+COVER_ART_CONTAINERS = frozenset(["mp3", "m4a", "mp4", "m4v", "mov", "flac", "mkv", "mka"])
+
+
+def ffmetadata_text(metadata, chapters):
+    def escape(value):
+        return re.sub(r"([=;#\\\n])", r"\\\1", str(value))
+
+    lines = [";FFMETADATA1"]
+    lines += [f"{key}={escape(value)}" for key, value in metadata.items() if value]
+    for chapter in chapters:
+        lines += [
+            "[CHAPTER]",
+            "TIMEBASE=1/1000",
+            f"START={int(chapter['start_time'] * 1000)}",
+            f"END={int(chapter['end_time'] * 1000)}",
+            f"title={escape(chapter.get('title') or '')}",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+class PostDownloadContext:
+    __slots__ = ("path", "info", "clipped", "metadata", "chapters", "cover", "timings", "notes")
+
+    def __init__(self, path, info, clipped=False):
+        self.path = path
+        self.info = info
+        self.clipped = clipped
+        self.metadata = {}
+        self.chapters = []
+        self.cover = None
+        self.timings = []
+        self.notes = []
+
+    @property
+    def ext(self):
+        return os.path.splitext(self.path)[1][1:].lower()
+
+    @property
+    def dirty(self):
+        return bool(self.metadata or self.chapters or self.cover)
+
+
+class TagStep:
+    name = "tags"
+    label = "標籤"
+    touches_file = False
+
+    def run(self, ctx):
+        info = ctx.info
+        upload_date = info.get("upload_date") or ""
+        if re.fullmatch(r"\d{8}", upload_date):
+            upload_date = f"{upload_date[:4]}-{upload_date[4:6]}-{upload_date[6:]}"
+        ctx.metadata.update(
+            {
+                "title": info.get("track") or info.get("title"),
+                "artist": info.get("artist") or info.get("uploader") or info.get("channel"),
+                "album": info.get("album"),
+                "date": upload_date,
+                "comment": info.get("webpage_url"),
+                "description": info.get("description"),
+            }
+        )
+        ctx.metadata = {key: value for key, value in ctx.metadata.items() if value}
+        if not ctx.clipped:
+            ctx.chapters = [
+                chapter
+                for chapter in info.get("chapters") or []
+                if chapter.get("end_time") is not None
+            ]
+
+
+class ArtworkStep:
+    name = "artwork"
+    label = "封面"
+    touches_file = False
+
+    def __init__(self, fetch):
+        self.fetch = fetch
+
+    def run(self, ctx):
+        if ctx.ext not in COVER_ART_CONTAINERS:
+            ctx.notes.append(f"{ctx.ext} 不支援嵌入封面")
+            return
+        video_id = ctx.info.get("id")
+        if video_id:
+            ctx.cover = self.fetch(video_id)
+
+
+class LibraryStep:
+    name = "library"
+    label = "移入媒體庫"
+    touches_file = True
+
+    def __init__(self, root, template, planner):
+        self.root = root
+        self.template = template
+        self.planner = planner
+
+    def run(self, ctx):
+        directory = os.path.join(self.root, *self.planner.render(self.template, ctx.info))
+        if os.path.dirname(os.path.abspath(ctx.path)) == os.path.abspath(directory):
+            return
+        stem, ext = os.path.splitext(os.path.basename(ctx.path))
+        (base,) = self.planner.plan([(directory, [stem], ctx.info.get("id"))])
+        try:
+            ctx.path = commit_output_file(ctx.path, directory, os.path.basename(base) + ext)
+        finally:
+            self.planner.release(base)
+
+
+class FFmpegTagWriter:
+    def __init__(self, transcode_manager, ffmpeg_path, ffprobe_path):
+        self.transcode_manager = transcode_manager
+        self.ffmpeg_path = ffmpeg_path
+        self.ffprobe_path = ffprobe_path
+
+    def _stream_count(self, path):
+        try:
+            completed = subprocess.run(
+                [
+                    self.ffprobe_path(),
+                    "-v",
+                    "error",
+                    "-show_entries",
+                    "stream=index",
+                    "-of",
+                    "csv=p=0",
+                    path,
+                ],
+                capture_output=True,
+                text=True,
+                timeout=30,
+                creationflags=0x08000000 if os.name == "nt" else 0,
+            )
+        except (OSError, subprocess.SubprocessError):
+            return None
+        if completed.returncode != 0:
+            return None
+        return len(completed.stdout.split())
+
+    def command(self, ctx, metadata_path, cover_path, output, stream_count):
+        cmd = [
+            self.ffmpeg_path(),
+            "-y",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-i",
+            f"file:{ctx.path}",
+            "-i",
+            f"file:{metadata_path}",
+        ]
+        maps = ["-map", "0", "-map_metadata", "1", "-map_chapters", "1"]
+        if cover_path and ctx.ext in ("mkv", "mka"):
+            maps += [
+                "-attach",
+                cover_path,
+                f"-metadata:s:{stream_count}",
+                "mimetype=image/jpeg",
+                f"-metadata:s:{stream_count}",
+                "filename=cover.jpg",
+            ]
+        elif cover_path:
+            cmd += ["-i", f"file:{cover_path}"]
+            maps += ["-map", "2", f"-disposition:{stream_count}", "attached_pic"]
+            if ctx.ext == "mp3":
+                maps += ["-id3v2_version", "3"]
+        return cmd + maps + ["-c", "copy", f"file:{output}"]
+
+    def write(self, ctx):
+        base, ext = os.path.splitext(ctx.path)
+        output = f"{base}.tagging{ext}"
+        metadata_path = f"{base}.ffmeta"
+        cover_path = f"{base}.cover.jpg" if ctx.cover else None
+        stream_count = self._stream_count(ctx.path) if cover_path else None
+        if cover_path and stream_count is None:
+            ctx.notes.append("無法讀取串流資訊，略過封面")
+            cover_path = None
+        try:
+            with open(metadata_path, "w", encoding="utf-8") as f:
+                f.write(ffmetadata_text(ctx.metadata, ctx.chapters))
+            if cover_path:
+                with open(cover_path, "wb") as f:
+                    f.write(ctx.cover)
+            _, stderr, returncode = self.transcode_manager.run(
+                self.command(ctx, metadata_path, cover_path, output, stream_count)
+            )
+            if returncode != 0:
+                lines = (stderr or "").strip().splitlines()
+                raise RuntimeError(f"ffmpeg 寫入標籤失敗：{lines[-1] if lines else returncode}")
+            os.replace(output, ctx.path)
+        finally:
+            for leftover in (output, metadata_path, cover_path):
+                if leftover:
+                    with contextlib.suppress(OSError):
+                        os.remove(leftover)
+        ctx.metadata, ctx.chapters, ctx.cover = {}, [], None
+
+
+class PostDownloadPipeline:
+    def __init__(self, writer, max_workers=2):
+        self.writer = writer
+        self.steps = {}
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers, thread_name_prefix="post-download"
+        )
+
+    def register(self, step):
+        self.steps[step.name] = step
+
+    def submit(self, path, info, step_names, clipped=False):
+        steps = [self.steps[name] for name in step_names if name in self.steps]
+        return self._executor.submit(self._run, path, info, steps, clipped)
+
+    def _timed(self, ctx, name, label, fn):
+        start = time.perf_counter()
+        try:
+            fn(ctx)
+        except Exception as e:
+            ctx.notes.append(f"{label}失敗：{e}")
+            if name == "write":
+                ctx.metadata, ctx.chapters, ctx.cover = {}, [], None
+        finally:
+            TRACER.complete(f"post.{name}", start, cat="post", path=ctx.path)
+            ctx.timings.append((label, time.perf_counter() - start))
+
+    def _run(self, path, info, steps, clipped):
+        ctx = PostDownloadContext(path, info or {}, clipped)
+        for step in steps:
+            if step.touches_file and ctx.dirty:
+                self._timed(ctx, "write", "寫入", self.writer.write)
+            self._timed(ctx, step.name, step.label, step.run)
+        if ctx.dirty:
+            self._timed(ctx, "write", "寫入", self.writer.write)
+        return ctx
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+LIVE_STATES = ("is_live", "is_upcoming")
+LIVE_FORMAT = "best[protocol^=m3u8]/best"
+
+
+class LiveCapture:
+    SEGMENT_SECONDS = 300
+    STOP_TIMEOUT = 15
+    READ_TIMEOUT_US = 30 * 1000 * 1000
+
+    def __init__(self, ffmpeg_path, fmt, out_base, from_start=False):
+        self.ffmpeg_path = ffmpeg_path
+        self.fmt = fmt
+        self.out_base = out_base
+        self.from_start = from_start
+        self.process = None
+        self.duration = 0.0
+        self.bitrate = None
+        self.total_size = 0
+        self.errors = collections.deque(maxlen=5)
+        self._segment_re = re.compile(
+            re.escape(os.path.basename(out_base)) + r"\.part(\d{3,})\.ts$"
+        )
+
+    def command(self):
+        cmd = [
+            self.ffmpeg_path,
+            "-hide_banner",
+            "-nostats",
+            "-loglevel",
+            "error",
+            "-progress",
+            "pipe:1",
+            "-rw_timeout",
+            str(self.READ_TIMEOUT_US),
+        ]
+        headers = self.fmt.get("http_headers") or {}
+        if headers:
+            cmd += ["-headers", "".join(f"{k}: {v}\r\n" for k, v in headers.items())]
+        if (self.fmt.get("protocol") or "").startswith("m3u8"):
+            cmd += ["-live_start_index", "0" if self.from_start else "-3"]
+        pattern = self.out_base.replace("%", "%%") + ".part%03d.ts"
+        return cmd + [
+            "-i",
+            self.fmt["url"],
+            "-map",
+            "0",
+            "-c",
+            "copy",
+            "-max_muxing_queue_size",
+            "1024",
+            "-f",
+            "segment",
+            "-segment_time",
+            str(self.SEGMENT_SECONDS),
+            "-segment_format",
+            "mpegts",
+            pattern,
+        ]
+
+    def start(self):
+        self.process = subprocess.Popen(
+            self.command(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            creationflags=0x08000000 if os.name == "nt" else 0,
+        )
+
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def updates(self):
+        for line in self.process.stdout:
+            key, sep, value = line.strip().partition("=")
+            if not sep:
+                if line.strip():
+                    self.errors.append(line.strip())
+                continue
+            if key == "out_time_us" and value.isdigit():
+                self.duration = int(value) / 1e6
+            elif key == "bitrate":
+                match = re.match(r"[\d.]+", value)
+                self.bitrate = float(match.group(0)) if match else None
+            elif key == "total_size" and value.isdigit():
+                self.total_size = int(value)
+            elif key == "progress":
+                yield value
+        self.process.wait()
+
+    def stop(self):
+        if not self.running():
+            return
+        try:
+            self.process.stdin.write("q")
+            self.process.stdin.flush()
+        except (OSError, ValueError):
+            pass
+        try:
+            self.process.wait(self.STOP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            self.process.terminate()
+
+    def segments(self):
+        directory = os.path.dirname(self.out_base) or "."
+        numbered = []
+        for name in os.listdir(directory):
+            match = self._segment_re.match(name)
+            if match:
+                numbered.append((int(match.group(1)), os.path.join(directory, name)))
+        return [path for _, path in sorted(numbered)]
+
+    def finalize(self, run):
+        segments = [path for path in self.segments() if os.path.getsize(path) > 0]
+        if not segments:
+            return None
+        list_path = f"{self.out_base}.concat.txt"
+        output = f"{self.out_base}.mp4"
+        with open(list_path, "w", encoding="utf-8") as f:
+            f.write("ffconcat version 1.0\n")
+            for path in segments:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        try:
+            _, stderr, returncode = run(
+                [
+                    self.ffmpeg_path,
+                    "-y",
+                    "-hide_banner",
+                    "-loglevel",
+                    "error",
+                    "-f",
+                    "concat",
+                    "-safe",
+                    "0",
+                    "-i",
+                    f"file:{list_path}",
+                    "-map",
+                    "0",
+                    "-c",
+                    "copy",
+                    "-movflags",
+                    "+faststart",
+                    f"file:{output}",
+                ]
+            )
+        finally:
+            with contextlib.suppress(OSError):
+                os.remove(list_path)
+        if returncode != 0:
+            lines = (stderr or "").strip().splitlines()
+            raise RuntimeError(lines[-1] if lines else f"ffmpeg exit {returncode}")
+        for path in self.segments():
+            with contextlib.suppress(OSError):
+                os.remove(path)
+        return output
+
+
+EXTRACT_AUDIO_CODECS = frozenset(
+    ["best", "aac", "flac", "mp3", "m4a", "opus", "vorbis", "wav", "alac"]
+)
+MP4_MERGE_ARGS = ("-c:v", "copy", "-c:a", "aac", "-b:a", "192k")
+BUILTIN_FORMAT_PRESETS = {
+    "封存 1080p mkv": ["video", "1080p", "mkv"],
+    "最佳畫質 mp4": ["video", "", "mp4"],
+    "720p mp4": ["video", "720p", "mp4"],
+    "Podcast opus 64k": ["audio", "opus", "", "", "", "", "", "64k"],
+    "音樂 mp3": ["audio", "mp3"],
+}
+
+
+class CompiledFormat:
+    __slots__ = ("options", "cli_args")
+
+    def __init__(self, options, cli_args):
+        object.__setattr__(self, "options", types.MappingProxyType(options))
+        object.__setattr__(self, "cli_args", tuple(cli_args))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CompiledFormat is immutable")
+
+    def job_options(self):
+        opts = dict(self.options)
+        if "postprocessors" in opts:
+            opts["postprocessors"] = [dict(pp) for pp in opts["postprocessors"]]
+        if "postprocessor_args" in opts:
+            opts["postprocessor_args"] = list(opts["postprocessor_args"])
+        return opts
+
+
+@functools.lru_cache(maxsize=64)
+def compile_format(is_audio, format_param, ext_param, audio_targets=(), audio_quality="0"):
+    if is_audio and audio_targets:
+        return CompiledFormat(
+            {"format": "bestaudio/best"},
+            ["-f", "bestaudio/best", "--extract-audio", "--audio-format", audio_targets[0]],
+        )
+    if is_audio:
+        if format_param == "opus" and ext_param == "webm":
+            selector = "bestaudio[ext=webm]/bestaudio"
+            return CompiledFormat({"format": selector}, ["-f", selector])
+        target = ext_param or format_param or "best"
+        if target not in EXTRACT_AUDIO_CODECS:
+            target = format_param if format_param in EXTRACT_AUDIO_CODECS else "best"
+        extract = types.MappingProxyType(
+            {
+                "key": "FFmpegExtractAudio",
+                "preferredcodec": target,
+                "preferredquality": audio_quality,
+            }
+        )
+        return CompiledFormat(
+            {"format": "bestaudio/best", "postprocessors": (extract,)},
+            [
+                "-f",
+                "bestaudio/best",
+                "--extract-audio",
+                "--audio-format",
+                target,
+                "--audio-quality",
+                audio_quality if audio_quality == "0" else f"{audio_quality}K",
+            ],
+        )
+
+    if format_param:
+        selector = f"bestvideo[height<={format_param}]+bestaudio/best"
+    else:
+        selector = "bestvideo+bestaudio/best"
+    options = {"format": selector, "merge_output_format": ext_param}
+    cli_args = ["-f", selector, "--merge-output-format", ext_param]
+    if ext_param == "mp4":
+        options["postprocessor_args"] = MP4_MERGE_ARGS
+        cli_args += ["--postprocessor-args", " ".join(MP4_MERGE_ARGS)]
+    return CompiledFormat(options, cli_args)
+
+
+class QueueItem(collections.abc.Mapping):
+    __slots__ = (
+        "url",
+        "title",
+        "video_id",
+        "is_audio_only",
+        "format_param",
+        "ext_param",
+        "queue_key",
+        "section",
+        "audio_targets",
+        "loudnorm",
+        "audio_quality",
+    )
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            object.__setattr__(self, name, fields.pop(name, None))
+        if fields:
+            raise TypeError(f"unknown queue item fields: {', '.join(fields)}")
+
+    def __setattr__(self, name, value):
+        raise AttributeError("QueueItem is immutable")
+
+    def __getitem__(self, key):
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        return (name for name in self.__slots__ if getattr(self, name) is not None)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"QueueItem({dict(self)!r})"
+
+
+VIDEO_ID_RE = re.compile(r"(?:v=|youtu\.be/|embed/|shorts/)([A-Za-z0-9_-]+)")
+
+
+def iter_inbox_urls(path):
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.reader(f)
+        else:
+            rows = (line.split() for line in f)
+        for line_no, row in enumerate(rows, 1):
+            if not row:
+                continue
+            url = row[0].strip()
+            if not url.lower().startswith(("http://", "https://")):
+                continue
+            yield line_no, url, [col.strip() for col in row[1:]]
+
+
+def read_inbox_manifest(path):
+    last_line = 0
+    if not os.path.exists(path):
+        return last_line
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            last_line = max(last_line, record.get("line") or 0)
+    return last_line
+
+
+class InboxWatcher:
+    SUFFIXES = (".txt", ".csv")
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    EVENT_HEADER = ctypes.sizeof(ctypes.c_int) + 3 * ctypes.sizeof(ctypes.c_uint32)
+
+    def __init__(self, directory, on_file, poll_interval=5.0):
+        self.directory = os.path.abspath(directory)
+        self.on_file = on_file
+        self.poll_interval = poll_interval
+        self.mode = None
+        self._stop = threading.Event()
+        self._handled = {}
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _is_candidate(self, name):
+        return name.lower().endswith(self.SUFFIXES) and not name.startswith(".")
+
+    def _signature(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_size, st.st_mtime)
+
+    def _dispatch(self, path):
+        signature = self._signature(path)
+        if signature is None or self._handled.get(path) == signature:
+            return
+        self._handled[path] = signature
+        self.on_file(path)
+
+    def _run(self):
+        fd = self._inotify_init()
+        self.mode = "inotify" if fd is not None else "polling"
+        if fd is None:
+            self._poll_loop()
+            return
+        try:
+            for name in sorted(os.listdir(self.directory)):
+                if self._is_candidate(name):
+                    self._dispatch(os.path.join(self.directory, name))
+            self._inotify_loop(fd)
+        finally:
+            os.close(fd)
+
+    def _inotify_init(self):
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                return None
+            wd = libc.inotify_add_watch(
+                fd,
+                os.fsencode(self.directory),
+                self.IN_CLOSE_WRITE | self.IN_MOVED_TO,
+            )
+            if wd < 0:
+                os.close(fd)
+                return None
+            return fd
+        except (OSError, AttributeError):
+            return None
+
+    def _inotify_loop(self, fd):
+        while not self._stop.is_set():
+            ready, _, _ = select.select([fd], [], [], 1.0)
+            if not ready:
+                continue
+            try:
+                data = os.read(fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            offset = 0
+            names = []
+            while offset + self.EVENT_HEADER <= len(data):
+                name_len = int.from_bytes(
+                    data[offset + self.EVENT_HEADER - 4 : offset + self.EVENT_HEADER],
+                    sys.byteorder,
+                )
+                start = offset + self.EVENT_HEADER
+                raw_name = data[start : start + name_len].rstrip(b"\0")
+                offset = start + name_len
+                name = os.fsdecode(raw_name)
+                if name and self._is_candidate(name) and name not in names:
+                    names.append(name)
+            for name in names:
+                self._dispatch(os.path.join(self.directory, name))
+
+    def _poll_loop(self):
+        pending = {}
+        while not self._stop.is_set():
+            try:
+                names = sorted(os.listdir(self.directory))
+            except OSError:
+                names = []
+            for name in names:
+                if not self._is_candidate(name):
+                    continue
+                path = os.path.join(self.directory, name)
+                signature = self._signature(path)
+                if signature is None or self._handled.get(path) == signature:
+                    continue
+                if pending.get(path) == signature:
+                    pending.pop(path, None)
+                    self._dispatch(path)
+                else:
+                    pending[path] = signature
+            self._stop.wait(self.poll_interval)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobRegistry:
+    FINAL_STATES = ("success", "failed", "duplicate", "cancelled")
+
+    def __init__(self):
+        self._jobs = {}
+        self._cancelled = set()
+        self._listeners = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def create(self, url, display_text=None, source="gui", options=None):
+        job_id = str(next(self._ids))
+        job = {
+            "id": job_id,
+            "url": url,
+            "display_text": display_text or url,
+            "source": source,
+            "options": list(options or []),
+            "status": "queued",
+            "progress": 0.0,
+            "speed": None,
+            "eta": None,
+            "path": None,
+            "error": None,
+            "created": time.time(),
+            "updated": time.time(),
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            snapshot = dict(job)
+        self._publish(snapshot)
+        return job_id
+
+    def update(self, job_id, **fields):
+        if job_id is None:
+            return
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            job["updated"] = time.time()
+            snapshot = dict(job)
+        self._publish(snapshot)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self):
+        with self._lock:
+            return [dict(job) for job in self._jobs.values()]
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] in self.FINAL_STATES:
+                return False
+            self._cancelled.add(job_id)
+            queued = job["status"] == "queued"
+        if queued:
+            self.update(job_id, status="cancelled")
+        return True
+
+    def is_cancelled(self, job_id):
+        with self._lock:
+            return job_id in self._cancelled
+
+    def add_listener(self, listener):
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def _publish(self, job):
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(job)
+            except Exception:
+                pass
+
+
+THUMBNAIL_VARIANTS = (
+    ("default", 120),
+    ("mqdefault", 320),
+    ("hqdefault", 480),
+)
+
+
+def thumbnail_variant(width):
+    for name, variant_width in THUMBNAIL_VARIANTS:
+        if variant_width >= width:
+            break
+    return name, variant_width
+
+
+def thumbnail_url(video_id, width):
+    return f"http://img.youtube.com/vi/{video_id}/{thumbnail_variant(width)[0]}.jpg"
+
+
+@traced("thumbnail.decode", "ui")
+def decode_thumbnail(image_data, width, height):
+    buffer = QBuffer()
+    buffer.setData(QByteArray(image_data))
+    buffer.open(QIODevice.ReadOnly)
+    reader = QImageReader(buffer)
+    source = reader.size()
+    if source.isValid():
+        reader.setScaledSize(source.scaled(QSize(width, height), Qt.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        return None
+    return image
+
+
+class ThumbnailCache:
+    def __init__(self, capacity=300):
+        self.capacity = capacity
+        self._entries = collections.OrderedDict()
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class AsyncHTTPPool:
+    IDLE_TIMEOUT = 30.0
+    REDIRECTS = (301, 302, 303, 307, 308)
+
+    def __init__(self, per_host=4, max_total=16):
+        self.per_host = per_host
+        self._total = asyncio.Semaphore(max_total)
+        self._host_limits = {}
+        self._idle = {}
+        self._ssl = ssl.create_default_context()
+
+    async def get(self, url, timeout=10.0, max_redirects=3, headers=None):
+        return await asyncio.wait_for(
+            self._get(url, max_redirects, headers or {}), timeout
+        )
+
+    async def _get(self, url, redirects_left, headers):
+        parts = urllib.parse.urlsplit(url)
+        https = parts.scheme == "https"
+        key = (parts.scheme, parts.hostname, parts.port or (443 if https else 80))
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        limit = self._host_limits.setdefault(key, asyncio.Semaphore(self.per_host))
+        async with self._total, limit:
+            status, response_headers, body = await self._exchange(
+                key, parts.hostname, target, headers
+            )
+        location = response_headers.get("location")
+        if status in self.REDIRECTS and location and redirects_left > 0:
+            return await self._get(
+                urllib.parse.urljoin(url, location), redirects_left - 1, headers
+            )
+        return status, response_headers, body
+
+    async def _exchange(self, key, host, target, headers):
+        extra = "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+        for attempt in range(2):
+            reader, writer, reused = await self._connect(key)
+            try:
+                writer.write(
+                    (
+                        f"GET {target} HTTP/1.1\r\nHost: {host}\r\n"
+                        "User-Agent: YTMediaDownloader\r\n"
+                        f"{extra}"
+                        "Accept-Encoding: identity\r\nConnection: keep-alive\r\n\r\n"
+                    ).encode("latin-1")
+                )
+                await writer.drain()
+                status, headers, body, keep_alive = await self._read_response(reader)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                writer.close()
+                if reused and attempt == 0:
+                    continue
+                raise ConnectionError(str(e) or "connection closed") from e
+            except BaseException:
+                writer.close()
+                raise
+            if keep_alive:
+                self._idle.setdefault(key, []).append((reader, writer, time.monotonic()))
+            else:
+                writer.close()
+            return status, headers, body
+
+    async def _connect(self, key):
+        idle = self._idle.get(key) or []
+        now = time.monotonic()
+        while idle:
+            reader, writer, stamp = idle.pop()
+            if now - stamp < self.IDLE_TIMEOUT and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+        scheme, host, port = key
+        reader, writer = await asyncio.open_connection(
+            host,
+            port,
+            ssl=self._ssl if scheme == "https" else None,
+            server_hostname=host if scheme == "https" else None,
+        )
+        return reader, writer, False
+
+    async def _read_response(self, reader):
+        head = await reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        version, status = lines[0].split(" ", 2)[:2]
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        status = int(status)
+        if status < 200 or status in (204, 304):
+            body = b""
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                if size == 0:
+                    # Skip any trailer fields up to the blank line.
+                    while await reader.readuntil(b"\r\n") != b"\r\n":
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+            keep_alive = False
+        return status, headers, body, keep_alive
+
+    def close(self):
+        for connections in self._idle.values():
+            for _, writer, _ in connections:
+                writer.close()
+        self._idle.clear()
+
+
+class HTTPStatusError(ConnectionError):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+class AsyncNetwork:
+    def __init__(
+        self, blocking_workers=4, decode_workers=2, per_host=4, max_connections=16
+    ):
+        self.loop = asyncio.new_event_loop()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=blocking_workers, thread_name_prefix="ytmd-blocking"
+        )
+        self._decoder = concurrent.futures.ThreadPoolExecutor(
+            max_workers=decode_workers, thread_name_prefix="ytmd-decode"
+        )
+        self._per_host = per_host
+        self._max_connections = max_connections
+        self.http = None
+        self._ready = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, name="ytmd-network", daemon=True).start()
+        self._ready.wait(5)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.http = AsyncHTTPPool(self._per_host, self._max_connections)
+        self.loop.call_soon(self._ready.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.http.close()
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def fetch(self, url, timeout=10.0):
+        status, _, body = await self.http.get(url, timeout)
+        if status != 200:
+            raise HTTPStatusError(status)
+        return body
+
+    async def run_blocking(self, fn, *args, timeout=None):
+        future = self.loop.run_in_executor(self._executor, fn, *args)
+        if timeout is None:
+            return await future
+        return await asyncio.wait_for(future, timeout)
+
+    async def decode(self, fn, *args):
+        return await self.loop.run_in_executor(self._decoder, fn, *args)
+
+    def close(self):
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._decoder.shutdown(wait=False, cancel_futures=True)
+
+
+CHANNEL_ID_RE = re.compile(r"/channel/(UC[A-Za-z0-9_-]{22})")
+FEED_NS = {
+    "atom": "http://www.w3.org/2005/Atom",
+    "yt": "http://www.youtube.com/xml/schemas/2015",
+}
+
+
+def parse_channel_feed(body, seen):
+    root = ElementTree.fromstring(body)
+    entries = []
+    for entry in root.iterfind("atom:entry", FEED_NS):
+        video_id = entry.findtext("yt:videoId", namespaces=FEED_NS)
+        if not video_id:
+            continue
+        if video_id in seen:
+            break
+        entries.append(
+            {
+                "id": video_id,
+                "title": entry.findtext("atom:title", "", FEED_NS),
+                "published": entry.findtext("atom:published", "", FEED_NS),
+            }
+        )
+    return root.findtext("atom:title", "", FEED_NS), entries
+
+
+class SubscriptionStore:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def add(self, channel_id, url, title, options):
+        with self._lock:
+            self._entries.setdefault(channel_id, {"channel_id": channel_id}).update(
+                url=url, title=title, options=list(options)
+            )
+        self.save()
+
+    def remove(self, channel_id):
+        with self._lock:
+            removed = self._entries.pop(channel_id, None)
+        if removed:
+            self.save()
+        return removed is not None
+
+    def get(self, channel_id):
+        with self._lock:
+            entry = self._entries.get(channel_id)
+            return dict(entry) if entry else None
+
+    def list(self):
+        with self._lock:
+            return [dict(entry) for entry in self._entries.values()]
+
+    def update(self, channel_id, **fields):
+        with self._lock:
+            if channel_id in self._entries:
+                self._entries[channel_id].update(fields)
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self._entries, ensure_ascii=False, indent=1)
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+
+class SubscriptionPoller:
+    FEED_URL = "https://www.youtube.com/feeds/videos.xml?channel_id={}"
+    SEEN_LIMIT = 50
+
+    def __init__(self, store, fetch, on_new, concurrency=16):
+        self.store = store
+        self.fetch = fetch
+        self.on_new = on_new
+        self.concurrency = concurrency
+
+    async def poll(self, channel_ids=None):
+        started = time.perf_counter()
+        subscriptions = [
+            sub
+            for sub in self.store.list()
+            if channel_ids is None or sub["channel_id"] in channel_ids
+        ]
+        limit = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(
+            *(self._poll_one(sub, limit) for sub in subscriptions),
+            return_exceptions=True,
+        )
+        self.store.save()
+        stats = {"checked": len(results), "not_modified": 0, "new": 0, "failed": []}
+        for sub, result in zip(subscriptions, results):
+            if isinstance(result, Exception):
+                stats["failed"].append((sub.get("title") or sub["channel_id"], result))
+            elif result is None:
+                stats["not_modified"] += 1
+            else:
+                stats["new"] += result
+        stats["elapsed"] = time.perf_counter() - started
+        return stats
+
+    async def _poll_one(self, sub, limit):
+        headers = {}
+        if sub.get("etag"):
+            headers["If-None-Match"] = sub["etag"]
+        if sub.get("last_modified"):
+            headers["If-Modified-Since"] = sub["last_modified"]
+        url = sub.get("feed_url") or self.FEED_URL.format(sub["channel_id"])
+        async with limit:
+            with TRACER.async_span("feed.fetch", channel_id=sub["channel_id"]):
+                status, response_headers, body = await self.fetch(url, headers)
+        if status == 304:
+            return None
+        if status != 200:
+            raise HTTPStatusError(status)
+
+        seen = sub.get("seen") or []
+        title, entries = parse_channel_feed(body, set(seen))
+        fields = {
+            "etag": response_headers.get("etag"),
+            "last_modified": response_headers.get("last-modified"),
+            "last_polled": time.time(),
+            "seen": ([entry["id"] for entry in entries] + seen)[: self.SEEN_LIMIT],
+        }
+        if title and not sub.get("title"):
+            fields["title"] = title
+        if entries:
+            fields["last_published"] = entries[0]["published"]
+        self.store.update(sub["channel_id"], **fields)
+        if sub.get("last_polled") is None:
+            return 0
+        for entry in reversed(entries):
+            self.on_new(sub, entry)
+        return len(entries)
+
+
+class ControlAPIServer:
+    MAX_BODY = 1024 * 1024
+    SSE_QUEUE_SIZE = 1000
+    SSE_KEEPALIVE = 15.0
+
+    def __init__(
+        self, registry, submit, loop, host="127.0.0.1", port=8765, token=None
+    ):
+        self.registry = registry
+        self.submit = submit
+        self.loop = loop
+        self.host = host
+        self.port = port
+        self.token = token
+        self._server = None
+        self._clients = set()
+
+    def start(self):
+        if not self.token and not self._is_loopback(self.host):
+            raise ValueError(f"--api-host {self.host} 不是本機位址，必須搭配 --api-token")
+        self._server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._handle, self.host, self.port), self.loop
+        ).result(5)
+        self.registry.add_listener(self._on_job_event)
+
+    @staticmethod
+    def _is_loopback(host):
+        if host == "localhost":
+            return True
+        try:
+            return ipaddress.ip_address(host).is_loopback
+        except ValueError:
+            return False
+
+    def stop(self):
+        self.registry.remove_listener(self._on_job_event)
+        if self._server is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._server.close)
+
+    def _on_job_event(self, job):
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._broadcast, job)
+
+    def _broadcast(self, job):
+        for client in list(self._clients):
+            try:
+                client.put_nowait(job)
+            except asyncio.QueueFull:
+                pass
+
+    async def _handle(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10)
+            lines = head.decode("latin-1").split("\r\n")
+            method, target, _ = lines[0].split(" ", 2)
+            headers = {}
+            for line in lines[1:]:
+                if ":" in line:
+                    key, value = line.split(":", 1)
+                    headers[key.strip().lower()] = value.strip()
+            length = int(headers.get("content-length") or 0)
+            if length > self.MAX_BODY:
+                await self._respond(writer, 413, {"error": "body too large"})
+                return
+            body = await reader.readexactly(length) if length else b""
+            parsed = urllib.parse.urlsplit(target)
+            query = urllib.parse.parse_qs(parsed.query)
+            if not self._authorized(headers, query):
+                await self._respond(writer, 401, {"error": "unauthorized"})
+                return
+            await self._route(writer, method.upper(), parsed.path.rstrip("/"), body)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            pass
+        except (ValueError, asyncio.LimitOverrunError):
+            await self._respond(writer, 400, {"error": "bad request"})
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    def _authorized(self, headers, query):
+        if not self.token:
+            return True
+        expected = self.token.encode("utf-8")
+        auth = headers.get("authorization", "")
+        if auth.startswith("Bearer ") and hmac.compare_digest(
+            auth[len("Bearer ") :].encode("utf-8"), expected
+        ):
+            return True
+        tokens = query.get("token") or [""]
+        return len(tokens) == 1 and hmac.compare_digest(tokens[0].encode("utf-8"), expected)
+
+    async def _route(self, writer, method, path, body):
+        parts = [p for p in path.split("/") if p]
+        if parts == ["jobs"] and method == "GET":
+            await self._respond(writer, 200, {"jobs": self.registry.list()})
+        elif parts == ["jobs"] and method == "POST":
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                payload = None
+            if not isinstance(payload, dict):
+                await self._respond(writer, 400, {"error": "body must be a JSON object"})
+                return
+            targets = payload.get("targets") or []
+            if not isinstance(targets, list) or not all(isinstance(t, str) for t in targets):
+                await self._respond(writer, 400, {"error": "targets must be a list of strings"})
+                return
+            url = payload.get("url")
+            url = url.strip() if isinstance(url, str) else ""
+            if not url.lower().startswith(("http://", "https://")):
+                await self._respond(writer, 400, {"error": "invalid url"})
+                return
+            options = [
+                "audio" if payload.get("audio") else "video",
+                str(payload.get("format") or ""),
+                str(payload.get("ext") or ""),
+                str(payload.get("start") or ""),
+                str(payload.get("end") or ""),
+                "+".join(targets),
+                "loudnorm" if payload.get("loudnorm") else "",
+                str(payload.get("quality") or ""),
+            ]
+            if payload.get("preset"):
+                conflicting = [
+                    key
+                    for key in ("audio", "format", "ext", "targets", "loudnorm")
+                    if payload.get(key)
+                ]
+                if conflicting:
+                    await self._respond(
+                        writer,
+                        400,
+                        {"error": f"preset cannot be combined with {', '.join(conflicting)}"},
+                    )
+                    return
+                options[:2] = ["preset", str(payload["preset"])]
+            if payload.get("live"):
+                options = ["live", "start" if payload["live"] == "start" else "now"]
+            job_id = self.submit(url, options)
+            await self._respond(writer, 202, self.registry.get(job_id))
+        elif len(parts) == 2 and parts[0] == "jobs" and method == "GET":
+            job = self.registry.get(parts[1])
+            if job:
+                await self._respond(writer, 200, job)
+            else:
+                await self._respond(writer, 404, {"error": "not found"})
+        elif (len(parts) == 2 and parts[0] == "jobs" and method == "DELETE") or (
+            len(parts) == 3 and parts[::2] == ["jobs", "cancel"] and method == "POST"
+        ):
+            if self.registry.get(parts[1]) is None:
+                await self._respond(writer, 404, {"error": "not found"})
+            else:
+                cancelled = self.registry.cancel(parts[1])
+                await self._respond(
+                    writer, 200 if cancelled else 409, self.registry.get(parts[1])
+                )
+        elif parts == ["events"] and method == "GET":
+            await self._stream_events(writer)
+        else:
+            await self._respond(writer, 404, {"error": "not found"})
+
+    async def _respond(self, writer, status, payload):
+        reasons = {
+            200: "OK",
+            202: "Accepted",
+            400: "Bad Request",
+            401: "Unauthorized",
+            404: "Not Found",
+            409: "Conflict",
+            413: "Payload Too Large",
+        }
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        writer.write(
+            (
+                f"HTTP/1.1 {status} {reasons.get(status, '')}\r\n"
+                "Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode("latin-1")
+            + data
+        )
+        await writer.drain()
+
+    async def _stream_events(self, writer):
+        client = asyncio.Queue(self.SSE_QUEUE_SIZE)
+        self._clients.add(client)
+        try:
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: text/event-stream\r\n"
+                b"Cache-Control: no-cache\r\n"
+                b"Connection: keep-alive\r\n\r\n"
+            )
+            for job in self.registry.list():
+                data = json.dumps(job, ensure_ascii=False)
+                writer.write(f"event: job\ndata: {data}\n\n".encode("utf-8"))
+            await writer.drain()
+            while True:
+                try:
+                    job = await asyncio.wait_for(client.get(), self.SSE_KEEPALIVE)
+                    data = json.dumps(job, ensure_ascii=False)
+                    writer.write(f"event: job\ndata: {data}\n\n".encode("utf-8"))
+                except asyncio.TimeoutError:
+                    writer.write(b": keepalive\n\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._clients.discard(client)
+
+
 dark_qss = """
 QWidget {
     background-color: #2e2e2e;
@@ -147,14 +3146,37 @@ QScrollBar::add-page:vertical, QScrollBar::sub-page:vertical {
 
 
 class YTMediaDownloader(QWidget):
+    ANALYSIS_WORKERS = 4
+    ANALYSIS_TIMEOUT = 120
+    THUMBNAIL_TIMEOUT = 5
+    GRID_ICON_SIZE = QSize(120, 90)
+    GRID_CELL_SIZE = QSize(150, 130)
+    GRID_MAX_PENDING = 48
+    GRID_RETRY_BASE = 30
+    GRID_RETRY_MAX = 10 * 60
+    DOWNLOAD_WORKERS = 1
+    MAX_DOWNLOAD_WORKERS = 6
+    INFO_MIN_VALIDITY = 30 * 60
+    INFO_REFRESH_MARGIN = 60 * 60
+    INFO_REFRESH_INTERVAL = 5 * 60
+    LEASE_POLL_INTERVAL = 5
+    SUBSCRIPTION_POLL_INTERVAL = 15 * 60
+    FEED_TIMEOUT = 10
+    COVER_ART_WIDTH = 480
+    CAPTURE_WORKERS = 2
+    PREMIERE_POLL_MIN = 30
+    PREMIERE_POLL_MAX = 5 * 60
+
     log_signal = pyqtSignal(str, str)
     progress_signal = pyqtSignal(int)
     status_signal = pyqtSignal(str)
     analyzed = pyqtSignal()
     err_signal = pyqtSignal(str)
     info_signal = pyqtSignal(str)
-    thumbnail_loaded_signal = pyqtSignal(bytes)
+    thumbnail_loaded_signal = pyqtSignal(QImage)
+    capture_status_signal = pyqtSignal(str, str)
     thumbnail_error_signal = pyqtSignal()
+    queue_thumbnail_signal = pyqtSignal(str, QImage, bool)
     download_button_signal = pyqtSignal(bool)
     analyze_button_signal = pyqtSignal(bool)
 
@@ -175,8 +3197,101 @@ class YTMediaDownloader(QWidget):
         self.formats = []
         self.info = None
         self.queue_keys = []
+        self.audio_map = {}
+        self.audio_codec_map = {}
+
+        self.analysis_pool = YoutubeDLPool(
+            {
+                "quiet": True,
+                "skip_download": True,
+                "forcethumbnail": True,
+                "noplaylist": True,
+                "socket_timeout": 15,
+            },
+            size=self.ANALYSIS_WORKERS,
+        )
+        self.download_pool = YoutubeDLPool(
+            {
+                "noplaylist": True,
+                "quiet": True,
+                "retries": 3,
+                "ffmpeg_location": self._get_ffmpeg_path(),
+            },
+            size=self.MAX_DOWNLOAD_WORKERS,
+        )
+        self.network = AsyncNetwork(blocking_workers=self.ANALYSIS_WORKERS, per_host=8)
+        self.network.start()
+        self._thumbnail_future = None
+        self._grid_thumbnails = ThumbnailCache()
+        self._grid_futures = {}
+        self._grid_failed = {}
+        self._grid_iconed = []
+        self._grid_scroll_value = 0
+        self._grid_scroll_direction = 1
+        self.resolved_info = ResolvedInfoCache()
+        self._refresh_stop = threading.Event()
+        self.inbox_watcher = None
+        self._service_keys = set()
+        self._service_lock = threading.Lock()
+        self._service_download_dir = None
+        self._inbox_submitted = {}
+        self.jobs = JobRegistry()
+        self._verified_manifests = {}
+        self.disk_admission = DiskAdmission()
+        self.transcode_manager = TranscodeManager(
+            self.DOWNLOAD_WORKERS, on_complete=self._on_transcode_complete
+        )
+        self.transcode_manager.install()
+        self.scratch_dir = None
+        self._concurrency = None
+        self.path_planner = OutputPathPlanner()
+        self.cover_art = ThumbnailCache(capacity=32)
+        self.post_pipeline = PostDownloadPipeline(
+            FFmpegTagWriter(
+                self.transcode_manager, self._get_ffmpeg_path, self._get_ffprobe_path
+            )
+        )
+        self.post_pipeline.register(TagStep())
+        self.post_pipeline.register(ArtworkStep(self._cover_art_for))
+        self.post_download_steps = []
+        self.capture_pool = concurrent.futures.ThreadPoolExecutor(
+            self.CAPTURE_WORKERS, thread_name_prefix="live-capture"
+        )
+        self._capture_stop = threading.Event()
+        self._captures_busy = 0
+        self._captures_lock = threading.Lock()
+        self.library_dir = None
+        self.library_template = "%(uploader)s"
+        self.instance_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._leases = {}
+        self.filename_template = OutputPathPlanner.DEFAULT_TEMPLATE
+        self.api_server = None
+        self.subscriptions = SubscriptionStore(
+            os.path.join(os.path.expanduser("~"), ".ytmd-subscriptions.json")
+        )
+        self.subscription_poller = SubscriptionPoller(
+            self.subscriptions, self._fetch_feed, self._on_subscription_upload
+        )
+        self._subscription_task = None
+        self.profiler = None
+        self.trace_output = None
+        self.profile_output = None
+        self._url_jobs = queue.Queue()
+        # Started up front so concurrent submit_url callers (the control API
+        # and the subscription poller) can never race to create a second one.
+        self._url_worker = threading.Thread(
+            target=self._run_url_jobs, name="url-jobs", daemon=True
+        )
+        self._url_worker.start()
 
         self.settings = QSettings("YTMediaDownloader", "YTMediaDownloader")
+        self.format_presets = dict(BUILTIN_FORMAT_PRESETS)
+        try:
+            self.format_presets.update(
+                json.loads(self.settings.value("format_presets", "") or "{}")
+            )
+        except ValueError:
+            pass
 
         self._init_ui()
         self._toggle_audio_mode(self.audio_only.isChecked())
@@ -192,6 +3307,8 @@ class YTMediaDownloader(QWidget):
         self.status_signal.connect(self.status.setText)
         self.thumbnail_loaded_signal.connect(self._set_thumbnail_pixmap)
         self.thumbnail_error_signal.connect(self._set_thumbnail_error)
+        self.queue_thumbnail_signal.connect(self._on_queue_thumbnail_loaded)
+        self.capture_status_signal.connect(self._on_capture_status)
         self.download_button_signal.connect(self.download_btn.setEnabled)
         self.analyze_button_signal.connect(self.analyze_btn.setEnabled)
 
@@ -210,6 +3327,10 @@ class YTMediaDownloader(QWidget):
         self._update_remove_button_state()
         self._update_select_all_checkbox()
 
+        threading.Thread(target=self._refresh_resolved_info, daemon=True).start()
+        if self.subscriptions.list():
+            self._start_subscription_polling()
+
     def _init_ui(self):
         self.setWindowTitle("YT Media Downloader")
         self.resize(960, 720)
@@ -222,6 +3343,17 @@ class YTMediaDownloader(QWidget):
         self.analyze_btn = QPushButton("分析資訊")
         self.analyze_btn.clicked.connect(self.analyze_url)
         top_url_analysis_layout.addWidget(self.analyze_btn)
+        subscribe_btn = QPushButton("訂閱頻道")
+        subscribe_btn.clicked.connect(self.subscribe_current_url)
+        top_url_analysis_layout.addWidget(subscribe_btn)
+        poll_btn = QPushButton("檢查訂閱")
+        poll_btn.clicked.connect(self.poll_subscriptions_now)
+        top_url_analysis_layout.addWidget(poll_btn)
+        capture_btn = QPushButton("錄製直播")
+        capture_btn.clicked.connect(self.start_capture_from_input)
+        top_url_analysis_layout.addWidget(capture_btn)
+        self.capture_from_start_checkbox = QCheckBox("從頭錄製")
+        top_url_analysis_layout.addWidget(self.capture_from_start_checkbox)
 
         self.thumbnail_label = QLabel("無縮圖")
         self.thumbnail_label.setAlignment(Qt.AlignCenter)
@@ -246,9 +3378,22 @@ class YTMediaDownloader(QWidget):
         self.select_all_checkbox.setTristate(True)
         select_all_layout.addWidget(self.select_all_checkbox)
         select_all_layout.addStretch()
+        self.grid_view_checkbox = QCheckBox("縮圖檢視")
+        select_all_layout.addWidget(self.grid_view_checkbox)
         queue_layout.addLayout(select_all_layout)
         self.queue_list = QListWidget()
         self.queue_list.setSelectionMode(QListWidget.MultiSelection)
+        self.queue_list.setUniformItemSizes(True)
+        self._grid_timer = QTimer(self)
+        self._grid_timer.setSingleShot(True)
+        self._grid_timer.setInterval(50)
+        self._grid_timer.timeout.connect(self._refresh_grid_thumbnails)
+        scroll_bar = self.queue_list.verticalScrollBar()
+        scroll_bar.valueChanged.connect(self._on_queue_scrolled)
+        scroll_bar.rangeChanged.connect(self._schedule_grid_refresh)
+        self.queue_list.model().rowsInserted.connect(self._schedule_grid_refresh)
+        self.queue_list.model().rowsRemoved.connect(self._schedule_grid_refresh)
+        self.grid_view_checkbox.toggled.connect(self._set_queue_grid_mode)
         btns = QHBoxLayout()
         self.add_btn = QPushButton("加入佇列")
         self.add_btn.clicked.connect(self.add_current_to_queue)
@@ -256,12 +3401,23 @@ class YTMediaDownloader(QWidget):
         self.remove_btn.clicked.connect(self.remove_selected_queue_items)
         btns.addWidget(self.add_btn)
         btns.addWidget(self.remove_btn)
+        self.apply_preset_btn = QPushButton("套用預設到勾選項目")
+        self.apply_preset_btn.clicked.connect(self.apply_preset_to_checked)
+        btns.addWidget(self.apply_preset_btn)
         queue_layout.addWidget(self.queue_list)
         queue_layout.addLayout(btns)
         main_splitter.addWidget(queue_box)
 
         opts_box = QWidget()
         opts = QHBoxLayout(opts_box)
+        opts.addWidget(QLabel("預設："))
+        self.preset_combo = QComboBox()
+        self._reload_preset_combo()
+        self.preset_combo.currentIndexChanged.connect(self._on_preset_changed)
+        opts.addWidget(self.preset_combo)
+        save_preset_btn = QPushButton("儲存預設")
+        save_preset_btn.clicked.connect(self.save_current_as_preset)
+        opts.addWidget(save_preset_btn)
         self.res_label = QLabel("解析度：")
         opts.addWidget(self.res_label)
         self.res_combo = QComboBox()
@@ -270,6 +3426,12 @@ class YTMediaDownloader(QWidget):
         opts.addWidget(self.audio_label)
         self.audio_combo = QComboBox()
         opts.addWidget(self.audio_combo)
+        self.audio_targets_input = QLineEdit()
+        self.audio_targets_input.setPlaceholderText("多格式輸出，如 mp3,opus")
+        self.audio_targets_input.setFixedWidth(180)
+        opts.addWidget(self.audio_targets_input)
+        self.loudnorm_checkbox = QCheckBox("音量標準化")
+        opts.addWidget(self.loudnorm_checkbox)
         self.audio_only = QCheckBox("僅音訊")
         opts.addWidget(self.audio_only)
         self.audio_only.toggled.connect(self._toggle_audio_mode)
@@ -279,6 +3441,21 @@ class YTMediaDownloader(QWidget):
         self.ext_combo.addItems(["mp4", "mkv", "webm"])
         self.ext_combo.setCurrentText("mp4")
         opts.addWidget(self.ext_combo)
+        opts.addWidget(QLabel("片段："))
+        self.chapter_combo = QComboBox()
+        self.chapter_combo.addItem("完整影片")
+        self.chapter_combo.currentIndexChanged.connect(self._on_chapter_changed)
+        opts.addWidget(self.chapter_combo)
+        self.section_start_input = QLineEdit()
+        self.section_start_input.setPlaceholderText("開始 hh:mm:ss")
+        self.section_start_input.setFixedWidth(110)
+        opts.addWidget(self.section_start_input)
+        self.section_end_input = QLineEdit()
+        self.section_end_input.setPlaceholderText("結束 hh:mm:ss")
+        self.section_end_input.setFixedWidth(110)
+        opts.addWidget(self.section_end_input)
+        self.precise_cut = QCheckBox("精確切點")
+        opts.addWidget(self.precise_cut)
         main_splitter.addWidget(opts_box)
 
         cmd_box = QWidget()
@@ -291,6 +3468,51 @@ class YTMediaDownloader(QWidget):
         choose.clicked.connect(self.choose_directory)
         d.addWidget(choose)
         cmd_layout.addLayout(d)
+        scratch_row = QHBoxLayout()
+        scratch_row.addWidget(QLabel("暫存到："))
+        self.scratch_label = QLabel("（與下載資料夾相同）")
+        scratch_row.addWidget(self.scratch_label, 3)
+        choose_scratch = QPushButton("選擇暫存資料夾")
+        choose_scratch.clicked.connect(self.choose_scratch_directory)
+        scratch_row.addWidget(choose_scratch)
+        clear_scratch = QPushButton("清除")
+        clear_scratch.clicked.connect(lambda: self.set_scratch_directory(None))
+        scratch_row.addWidget(clear_scratch)
+        cmd_layout.addLayout(scratch_row)
+        template_row = QHBoxLayout()
+        template_row.addWidget(QLabel("檔名範本："))
+        self.filename_template_input = QLineEdit()
+        self.filename_template_input.setPlaceholderText(
+            "%(title)s，可用 %(uploader)s/%(upload_date)s %(title)s 等 yt-dlp 範本"
+        )
+        self.filename_template_input.editingFinished.connect(
+            self._on_filename_template_changed
+        )
+        template_row.addWidget(self.filename_template_input)
+        cmd_layout.addLayout(template_row)
+        post_row = QHBoxLayout()
+        self.tag_checkbox = QCheckBox("寫入標籤與章節")
+        self.tag_checkbox.toggled.connect(self._on_post_download_changed)
+        post_row.addWidget(self.tag_checkbox)
+        self.artwork_checkbox = QCheckBox("嵌入封面")
+        self.artwork_checkbox.toggled.connect(self._on_post_download_changed)
+        post_row.addWidget(self.artwork_checkbox)
+        post_row.addWidget(QLabel("媒體庫："))
+        self.library_label = QLabel("（不移動）")
+        post_row.addWidget(self.library_label, 2)
+        choose_library = QPushButton("選擇媒體庫")
+        choose_library.clicked.connect(self.choose_library_directory)
+        post_row.addWidget(choose_library)
+        clear_library = QPushButton("清除")
+        clear_library.clicked.connect(lambda: self.set_library_directory(None))
+        post_row.addWidget(clear_library)
+        self.library_template_input = QLineEdit()
+        self.library_template_input.setPlaceholderText("媒體庫子資料夾，如 %(uploader)s")
+        self.library_template_input.editingFinished.connect(
+            self._on_library_template_changed
+        )
+        post_row.addWidget(self.library_template_input, 2)
+        cmd_layout.addLayout(post_row)
         self.cmd_text = QTextEdit()
         self.cmd_text.setFixedHeight(60)
         self.cmd_text.setReadOnly(False)
@@ -314,7 +3536,27 @@ class YTMediaDownloader(QWidget):
         self.log_checkbox = QCheckBox("顯示訊息記錄")
         self.log_checkbox.setChecked(False)
         self.log_checkbox.toggled.connect(self.toggle_log_output)
-        bottom_layout.addWidget(self.log_checkbox)
+        diagnostics_row = QHBoxLayout()
+        diagnostics_row.addWidget(self.log_checkbox)
+        self.trace_checkbox = QCheckBox("效能追蹤")
+        self.trace_checkbox.toggled.connect(self.toggle_tracing)
+        diagnostics_row.addWidget(self.trace_checkbox)
+        self.profile_checkbox = QCheckBox("取樣分析")
+        self.profile_checkbox.toggled.connect(self.toggle_profiler)
+        diagnostics_row.addWidget(self.profile_checkbox)
+        diagnostics_row.addStretch()
+        bottom_layout.addLayout(diagnostics_row)
+        capture_row = QHBoxLayout()
+        self.capture_list = QListWidget()
+        self.capture_list.setMaximumHeight(80)
+        capture_row.addWidget(self.capture_list)
+        self.stop_capture_btn = QPushButton("停止錄製")
+        self.stop_capture_btn.clicked.connect(self.stop_selected_capture)
+        capture_row.addWidget(self.stop_capture_btn)
+        self.capture_box = QWidget()
+        self.capture_box.setLayout(capture_row)
+        self.capture_box.setVisible(False)
+        bottom_layout.addWidget(self.capture_box)
         self.log_output = QTextEdit()
         self.log_output.setReadOnly(True)
         self.log_output.setVisible(False)
@@ -333,6 +3575,50 @@ class YTMediaDownloader(QWidget):
             self.dir_label.setText(last_download_path)
         else:
             self.dir_label.setText(os.path.join(os.path.expanduser("~"), "Downloads"))
+        scratch_path = self.settings.value("scratch_path", "")
+        if scratch_path and os.path.isdir(scratch_path):
+            self.set_scratch_directory(scratch_path, persist=False)
+        template = self.settings.value("filename_template", "")
+        if template:
+            self.filename_template_input.setText(template)
+            self.filename_template = template
+        if self.settings.value("queue_grid", False, type=bool):
+            self.grid_view_checkbox.setChecked(True)
+        library_template = self.settings.value("library_template", "")
+        if library_template:
+            self.library_template_input.setText(library_template)
+            self.library_template = library_template
+        library_path = self.settings.value("library_path", "")
+        if library_path and os.path.isdir(library_path):
+            self.set_library_directory(library_path, persist=False)
+        self.tag_checkbox.setChecked(self.settings.value("post_tags", False, type=bool))
+        self.artwork_checkbox.setChecked(
+            self.settings.value("post_artwork", False, type=bool)
+        )
+
+    def _on_filename_template_changed(self):
+        template = self.filename_template_input.text().strip()
+        self.filename_template = template or OutputPathPlanner.DEFAULT_TEMPLATE
+        self.settings.setValue("filename_template", template)
+
+    def _on_library_template_changed(self):
+        template = self.library_template_input.text().strip()
+        self.library_template = template or "%(uploader)s"
+        self.settings.setValue("library_template", template)
+        if self.library_dir:
+            self.set_library_directory(self.library_dir, persist=False)
+
+    def _on_post_download_changed(self, _checked=None):
+        steps = []
+        if self.tag_checkbox.isChecked():
+            steps.append(TagStep.name)
+        if self.artwork_checkbox.isChecked():
+            steps.append(ArtworkStep.name)
+        if self.library_dir:
+            steps.append(LibraryStep.name)
+        self.post_download_steps = steps
+        self.settings.setValue("post_tags", self.tag_checkbox.isChecked())
+        self.settings.setValue("post_artwork", self.artwork_checkbox.isChecked())
 
     def _toggle_audio_mode(self, checked):
         self.res_label.setVisible(not checked)
@@ -341,6 +3627,8 @@ class YTMediaDownloader(QWidget):
         self.ext_combo.setVisible(not checked)
         self.audio_label.setVisible(checked)
         self.audio_combo.setVisible(checked)
+        self.audio_targets_input.setVisible(checked)
+        self.loudnorm_checkbox.setVisible(checked)
 
     def analyze_url(self):
         url = self.url_input.text().strip()
@@ -358,28 +3646,33 @@ class YTMediaDownloader(QWidget):
             self.status.setText("請提供影片連結")
             return
 
-        analysis_url = url
+        self.network.submit(self._analyze(url))
 
-        def job(target_url):
-            try:
-                ydl_opts = {
-                    "quiet": True,
-                    "skip_download": True,
-                    "forcethumbnail": True,
-                    "noplaylist": True,
-                }
-                info = YoutubeDL(ydl_opts).extract_info(target_url, download=False)
-                self.info = info
-                self.formats = info.get("formats", [])
-                self.analyzed.emit()
-            except Exception as e:
-                self.err_signal.emit(f"解析失敗：{e}")
-                self.thumbnail_error_signal.emit()
-                self.analyze_button_signal.emit(True)
-
-        import threading
+    @traced("analysis.extract", "analysis")
+    def _extract_for_analysis(self, url, timeout=None):
+        opts = {"ignore_no_formats_error": True}
+        if timeout is not None:
+            opts["logger"] = ExtractionDeadline(timeout)
+        with self.analysis_pool.acquire(opts) as ydl:
+            return ydl.extract_info(url, download=False)
 
-        threading.Thread(target=job, args=(analysis_url,), daemon=True).start()
+    async def _analyze(self, url):
+        try:
+            info = await self.network.run_blocking(
+                self._extract_for_analysis,
+                url,
+                self.ANALYSIS_TIMEOUT,
+                timeout=self.ANALYSIS_TIMEOUT,
+            )
+            self.info = info
+            self.formats = info.get("formats", [])
+            self.analyzed.emit()
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                e = "分析逾時"
+            self.err_signal.emit(f"解析失敗：{e}")
+            self.thumbnail_error_signal.emit()
+            self.analyze_button_signal.emit(True)
 
     def _on_analysis_done(self):
         heights = sorted(
@@ -412,6 +3705,19 @@ class YTMediaDownloader(QWidget):
                     }
                     self.audio_codec_map[label] = codec_map.get(acodec, acodec)
 
+        self.chapter_combo.blockSignals(True)
+        self.chapter_combo.clear()
+        self.chapter_combo.addItem("完整影片", None)
+        for chapter in (self.info or {}).get("chapters") or []:
+            label = (
+                f"{formatSeconds(int(chapter.get('start_time') or 0))} "
+                f"{chapter.get('title') or ''}"
+            )
+            self.chapter_combo.addItem(label, chapter)
+        self.chapter_combo.blockSignals(False)
+        self.section_start_input.clear()
+        self.section_end_input.clear()
+
         self.audio_combo.clear()
         if audio_exts:
             self.audio_combo.addItems(audio_exts)
@@ -420,7 +3726,12 @@ class YTMediaDownloader(QWidget):
             self.audio_map = {"m4a (aac)": "m4a"}
             self.audio_codec_map = {"m4a (aac)": "aac"}
 
-        self.status.setText("分析完成")
+        live_status = (self.info or {}).get("live_status")
+        if live_status in LIVE_STATES:
+            kind = "首播／預定直播" if live_status == "is_upcoming" else "直播"
+            self.status.setText(f"分析完成：這是{kind}，加入佇列或按「錄製直播」會建立錄製任務")
+        else:
+            self.status.setText("分析完成")
         self.analyze_btn.setEnabled(True)
 
         if self.info and self.info.get("id"):
@@ -430,100 +3741,302 @@ class YTMediaDownloader(QWidget):
         self._update_add_button_state()
 
     def _load_thumbnail(self, video_id):
-        thumbnail_url = f"http://img.youtube.com/vi/{video_id}/hqdefault.jpg"
-
-        def download_and_set_thumbnail():
-            try:
-                with urllib.request.urlopen(thumbnail_url, timeout=5) as url_response:
-                    image_data = url_response.read()
+        size = self.thumbnail_label.size()
+        if self._thumbnail_future is not None:
+            self._thumbnail_future.cancel()
+        self._thumbnail_future = self.network.submit(
+            self._fetch_thumbnail(video_id, size.width(), size.height())
+        )
 
-                if image_data:
-                    self.thumbnail_loaded_signal.emit(image_data)
-                else:
+    async def _fetch_thumbnail(self, video_id, width, height):
+        try:
+            image_data = self._cached_cover_art(video_id, width)
+            if image_data is None:
+                url = thumbnail_url(video_id, width)
+                with TRACER.async_span("thumbnail.fetch", url=url):
+                    image_data = await self.network.fetch(url, timeout=self.THUMBNAIL_TIMEOUT)
+                if not image_data:
                     self.log_signal.emit("載入縮圖時收到空的資料", "error")
                     self.thumbnail_error_signal.emit()
-            except Exception as e:
-                self.log_signal.emit(f"載入縮圖失敗: {e}", "error")
+                    return
+                self._cache_cover_art(video_id, width, image_data)
+            image = await self.network.decode(decode_thumbnail, image_data, width, height)
+            if image is None:
+                self.log_signal.emit("載入縮圖失敗：無法從資料建立影像", "error")
                 self.thumbnail_error_signal.emit()
+                return
+            self.thumbnail_loaded_signal.emit(image)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                e = "逾時"
+            self.log_signal.emit(f"載入縮圖失敗: {e}", "error")
+            self.thumbnail_error_signal.emit()
 
-        import threading
-
-        threading.Thread(target=download_and_set_thumbnail, daemon=True).start()
+    def _cover_art_for(self, video_id):
+        future = self.network.submit(self._fetch_cover_art(video_id))
+        return future.result(self.THUMBNAIL_TIMEOUT + 1)
+
+    async def _fetch_cover_art(self, video_id):
+        image_data = self._cached_cover_art(video_id, self.COVER_ART_WIDTH)
+        if image_data is None:
+            url = thumbnail_url(video_id, self.COVER_ART_WIDTH)
+            with TRACER.async_span("cover.fetch", url=url):
+                image_data = await self.network.fetch(url, timeout=self.THUMBNAIL_TIMEOUT)
+            self._cache_cover_art(video_id, self.COVER_ART_WIDTH, image_data)
+        return image_data
+
+    # Thumbnail bytes are kept per video id with the variant width they were
+    # fetched at, so a larger cover fetched for tagging also serves the
+    # preview and a preview never shadows a larger cached image.
+    def _cached_cover_art(self, video_id, width):
+        cached = self.cover_art.get(video_id)
+        if cached is not None and cached[0] >= thumbnail_variant(width)[1]:
+            return cached[1]
+        return None
+
+    def _cache_cover_art(self, video_id, width, image_data):
+        variant_width = thumbnail_variant(width)[1]
+        cached = self.cover_art.get(video_id)
+        if cached is None or cached[0] <= variant_width:
+            self.cover_art.put(video_id, (variant_width, image_data))
 
     def _set_thumbnail_placeholder(self, text="無縮圖"):
         self.thumbnail_label.setPixmap(QPixmap())
         self.thumbnail_label.setText(text)
 
-    def _set_thumbnail_pixmap(self, image_data):
-        if not image_data:
-            self._set_thumbnail_error()
-            return
+    @traced("ui.thumbnail", "ui")
+    def _set_thumbnail_pixmap(self, image):
+        self.thumbnail_label.setPixmap(QPixmap.fromImage(image))
+        self.thumbnail_label.setText("")
 
-        qimage = QImage()
-        if not qimage.loadFromData(image_data):
-            self.log_signal.emit("載入縮圖失敗：無法從資料建立影像", "error")
-            self._set_thumbnail_error()
+    def _set_thumbnail_error(self):
+        self._set_thumbnail_placeholder("載入縮圖失敗")
+
+    def _set_queue_grid_mode(self, enabled):
+        self.settings.setValue("queue_grid", enabled)
+        if enabled:
+            self.queue_list.setViewMode(QListWidget.IconMode)
+            self.queue_list.setIconSize(self.GRID_ICON_SIZE)
+            self.queue_list.setGridSize(self.GRID_CELL_SIZE)
+            self.queue_list.setResizeMode(QListWidget.Adjust)
+            self.queue_list.setMovement(QListWidget.Static)
+            self.queue_list.setWordWrap(True)
+            self.queue_list.setTextElideMode(Qt.ElideRight)
+            self.queue_list.setLayoutMode(QListWidget.Batched)
+            self.queue_list.setBatchSize(200)
+            self._schedule_grid_refresh()
             return
+        self.queue_list.setViewMode(QListWidget.ListMode)
+        self.queue_list.setGridSize(QSize())
+        self.queue_list.setWordWrap(False)
+        self.queue_list.setLayoutMode(QListWidget.SinglePass)
+        for future in self._grid_futures.values():
+            future.cancel()
+        self._grid_futures.clear()
+        self._clear_grid_icons()
+
+    def _clear_grid_icons(self, keep=()):
+        retained = []
+        for item in self._grid_iconed:
+            if id(item) in keep:
+                retained.append(item)
+            else:
+                item.setIcon(QIcon())
+        self._grid_iconed = retained
+
+    def _on_queue_scrolled(self, value):
+        if value != self._grid_scroll_value:
+            self._grid_scroll_direction = 1 if value > self._grid_scroll_value else -1
+            self._grid_scroll_value = value
+        self._schedule_grid_refresh()
+
+    def _schedule_grid_refresh(self, *args):
+        if self.grid_view_checkbox.isChecked():
+            self._grid_timer.start()
+
+    def _grid_window(self):
+        count = self.queue_list.count()
+        if not count:
+            return range(0)
+        cell = self.queue_list.gridSize()
+        viewport = self.queue_list.viewport().size()
+        first = self.queue_list.indexAt(
+            QPoint(cell.width() // 2, cell.height() // 2)
+        ).row()
+        first = max(first, 0)
+        columns = max(1, viewport.width() // cell.width())
+        page = columns * (viewport.height() // cell.height() + 2)
+        ahead, behind = page, page // 2
+        if self._grid_scroll_direction < 0:
+            ahead, behind = behind, ahead
+        return range(max(0, first - behind), min(count, first + page + ahead))
+
+    @traced("ui.grid_refresh", "ui")
+    def _refresh_grid_thumbnails(self):
+        if not self.grid_view_checkbox.isChecked():
+            return
+        wanted = {}
+        window_items = []
+        for row in self._grid_window():
+            item = self.queue_list.item(row)
+            item_data = item.data(Qt.UserRole) or {}
+            video_id = item_data.get("video_id")
+            if not video_id:
+                match = VIDEO_ID_RE.search(item_data.get("url", ""))
+                video_id = match.group(1) if match else None
+            if not video_id:
+                continue
+            window_items.append(item)
+            wanted.setdefault(video_id, []).append(item)
+
+        self._clear_grid_icons(keep={id(item) for item in window_items})
+        for video_id in list(self._grid_futures):
+            if video_id not in wanted:
+                self._grid_futures.pop(video_id).cancel()
+
+        iconed = {id(item) for item in self._grid_iconed}
+        for video_id, items in wanted.items():
+            pixmap = self._grid_thumbnails.get(video_id)
+            if pixmap is not None:
+                for item in items:
+                    if id(item) not in iconed:
+                        item.setIcon(QIcon(pixmap))
+                        self._grid_iconed.append(item)
+            elif (
+                video_id not in self._grid_futures
+                and not self._grid_backing_off(video_id)
+                and len(self._grid_futures) < self.GRID_MAX_PENDING
+            ):
+                self._grid_futures[video_id] = self.network.submit(
+                    self._fetch_queue_thumbnail(video_id)
+                )
 
-        pixmap = QPixmap.fromImage(qimage)
-        scaled_pixmap = pixmap.scaled(
-            self.thumbnail_label.size(),
-            Qt.KeepAspectRatio,
-            Qt.SmoothTransformation,
+    async def _fetch_queue_thumbnail(self, video_id):
+        size = self.GRID_ICON_SIZE
+        image = QImage()
+        missing = False
+        try:
+            with TRACER.async_span("grid_thumbnail.fetch", video_id=video_id):
+                image_data = await self.network.fetch(
+                    thumbnail_url(video_id, size.width()), timeout=self.THUMBNAIL_TIMEOUT
+                )
+            decoded = await self.network.decode(
+                decode_thumbnail, image_data, size.width(), size.height()
+            )
+            if decoded is not None:
+                image = decoded
+        except asyncio.CancelledError:
+            raise
+        except HTTPStatusError as e:
+            missing = e.status == 404
+        except Exception:
+            pass
+        self.queue_thumbnail_signal.emit(video_id, image, missing)
+
+    def _grid_backing_off(self, video_id):
+        failure = self._grid_failed.get(video_id)
+        if failure is None:
+            return False
+        retry_at, _ = failure
+        return retry_at is None or retry_at > time.monotonic()
+
+    def _on_queue_thumbnail_loaded(self, video_id, image, missing):
+        if self._grid_futures.pop(video_id, None) is None:
+            return
+        if not image.isNull():
+            self._grid_failed.pop(video_id, None)
+            self._grid_thumbnails.put(video_id, QPixmap.fromImage(image))
+        elif missing:
+            # Only a 404 means the video has no thumbnail; keep it blank.
+            self._grid_failed[video_id] = (None, 0)
+        else:
+            attempts = self._grid_failed.get(video_id, (None, 0))[1] + 1
+            delay = min(self.GRID_RETRY_MAX, self.GRID_RETRY_BASE * 2 ** (attempts - 1))
+            self._grid_failed[video_id] = (time.monotonic() + delay, attempts)
+            QTimer.singleShot(int(delay * 1000) + 50, self._refresh_grid_thumbnails)
+        self._refresh_grid_thumbnails()
+
+    def _on_chapter_changed(self, index):
+        chapter = self.chapter_combo.itemData(index)
+        if not chapter:
+            self.section_start_input.clear()
+            self.section_end_input.clear()
+            return
+        self.section_start_input.setText(formatSeconds(int(chapter.get("start_time") or 0)))
+        end_time = chapter.get("end_time")
+        self.section_end_input.setText(formatSeconds(int(end_time)) if end_time else "")
+
+    def _current_section(self):
+        start_text = self.section_start_input.text().strip()
+        end_text = self.section_end_input.text().strip()
+        chapter = self.chapter_combo.currentData()
+        return parse_section(
+            start_text,
+            end_text,
+            chapter.get("title") if chapter else None,
+            self.precise_cut.isChecked(),
         )
-        self.thumbnail_label.setPixmap(scaled_pixmap)
-        self.thumbnail_label.setText("")
 
-    def _set_thumbnail_error(self):
-        self._set_thumbnail_placeholder("載入縮圖失敗")
+    def _current_format_spec(self, include_section=True):
+        section = self._current_section() if include_section else None
+        preset = self.preset_combo.currentData()
+        if preset:
+            spec = self._parse_format_options(self.format_presets[preset])
+            spec["section"] = section
+            return spec
+        if self.audio_only.isChecked():
+            audio_label = self.audio_combo.currentText()
+            audio_targets = parse_audio_targets(self.audio_targets_input.text())
+            return {
+                "is_audio": True,
+                "format_param": self.audio_codec_map.get(audio_label, "aac"),
+                "ext_param": self.audio_map.get(audio_label, "m4a"),
+                "section": section,
+                "audio_targets": audio_targets,
+                "loudnorm": self.loudnorm_checkbox.isChecked(),
+                "audio_quality": "0",
+            }
+        resolution = self.res_combo.currentText()
+        return {
+            "is_audio": False,
+            "format_param": resolution.replace("p", "") if resolution else None,
+            "ext_param": self.ext_combo.currentText(),
+            "section": section,
+            "audio_targets": [],
+            "loudnorm": False,
+        }
 
     def add_current_to_queue(self):
         url = self.url_input.text().strip()
         if not self.info or not url:
             QMessageBox.warning(self, "提醒", "請先分析影片並確保 URL 已填寫")
             return
+        if self.info.get("live_status") in LIVE_STATES:
+            self.start_capture(
+                url, self.capture_from_start_checkbox.isChecked(), self.dir_label.text()
+            )
+            self.status.setText("直播／首播已加入錄製")
+            return
+        try:
+            spec = self._current_format_spec()
+        except ValueError as e:
+            QMessageBox.warning(self, "提醒", str(e))
+            return
 
-        title = self.info.get("title", "No title")
-        video_id = self.info.get("id")
-
-        item_data = {
-            "url": url,
-            "title": title,
-            "video_id": video_id,
-        }
-
-        if self.audio_only.isChecked():
-            audio_label = self.audio_combo.currentText()
-            audio_format = self.audio_map.get(audio_label, "m4a")
-            acodec_format = self.audio_codec_map.get(audio_label, "aac")
-
-            queue_key = f"{video_id}|audio|{audio_format}"
-            display_text = f"{title} | 僅音訊 ({audio_format})"
-            item_data["is_audio_only"] = True
-            item_data["format_param"] = acodec_format
-            item_data["ext_param"] = audio_format
-            item_data["queue_key"] = queue_key
-        else:
-            resolution = self.res_combo.currentText()
-            container_format = self.ext_combo.currentText()
-            if resolution:
-                format_param = resolution.replace("p", "")
-                queue_key = f"{video_id}|{resolution}|{container_format}"
-                display_resolution = resolution
-            else:
-                format_param = None
-                display_resolution = "最佳可用"
-                queue_key = f"{video_id}|best|{container_format}"
-            display_text = f"{title} | {display_resolution} | {container_format}"
-            item_data["is_audio_only"] = False
-            item_data["format_param"] = format_param
-            item_data["ext_param"] = container_format
-            item_data["queue_key"] = queue_key
+        item_data, display_text = self._build_item_data(url, self.info, spec)
+        video_id = item_data["video_id"]
+        queue_key = item_data["queue_key"]
 
         if queue_key in self.queue_keys:
             self.status.setText("相同影片與參數已存在佇列")
             return
 
+        self.resolved_info.put(
+            video_id, url, self.info, self._compiled_for_item(item_data).options["format"]
+        )
+
         item = QListWidgetItem(display_text)
         item.setData(Qt.UserRole, item_data)
         item.setFlags(
@@ -544,6 +4057,163 @@ class YTMediaDownloader(QWidget):
         self._update_select_all_checkbox()
         self._update_remove_button_state()
 
+    def _queue_key_for(self, video_id, spec):
+        format_param = spec.get("format_param")
+        ext_param = spec.get("ext_param")
+        audio_targets = spec.get("audio_targets")
+        if spec.get("is_audio"):
+            if audio_targets:
+                key = f"{video_id}|audio|{'+'.join(audio_targets)}"
+            else:
+                key = f"{video_id}|audio|{ext_param}"
+                if (spec.get("audio_quality") or "0") != "0":
+                    key += f"|{spec['audio_quality']}k"
+            if spec.get("loudnorm"):
+                key += "|loudnorm"
+        elif format_param:
+            key = f"{video_id}|{format_param}p|{ext_param}"
+        else:
+            key = f"{video_id}|best|{ext_param}"
+        if spec.get("section"):
+            key += f"|{section_label(spec['section'])}"
+        return key
+
+    def _reload_preset_combo(self, selected=None):
+        self.preset_combo.blockSignals(True)
+        self.preset_combo.clear()
+        self.preset_combo.addItem("（自訂）", None)
+        for name in self.format_presets:
+            self.preset_combo.addItem(name, name)
+        index = self.preset_combo.findData(selected) if selected else 0
+        self.preset_combo.setCurrentIndex(max(index, 0))
+        self.preset_combo.blockSignals(False)
+
+    def _on_preset_changed(self, _index):
+        manual = self.preset_combo.currentData() is None
+        for widget in (
+            self.res_combo,
+            self.audio_combo,
+            self.audio_targets_input,
+            self.loudnorm_checkbox,
+            self.audio_only,
+            self.ext_combo,
+        ):
+            widget.setEnabled(manual)
+
+    def save_current_as_preset(self):
+        try:
+            spec = self._current_format_spec(include_section=False)
+        except ValueError as e:
+            QMessageBox.warning(self, "提醒", str(e))
+            return
+        name, ok = QInputDialog.getText(self, "儲存預設", "預設名稱：")
+        name = name.strip()
+        if not ok or not name:
+            return
+        self.format_presets[name] = self._options_from_spec(spec)
+        user_presets = {
+            key: value
+            for key, value in self.format_presets.items()
+            if BUILTIN_FORMAT_PRESETS.get(key) != value
+        }
+        self.settings.setValue(
+            "format_presets", json.dumps(user_presets, ensure_ascii=False)
+        )
+        self._reload_preset_combo(name)
+        self._on_preset_changed(self.preset_combo.currentIndex())
+        self.status.setText(f"已儲存預設：{name}")
+
+    def apply_preset_to_checked(self):
+        name = self.preset_combo.currentData()
+        if not name:
+            QMessageBox.warning(self, "提醒", "請先選擇要套用的預設")
+            return
+        preset_spec = self._parse_format_options(self.format_presets[name])
+        checked_items = self._get_checked_items()
+        keys = set(self.queue_keys)
+        replacements = {}
+        applied = skipped = 0
+        start = time.perf_counter()
+        self.queue_list.setUpdatesEnabled(False)
+        self._updating_check_state += 1
+        try:
+            for item in checked_items:
+                item_data = item.data(Qt.UserRole) or {}
+                video_id = item_data.get("video_id")
+                if not video_id or not item_data.get("url"):
+                    skipped += 1
+                    continue
+                spec = dict(preset_spec, section=item_data.get("section"))
+                new_data, display_text = self._build_item_data(
+                    item_data["url"],
+                    {"title": item_data.get("title"), "id": video_id},
+                    spec,
+                )
+                old_key, new_key = item_data.get("queue_key"), new_data["queue_key"]
+                if new_key == old_key:
+                    continue
+                if new_key in keys:
+                    skipped += 1
+                    continue
+                keys.discard(old_key)
+                keys.add(new_key)
+                replacements[old_key] = new_key
+                item.setData(Qt.UserRole, new_data)
+                item.setText(display_text)
+                applied += 1
+        finally:
+            self._updating_check_state -= 1
+            self.queue_list.setUpdatesEnabled(True)
+        self.queue_keys = [replacements.get(key, key) for key in self.queue_keys]
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.status.setText(f"已套用「{name}」到 {applied} 個項目，略過 {skipped} 個")
+        self.log_signal.emit(
+            f"[預設] 套用「{name}」：{applied} 個項目，略過 {skipped} 個，"
+            f"耗時 {elapsed_ms:.1f} ms",
+            "info",
+        )
+
+    def _build_item_data(self, url, info, spec):
+        title = info.get("title", "No title")
+        video_id = info.get("id")
+        is_audio = spec.get("is_audio", False)
+        format_param = spec.get("format_param")
+        ext_param = spec.get("ext_param")
+        section = spec.get("section")
+        audio_targets = spec.get("audio_targets") if is_audio else None
+        if is_audio and spec.get("loudnorm") and not audio_targets:
+            # Normalization runs in the ffmpeg fan-out, so route a single
+            # format through it as a one-target fan-out.
+            audio_targets = [single_audio_target(format_param, ext_param)]
+            spec = dict(spec, audio_targets=audio_targets, audio_quality="0")
+        audio_quality = spec.get("audio_quality") or "0"
+        if is_audio:
+            audio_text = "+".join(audio_targets) if audio_targets else ext_param
+            if audio_quality != "0" and not audio_targets:
+                audio_text += f" {audio_quality}k"
+            if spec.get("loudnorm"):
+                audio_text += "，標準化"
+            display_text = f"{title} | 僅音訊 ({audio_text})"
+        else:
+            display_resolution = f"{format_param}p" if format_param else "最佳可用"
+            display_text = f"{title} | {display_resolution} | {ext_param}"
+        if section:
+            display_text += f" | 片段 {section_label(section)}"
+        item_data = QueueItem(
+            url=url,
+            title=title,
+            video_id=video_id,
+            is_audio_only=is_audio,
+            format_param=format_param,
+            ext_param=ext_param,
+            queue_key=self._queue_key_for(video_id, spec),
+            section=section or None,
+            audio_targets=tuple(audio_targets) if audio_targets else None,
+            loudnorm=True if is_audio and spec.get("loudnorm") else None,
+            audio_quality=audio_quality if is_audio and audio_quality != "0" else None,
+        )
+        return item_data, display_text
+
     def remove_selected_queue_items(self):
         checked_items = self._get_checked_items()
         if not checked_items:
@@ -597,6 +4267,9 @@ class YTMediaDownloader(QWidget):
             self.queue_list.takeItem(row)
             if queue_key_to_remove and queue_key_to_remove in self.queue_keys:
                 self.queue_keys.remove(queue_key_to_remove)
+                video_id_prefix = queue_key_to_remove.split("|", 1)[0] + "|"
+                if not any(k.startswith(video_id_prefix) for k in self.queue_keys):
+                    self.resolved_info.discard(video_id_prefix[:-1])
         self.status.setText("已移除所選項目")
         self._update_select_all_checkbox()
         self._update_remove_button_state()
@@ -607,72 +4280,76 @@ class YTMediaDownloader(QWidget):
             initial_path = os.path.join(os.path.expanduser("~"), "Downloads")
 
         new_directory = QFileDialog.getExistingDirectory(
-            self, "選擇下載資料夾", initial_path
+            self, "選擇下載資料夾", initial_path
+        )
+
+        if new_directory:
+            self.dir_label.setText(new_directory)
+            if self._service_download_dir is not None:
+                self._service_download_dir = new_directory
+            self.settings.setValue("download_path", new_directory)
+            self.log_signal.emit(f"下載資料夾已更新並儲存為: {new_directory}", "info")
+
+    def choose_scratch_directory(self):
+        new_directory = QFileDialog.getExistingDirectory(
+            self, "選擇暫存資料夾", self.scratch_dir or self.dir_label.text()
         )
+        if new_directory:
+            self.set_scratch_directory(new_directory)
 
+    def choose_library_directory(self):
+        new_directory = QFileDialog.getExistingDirectory(
+            self, "選擇媒體庫資料夾", self.library_dir or self.dir_label.text()
+        )
         if new_directory:
-            self.dir_label.setText(new_directory)
-            self.settings.setValue("download_path", new_directory)
-            self.log_signal.emit(f"下載資料夾已更新並儲存為: {new_directory}", "info")
+            self.set_library_directory(new_directory)
+
+    def set_library_directory(self, directory, persist=True):
+        self.library_dir = directory or None
+        if directory:
+            self.post_pipeline.register(
+                LibraryStep(directory, self.library_template, self.path_planner)
+            )
+        self.library_label.setText(directory or "（不移動）")
+        if persist:
+            self.settings.setValue("library_path", directory or "")
+        self._on_post_download_changed()
+
+    def set_scratch_directory(self, directory, persist=True):
+        self.scratch_dir = directory or None
+        self.scratch_label.setText(directory or "（與下載資料夾相同）")
+        if persist:
+            self.settings.setValue("scratch_path", directory or "")
+        if directory:
+            self.log_signal.emit(f"暫存資料夾已設定為: {directory}", "info")
 
     def generate_command(self):
         url = self.url_input.text().strip() or "<URL>"
-        resolution_text = self.res_combo.currentText()
-        res = resolution_text.replace("p", "") if resolution_text else None
-        ext = self.ext_combo.currentText()
+        try:
+            spec = self._current_format_spec()
+        except ValueError:
+            spec = self._current_format_spec(include_section=False)
+        compiled = compile_format(
+            spec["is_audio"],
+            spec.get("format_param"),
+            spec.get("ext_param"),
+            tuple(spec.get("audio_targets") or ()),
+            spec.get("audio_quality") or "0",
+        )
         cmd = ["yt-dlp"]
-        if self.audio_only.isChecked():
-            audio_label = self.audio_combo.currentText()
-            audio_map = getattr(self, "audio_map", {})
-            audio_codec_map = getattr(self, "audio_codec_map", {})
-            container = audio_map.get(audio_label)
-            codec = audio_codec_map.get(audio_label)
-            if not container and audio_label:
-                container = audio_label.split(" ")[0]
-            if not codec and audio_label:
-                codec = audio_label.split(" ")[0]
-            if not container:
-                container = "m4a"
-            if not codec:
-                codec = container
-
-            if container == "webm" and codec == "opus":
-                cmd += [
-                    "-f",
-                    "bestaudio[ext=webm]/bestaudio",
-                ]
-            else:
-                valid_formats = {
-                    "best",
-                    "aac",
-                    "flac",
-                    "mp3",
-                    "m4a",
-                    "opus",
-                    "vorbis",
-                    "wav",
-                    "alac",
-                }
-                audio_format_arg = (
-                    container
-                    if container in valid_formats
-                    else (codec if codec in valid_formats else "best")
-                )
-                cmd += [
-                    "-f",
-                    "bestaudio",
-                    "--extract-audio",
-                    "--audio-format",
-                    audio_format_arg,
-                ]
-        else:
-            format_expr = (
-                f"bestvideo[height<={res}]+bestaudio/best"
-                if res
-                else "bestvideo+bestaudio/best"
-            )
-            cmd += ["-f", format_expr]
-            cmd += ["--merge-output-format", ext]
+        for arg in compiled.cli_args:
+            cmd.append(f'"{arg}"' if any(ch in arg for ch in ' []<>=|&') else arg)
+
+        section = spec.get("section")
+        if section:
+            end = section["end"]
+            end_arg = formatSeconds(end, msec=True) if end is not None else "inf"
+            cmd += [
+                "--download-sections",
+                f'"*{formatSeconds(section["start"], msec=True)}-{end_arg}"',
+            ]
+            if section["precise"]:
+                cmd.append("--force-keyframes-at-cuts")
 
         ffmpeg_path = self._get_ffmpeg_path()
         ffmpeg_arg = ffmpeg_path
@@ -680,7 +4357,8 @@ class YTMediaDownloader(QWidget):
             ffmpeg_arg = f'"{ffmpeg_path}"'
         cmd += ["--ffmpeg-location", ffmpeg_arg]
 
-        outtpl = os.path.join(self.dir_label.text(), "%(title)s.%(ext)s")
+        template = re.sub(r"\.%\(ext\)s$", "", self.filename_template)
+        outtpl = os.path.join(self.dir_label.text(), f"{template}.%(ext)s")
         out_arg = outtpl
         if any(ch.isspace() for ch in outtpl):
             out_arg = f'"{outtpl}"'
@@ -718,7 +4396,8 @@ class YTMediaDownloader(QWidget):
             download_jobs.append(
                 {
                     "display_text": display_text,
-                    "data": copy.deepcopy(item_data),
+                    "data": item_data,
+                    "job_id": self.jobs.create(item_data.get("url"), display_text),
                 }
             )
 
@@ -739,89 +4418,95 @@ class YTMediaDownloader(QWidget):
             daemon=True,
         ).start()
 
-    def _sanitize_filename(self, title):
-        return re.sub(r'[\\/:*?"<>|]', "_", title)
+    @traced("plan.paths", "job")
+    def _plan_output_paths(self, jobs, download_dir):
+        requests = []
+        for job in jobs:
+            item_data = job.get("data") or {}
+            video_id = item_data.get("video_id")
+            info = self.resolved_info.peek(video_id) or {
+                "id": video_id,
+                "title": item_data.get("title")
+                or os.path.basename(item_data.get("url") or "")
+                or OutputPathPlanner.FALLBACK_NAME,
+            }
+            section = item_data.get("section")
+            suffix = f" [{section_label(section)}]" if section else ""
+            components = self.path_planner.render(self.filename_template, info, suffix)
+            requests.append((download_dir, components, video_id))
+        bases = self.path_planner.plan(requests)
+        for job, base in zip(jobs, bases):
+            job["output_base"] = base
+        return bases
 
     def _start_batch_download(self, download_jobs, download_dir):
         total_items = len(download_jobs)
-        try:
-            for i, job in enumerate(download_jobs):
-                item_data = job.get("data") or {}
-                display_text = (
-                    job.get("display_text")
-                    or item_data.get("title")
-                    or item_data.get("url")
-                    or "未命名項目"
-                )
-
-                url = item_data.get("url")
-                if not url:
-                    self.log_signal.emit(
-                        f"錯誤：項目 {display_text} 缺少下載連結。", "error"
-                    )
-                    continue
-
-                title_source = item_data.get("title") or os.path.basename(url)
-                title = self._sanitize_filename(title_source or "未命名項目")
-                is_audio = item_data.get("is_audio_only", False)
-                format_param = item_data.get("format_param")
-                ext_param = item_data.get("ext_param")
-                out_base = os.path.join(download_dir, title)
-                outtmpl = f"{out_base}.%(ext)s"
-
-                self.status_signal.emit(f"下載中 {i+1}/{total_items}: {display_text}")
-                self.log_signal.emit(f"[下載] {display_text}", "info")
-
-                opts = {
-                    "progress_hooks": [self._progress_hook],
-                    "postprocessor_hooks": [self._postprocessor_hook],
-                    "noplaylist": True,
-                    "outtmpl": outtmpl,
-                    "quiet": True,
-                    "retries": 3,
-                }
-                opts["ffmpeg_location"] = self._get_ffmpeg_path()
-
-                if is_audio:
-                    self._setup_audio_options(opts, format_param, ext_param)
-                else:
-                    self._setup_video_options(opts, format_param, ext_param)
-
-                final_path = None
-
-                def on_finish(d):
-                    nonlocal final_path
-                    if d.get("status") == "finished":
-                        final_path = d.get("filename")
-                        if final_path:
-                            self.log_signal.emit(
-                                f"完成: {os.path.basename(final_path)}", "success"
-                            )
-
-                opts["progress_hooks"].append(on_finish)
-
+        controller = AdaptiveConcurrency(
+            maximum=self.MAX_DOWNLOAD_WORKERS,
+            initial=self.DOWNLOAD_WORKERS,
+            postprocess_load=self.transcode_manager.load,
+        )
+        pending = collections.deque(download_jobs)
+        pending_lock = threading.Lock()
+        finished = threading.Event()
+
+        # Workers only take a controller slot around the transfer itself (see
+        # _download_planned_job); lease waits, disk admission and
+        # post-processing run outside the gate.
+        def worker():
+            while True:
+                with pending_lock:
+                    if not pending:
+                        return
+                    job = pending.popleft()
                 try:
-                    YoutubeDL(opts).download([url])
-                    self._verify_download_result(
-                        final_path,
-                        display_text,
-                        item_data,
-                        out_base,
-                        is_audio,
-                        format_param,
-                    )
+                    self._download_single_job(job, download_dir)
                 except Exception as e:
-                    msg = f"下載失敗：{display_text} - {str(e)}"
-                    self.log_signal.emit(msg, "error")
-                    self.err_signal.emit(msg)
                     import traceback
 
+                    self.log_signal.emit(f"[致命錯誤] {str(e)}", "error")
                     self.log_signal.emit(traceback.format_exc(), "error")
+                finally:
+                    self._release_output_base(job)
+
+        def monitor():
+            while not finished.wait(controller.INTERVAL):
+                with pending_lock:
+                    remaining = len(pending)
+                self._log_concurrency_decision(
+                    controller.tick(remaining + controller.waiting)
+                )
 
-                self.progress_signal.emit(0)
+        # Parallel jobs report per-job progress to the registry only; the
+        # progress bar and status line show the batch as a whole.
+        progress_listener = self._batch_progress_listener(
+            [job.get("job_id") for job in download_jobs]
+        )
+        self.jobs.add_listener(progress_listener)
+        try:
+            self._plan_output_paths(download_jobs, download_dir)
+            self._concurrency = controller
+            threading.Thread(target=monitor, daemon=True).start()
+            workers = [
+                threading.Thread(target=worker, daemon=True)
+                for _ in range(min(controller.maximum, total_items))
+            ]
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
 
             self.status_signal.emit("所有下載任務完成")
             self.log_signal.emit("所有下載任務完成", "success")
+            self.log_signal.emit(
+                f"[效能] 下載器集區：{self.download_pool.summary()}", "info"
+            )
+            if controller.decisions:
+                self.log_signal.emit(
+                    f"[並行] 並行數 {controller.sparkline('limit')}\n"
+                    f"[並行] 總速度 {controller.sparkline('throughput')}",
+                    "info",
+                )
 
         except Exception as e:
             self.status_signal.emit("批次下載發生錯誤")
@@ -831,121 +4516,645 @@ class YTMediaDownloader(QWidget):
             self.log_signal.emit(traceback.format_exc(), "error")
 
         finally:
+            finished.set()
+            self.jobs.remove_listener(progress_listener)
+            # Jobs that never reached a worker still hold the names planned for
+            # them; workers release the ones they picked up.
+            with pending_lock:
+                unstarted = list(pending)
+                pending.clear()
+            for job in unstarted:
+                self._release_output_base(job)
+            self._concurrency = None
             self.download_button_signal.emit(True)
 
-    def _get_ffmpeg_path(self):
-        if hasattr(sys, "_MEIPASS"):
-            return os.path.join(sys._MEIPASS, "ffmpeg.exe")
-        else:
-            exe_path = os.path.join(
-                os.path.abspath(os.path.dirname(__file__)), "ffmpeg.exe"
+    def _job_status(self, text):
+        # During a batch the status line shows aggregate progress instead.
+        if self._concurrency is None:
+            self.status_signal.emit(text)
+
+    def _batch_progress_listener(self, job_ids):
+        job_ids = [job_id for job_id in job_ids if job_id is not None]
+        watched = set(job_ids)
+
+        def listener(job):
+            if job["id"] not in watched:
+                return
+            done = running = 0
+            progress = 0.0
+            for job_id in job_ids:
+                state = self.jobs.get(job_id) or {}
+                if state.get("status") in JobRegistry.FINAL_STATES:
+                    done += 1
+                    progress += 100.0
+                elif state.get("status") == "running":
+                    running += 1
+                    progress += state.get("progress") or 0.0
+            percent = progress / len(job_ids)
+            self.progress_signal.emit(int(percent))
+            self.status_signal.emit(
+                f"下載中：{done}/{len(job_ids)} 完成，{running} 個進行中，總進度 {percent:.1f}%"
             )
-            return exe_path if os.path.exists(exe_path) else "ffmpeg"
 
-    def _setup_audio_options(self, opts, format_param, ext_param):
-        if format_param == "opus" and ext_param == "webm":
-            opts["format"] = "bestaudio[ext=webm]/bestaudio"
+        return listener
+
+    def _log_concurrency_decision(self, decision):
+        if decision["action"] == "hold":
+            return
+        self.log_signal.emit(
+            f"[並行] {decision['previous']} → {decision['limit']}（{decision['reason']}）："
+            f"總速度 {decision['throughput'] / 1e6:.1f} MB/s、"
+            f"單一任務 {decision['per_job'] / 1e6:.1f} MB/s、"
+            f"錯誤 {decision['errors']}、節流 {decision['throttled']}、"
+            f"轉檔負載 {decision['load']:.1f}",
+            "action",
+        )
+
+    def _throughput_hook(self, d):
+        controller = self._concurrency
+        if controller is None:
             return
+        key = d.get("tmpfilename") or d.get("filename")
+        downloaded = d.get("downloaded_bytes") or 0
+        if d.get("status") == "downloading":
+            controller.record_progress(key, downloaded, d.get("speed"))
+        elif d.get("status") in ("finished", "error"):
+            controller.record_progress(key, downloaded or d.get("total_bytes") or 0)
+            controller.forget(key)
+
+    def _job_display_text(self, job):
+        item_data = job.get("data") or {}
+        return (
+            job.get("display_text")
+            or item_data.get("title")
+            or item_data.get("url")
+            or "未命名項目"
+        )
 
-        opts["format"] = "bestaudio/best"
-
-        valid_formats = {
-            "best",
-            "aac",
-            "flac",
-            "mp3",
-            "m4a",
-            "opus",
-            "vorbis",
-            "wav",
-            "alac",
+    def _download_single_job(self, job, download_dir, interactive=True):
+        if not job.get("output_base"):
+            self._plan_output_paths([job], download_dir)
+        try:
+            with TRACER.span("job", display_text=self._job_display_text(job)):
+                return self._download_planned_job(job, download_dir, interactive)
+        finally:
+            self._release_output_base(job)
+
+    def _release_output_base(self, job):
+        base = job.pop("output_base", None)
+        if base:
+            self.path_planner.release(base)
+
+    def _expected_extension(self, item_data):
+        if not item_data.get("is_audio_only"):
+            return item_data.get("ext_param") or "mp4"
+        format_param = item_data.get("format_param")
+        ext_param = item_data.get("ext_param")
+        if format_param == "opus" and ext_param == "webm":
+            return None
+        target = ext_param or format_param
+        if target not in AUDIO_TARGETS and target != "best":
+            target = format_param
+        return AUDIO_TARGETS[target][0] if target in AUDIO_TARGETS else None
+
+    def _download_planned_job(self, job, download_dir, interactive=True):
+        item_data = job.get("data") or {}
+        display_text = self._job_display_text(job)
+        job_id = job.get("job_id")
+
+        url = item_data.get("url")
+        if not url:
+            self.log_signal.emit(f"錯誤：項目 {display_text} 缺少下載連結。", "error")
+            self.jobs.update(job_id, status="failed", error="missing url")
+            return {"status": "failed", "path": None, "error": "missing url"}
+        if self.jobs.is_cancelled(job_id):
+            self.jobs.update(job_id, status="cancelled")
+            return {"status": "cancelled", "path": None, "error": None}
+
+        audio_targets = item_data.get("audio_targets") or []
+        queue_key = item_data.get("queue_key")
+        output_keys = [f"{queue_key}#{t}" for t in audio_targets] or [queue_key]
+        manifest = self._verified_manifest(download_dir)
+        paths = self._verified_outputs(manifest, output_keys)
+        if paths:
+            self.log_signal.emit(
+                f"[驗證] 已存在且驗證過，略過下載：{os.path.basename(paths[0])}",
+                "success",
+            )
+            self.jobs.update(job_id, status="success", path=paths[0], progress=100.0)
+            return {"status": "success", "path": paths[0], "paths": paths, "error": None}
+
+        section = item_data.get("section")
+        work_dir = self.scratch_dir or download_dir
+        relative_base = os.path.relpath(job["output_base"], download_dir)
+        out_base = os.path.join(work_dir, relative_base)
+        os.makedirs(os.path.dirname(out_base), exist_ok=True)
+        source_base = f"{out_base}.source" if audio_targets else out_base
+        outtmpl = f"{source_base}.%(ext)s"
+        expected_ext = None if audio_targets else self._expected_extension(item_data)
+        expected_path = f"{out_base}.{expected_ext}" if expected_ext else None
+
+        self.log_signal.emit(f"[下載] {display_text}", "info")
+
+        controller = self._concurrency
+        progress_hook = self._progress_hook
+        if controller is not None:
+            progress_hook = functools.partial(self._progress_hook, report=False)
+        opts = {
+            "progress_hooks": [progress_hook],
+            "postprocessor_hooks": [self._postprocessor_hook],
+            "outtmpl": outtmpl,
         }
 
-        target = ext_param or format_param or "best"
-        if target not in valid_formats:
-            if format_param in valid_formats:
-                target = format_param
+        opts.update(self._compiled_for_item(item_data).job_options())
+        if section:
+            self._setup_section_options(opts, section)
+
+        final_path = None
+
+        def on_final_path(path):
+            nonlocal final_path
+            final_path = path
+            self.log_signal.emit(f"完成: {os.path.basename(path)}", "success")
+
+        opts["post_hooks"] = [on_final_path]
+        hasher = StreamHasher()
+        opts["progress_hooks"].append(hasher.progress_hook)
+        downloaded_info = {}
+
+        def capture_info(d):
+            if d.get("status") == "finished" and d.get("info_dict"):
+                downloaded_info["info"] = d["info_dict"]
+
+        opts["progress_hooks"].append(capture_info)
+        opts["progress_hooks"].append(self._throughput_hook)
+        reservation = None
+
+        def track_disk(d):
+            if reservation is None or d.get("status") not in ("downloading", "finished"):
+                return
+            key = d.get("tmpfilename") or d.get("filename") or ""
+            if key.endswith(".part"):
+                key = key[: -len(".part")]
+            written = d.get("downloaded_bytes") or d.get("total_bytes") or 0
+            self.disk_admission.record_written(reservation, work_dir, key, written)
+
+        opts["progress_hooks"].append(track_disk)
+        if controller is not None:
+            opts["logger"] = ThrottleLogger(controller.record_throttle, self.log_signal.emit)
+        if job_id is not None:
+            opts["progress_hooks"].append(self._make_job_progress_hook(job_id))
+        self.jobs.update(job_id, status="running", display_text=display_text)
+
+        leases = self._job_leases(download_dir)
+        try:
+            paths = self._claim_shared_job(
+                leases, job_id, queue_key, manifest, output_keys, display_text
+            )
+        except JobCancelled:
+            self.jobs.update(job_id, status="cancelled")
+            return {"status": "cancelled", "path": None, "paths": [], "error": None}
+        if paths:
+            self.jobs.update(job_id, status="success", path=paths[0], progress=100.0)
+            return {"status": "success", "path": paths[0], "paths": paths, "error": None}
+
+        result = {"status": "failed", "path": None, "paths": [], "error": None}
+        try:
+            reservation = self._reserve_disk_space(
+                job_id, item_data, work_dir, download_dir
+            )
+            gate = controller.transfer() if controller is not None else contextlib.nullcontext()
+            with gate:
+                setup_start = time.perf_counter()
+                with self.download_pool.acquire(opts) as ydl:
+                    setup_ms = (time.perf_counter() - setup_start) * 1000
+                    TRACER.complete("pool.acquire", setup_start)
+                    self.log_signal.emit(f"[效能] 下載器準備耗時 {setup_ms:.1f} ms", "info")
+                    download_start = time.perf_counter()
+                    self._download_with_cached_info(ydl, url, item_data)
+                    download_time = time.perf_counter() - download_start
+            downloaded_path = self._verify_download_result(
+                final_path or expected_path, expected_path, display_text
+            )
+            outputs = [downloaded_path] if downloaded_path else []
+            if downloaded_path and audio_targets:
+                outputs = self._fan_out_audio(
+                    downloaded_path,
+                    out_base,
+                    audio_targets,
+                    item_data.get("loudnorm", False),
+                    download_time,
+                )
+            if work_dir != download_dir:
+                moved = []
+                target_dir = os.path.dirname(job["output_base"])
+                for path in outputs:
+                    moved_path = commit_output_file(path, target_dir)
+                    hasher.relocate(path, moved_path)
+                    moved.append(moved_path)
+                outputs = moved
+            if outputs and self.post_download_steps:
+                outputs = self._run_post_download(
+                    outputs,
+                    item_data,
+                    downloaded_info.get("info"),
+                    hasher,
+                    bool(section),
+                )
+            if not outputs:
+                result["error"] = "output not found"
             else:
-                target = "best"
+                result["path"] = outputs[0]
+                result["paths"] = outputs
+                for key, path in zip(output_keys, outputs):
+                    result["error"] = self._check_integrity(
+                        path, hasher, item_data, manifest, key
+                    )
+                    if result["error"] is not None:
+                        break
+                else:
+                    result["status"] = "success"
+        except JobCancelled:
+            result["status"] = "cancelled"
+            self.log_signal.emit(f"[取消] {display_text}", "info")
+        except Exception as e:
+            if self.jobs.is_cancelled(job_id):
+                result["status"] = "cancelled"
+                if controller is None:
+                    self.progress_signal.emit(0)
+                self.jobs.update(job_id, status="cancelled")
+                return result
+            result["error"] = str(e)
+            msg = f"下載失敗：{display_text} - {str(e)}"
+            self.log_signal.emit(msg, "error")
+            if interactive:
+                self.err_signal.emit(msg)
+            import traceback
 
-        opts["postprocessors"] = [
-            {
-                "key": "FFmpegExtractAudio",
-                "preferredcodec": target,
-                "preferredquality": "0",
-            }
+            self.log_signal.emit(traceback.format_exc(), "error")
+        finally:
+            if reservation is not None:
+                self.disk_admission.release(reservation)
+            leases.release(queue_key)
+
+        if controller is None:
+            self.progress_signal.emit(0)
+        final_fields = {"path": result["path"], "error": result["error"]}
+        if result["status"] == "success":
+            final_fields["progress"] = 100.0
+        self.jobs.update(job_id, status=result["status"], **final_fields)
+        return result
+
+    def _run_post_download(self, outputs, item_data, info, hasher, clipped):
+        info = self.resolved_info.peek(item_data.get("video_id")) or info or {
+            "id": item_data.get("video_id"),
+            "title": item_data.get("title"),
+        }
+        self._job_status("正在寫入標籤與整理檔案…")
+        futures = [
+            self.post_pipeline.submit(path, info, self.post_download_steps, clipped)
+            for path in outputs
         ]
-
-    def _setup_video_options(self, opts, format_param, ext_param):
-        if format_param:
-            opts["format"] = f"bestvideo[height<={format_param}]+bestaudio/best"
-        else:
-            opts["format"] = "bestvideo+bestaudio/best"
-        opts["merge_output_format"] = ext_param
-
-        if ext_param == "mp4":
-            opts.setdefault("postprocessor_args", []).extend(
+        processed = []
+        for path, future in zip(outputs, futures):
+            ctx = future.result()
+            hasher.relocate(path, ctx.path)
+            timings = "、".join(f"{label} {seconds * 1000:.0f} ms" for label, seconds in ctx.timings)
+            self.log_signal.emit(f"[後製] {os.path.basename(ctx.path)}：{timings}", "info")
+            for note in ctx.notes:
+                self.log_signal.emit(f"[後製] {note}", "error")
+            processed.append(ctx.path)
+        return processed
+
+    def _verified_outputs(self, manifest, output_keys):
+        verified = [manifest.lookup(key) for key in output_keys]
+        if all(verified):
+            return [record["path"] for record in verified]
+        return None
+
+    def _job_leases(self, directory):
+        directory = os.path.abspath(directory)
+        leases = self._leases.get(directory)
+        if leases is None:
+            leases = self._leases[directory] = DirectoryLeases(directory, self.instance_id)
+        return leases
+
+    @traced("lease.claim", "job")
+    def _claim_shared_job(
+        self, leases, job_id, queue_key, manifest, output_keys, display_text
+    ):
+        if not queue_key:
+            return None
+        waiting = False
+        while True:
+            try:
+                if leases.acquire(queue_key):
+                    break
+            except OSError as e:
+                self.log_signal.emit(f"[協調] 無法建立租約，直接下載：{e}", "error")
+                return None
+            if not waiting:
+                holder = leases.holder(queue_key) or {}
+                self.log_signal.emit(
+                    f"[協調] {holder.get('host', '其他執行個體')} 正在下載"
+                    f"「{display_text}」，等待完成後沿用其輸出",
+                    "info",
+                )
+                self.jobs.update(job_id, status="waiting_peer")
+                waiting = True
+            for _ in range(self.LEASE_POLL_INTERVAL * 10):
+                if self.jobs.is_cancelled(job_id):
+                    raise JobCancelled()
+                time.sleep(0.1)
+            paths = self._verified_outputs(manifest, output_keys)
+            if paths:
+                self.log_signal.emit(
+                    f"[協調] 沿用其他執行個體的輸出：{os.path.basename(paths[0])}",
+                    "success",
+                )
+                return paths
+        if waiting:
+            self.jobs.update(job_id, status="running")
+        paths = self._verified_outputs(manifest, output_keys)
+        if paths:
+            leases.release(queue_key)
+        return paths
+
+    @traced("fan_out", "ffmpeg")
+    def _fan_out_audio(self, source_path, out_base, targets, loudnorm, download_time):
+        ffmpeg_path = self._get_ffmpeg_path()
+        source_arg = f"file:{source_path}"
+        filters = ""
+        decode_time = None
+        if loudnorm:
+            self._job_status("正在分析音量（EBU R128）…")
+            measure_start = time.perf_counter()
+            _, stderr, returncode = self.transcode_manager.run(
                 [
-                    "-c:v",
-                    "copy",
-                    "-c:a",
-                    "aac",
-                    "-b:a",
-                    "192k",
+                    ffmpeg_path,
+                    "-hide_banner",
+                    "-nostats",
+                    "-i",
+                    source_arg,
+                    "-vn",
+                    "-af",
+                    f"loudnorm={LOUDNORM_TARGET}:print_format=json",
+                    "-f",
+                    "null",
+                    "-",
                 ]
             )
+            decode_time = time.perf_counter() - measure_start
+            measured = parse_loudnorm_stats(stderr) if returncode == 0 else None
+            if measured is None:
+                self.log_signal.emit("[轉檔] 音量分析失敗，改用單次標準化", "error")
+                measured = LOUDNORM_TARGET
+            filters = f"loudnorm={measured},aresample=48000,"
+
+        labels = [f"[a{i}]" for i in range(len(targets))]
+        cmd = [
+            ffmpeg_path,
+            "-y",
+            "-hide_banner",
+            "-i",
+            source_arg,
+            "-filter_complex",
+            f"[0:a]{filters}asplit={len(targets)}{''.join(labels)}",
+        ]
+        outputs = []
+        for label, target in zip(labels, targets):
+            ext, codec_args = AUDIO_TARGETS[target]
+            output = f"{out_base}.{ext}"
+            cmd += ["-map", label, "-map_metadata", "0", "-vn", *codec_args]
+            cmd += ["-threads", str(self.transcode_manager.threads), f"file:{output}"]
+            outputs.append(output)
+
+        self._job_status(f"正在轉出 {len(targets)} 種音訊格式…")
+        _, stderr, returncode = self.transcode_manager.run(cmd)
+        if returncode != 0:
+            lines = (stderr or "").strip().splitlines()
+            raise RuntimeError(f"ffmpeg 轉檔失敗：{lines[-1] if lines else returncode}")
+
+        saved = len(targets) - 1
+        if saved > 0:
+            source_mb = os.path.getsize(source_path) / (1024 * 1024)
+            message = (
+                f"[轉檔] 單次下載輸出 {len(targets)} 種格式，省下 {saved} 次下載"
+                f"（約 {source_mb * saved:.1f} MB、{download_time * saved:.1f}s）"
+                f"與 {saved} 次解碼"
+            )
+            if decode_time is not None:
+                message += f"（約 {decode_time * saved:.1f}s）"
+            self.log_signal.emit(message, "success")
+        try:
+            os.remove(source_path)
+        except OSError:
+            pass
+        self._update_download_timestamp(outputs)
+        return outputs
+
+    @traced("disk.reserve", "job")
+    def _reserve_disk_space(self, job_id, item_data, work_dir, download_dir):
+        info = self.resolved_info.peek(item_data.get("video_id"))
+        work_bytes, output_bytes = estimate_disk_footprint(
+            info,
+            item_data.get("is_audio_only", False),
+            item_data.get("format_param"),
+            item_data.get("ext_param"),
+        )
+        audio_targets = item_data.get("audio_targets") or []
+        if len(audio_targets) > 1:
+            work_bytes += output_bytes * (len(audio_targets) - 1)
+            output_bytes *= len(audio_targets)
+        section = item_data.get("section")
+        duration = (info or {}).get("duration")
+        if section and duration:
+            fraction = min(1.0, section_length(section, duration) / duration)
+            work_bytes = int(work_bytes * fraction)
+            output_bytes = int(output_bytes * fraction)
+        requirements = {work_dir: work_bytes}
+        if work_dir != download_dir:
+            requirements[download_dir] = output_bytes
+
+        def on_wait(shortfall):
+            missing = sum(shortfall.values()) / (1024 * 1024)
+            self.jobs.update(job_id, status="waiting_disk")
+            self.status_signal.emit(f"磁碟空間不足，等待其他任務釋放空間（尚缺 {missing:.0f} MB）")
 
-    def _verify_download_result(
-        self,
-        final_downloaded_path,
-        display_text,
-        metadata,
-        out_base,
-        is_audio_only,
-        format_param,
-    ):
-        if final_downloaded_path and os.path.exists(final_downloaded_path):
-            self._update_download_timestamp(final_downloaded_path)
-            self.log_signal.emit(
-                f"完成下載：{display_text} -> {os.path.basename(final_downloaded_path)}",
-                "success",
+        try:
+            reservation = self.disk_admission.reserve(
+                requirements, lambda: self.jobs.is_cancelled(job_id), on_wait
+            )
+        except DiskSpaceError as e:
+            missing = sum(e.args[0].values()) / (1024 * 1024)
+            raise DiskSpaceError(f"磁碟空間不足，尚缺約 {missing:.0f} MB") from None
+        self.jobs.update(job_id, status="running")
+        return reservation
+
+    def _make_job_progress_hook(self, job_id):
+        last_update = 0.0
+
+        def hook(d):
+            nonlocal last_update
+            if self.jobs.is_cancelled(job_id):
+                raise JobCancelled(job_id)
+            if d.get("status") != "downloading":
+                return
+            now = time.monotonic()
+            if now - last_update < 0.5:
+                return
+            last_update = now
+            total = d.get("total_bytes") or d.get("total_bytes_estimate")
+            downloaded = d.get("downloaded_bytes") or 0
+            self.jobs.update(
+                job_id,
+                progress=round(downloaded / total * 100, 1) if total else None,
+                speed=d.get("speed"),
+                eta=d.get("eta"),
             )
-            return True
 
-        self.log_signal.emit("未能捕獲最終檔案路徑，正在搜尋可能的輸出檔案...", "info")
+        return hook
 
-        metadata = metadata or {}
-        ext_param = metadata.get("ext_param")
-        possible_extensions = []
+    @traced("download", "network")
+    def _download_with_cached_info(self, ydl, url, item_data):
+        info = self.resolved_info.get(
+            item_data.get("video_id"),
+            self.INFO_MIN_VALIDITY,
+            self._compiled_for_item(item_data).options["format"],
+        )
+        if info is None:
+            ydl.download([url])
+            return
+        self.log_signal.emit("[快取] 使用已解析的影片資訊，略過重新擷取", "info")
+        try:
+            ydl.process_ie_result(info, download=True)
+        except DownloadError as e:
+            self.log_signal.emit(f"[快取] 已解析資訊無法使用，改為重新擷取：{e}", "info")
+            ydl.download([url])
+
+    def _refresh_resolved_info(self):
+        while not self._refresh_stop.wait(self.INFO_REFRESH_INTERVAL):
+            for key, url in self.resolved_info.expiring(self.INFO_REFRESH_MARGIN):
+                if self._refresh_stop.is_set():
+                    return
+                try:
+                    with self.analysis_pool.acquire() as ydl:
+                        info = ydl.extract_info(url, download=False)
+                    if key in self.resolved_info:
+                        self.resolved_info.put(key, url, info)
+                    self.log_signal.emit(f"[快取] 已更新即將過期的影片資訊：{key}", "info")
+                except Exception as e:
+                    self.log_signal.emit(f"[快取] 更新影片資訊失敗：{key} - {e}", "error")
 
-        if ext_param:
-            possible_extensions.append(ext_param)
+    def _get_ffmpeg_path(self):
+        if hasattr(sys, "_MEIPASS"):
+            return os.path.join(sys._MEIPASS, "ffmpeg.exe")
+        else:
+            exe_path = os.path.join(
+                os.path.abspath(os.path.dirname(__file__)), "ffmpeg.exe"
+            )
+            return exe_path if os.path.exists(exe_path) else "ffmpeg"
 
-        if is_audio_only and format_param:
-            if format_param not in possible_extensions:
-                possible_extensions.append(format_param)
+    def _compiled_for_item(self, item_data):
+        return compile_format(
+            item_data.get("is_audio_only", False),
+            item_data.get("format_param"),
+            item_data.get("ext_param"),
+            tuple(item_data.get("audio_targets") or ()),
+            item_data.get("audio_quality") or "0",
+        )
 
-        if is_audio_only:
-            fallback_exts = ["m4a", "aac", "mp3", "flac", "opus", "wav", "webm"]
-        else:
-            fallback_exts = ["mp4", "mkv", "webm"]
+    def _setup_section_options(self, opts, section):
+        end = section.get("end")
+        opts["download_ranges"] = download_range_func(
+            None, [(section["start"], end if end is not None else float("inf"))]
+        )
+        opts["force_keyframes_at_cuts"] = bool(section.get("precise"))
 
-        for ext in fallback_exts:
-            if ext not in possible_extensions:
-                possible_extensions.append(ext)
+    def _on_transcode_complete(self, args, wall, cpu_times, threads):
+        if cpu_times:
+            cpu_text = f"CPU {sum(cpu_times):.2f}s（user {cpu_times[0]:.2f}s / sys {cpu_times[1]:.2f}s）"
+        else:
+            cpu_text = "CPU 時間無法取得"
+        self.log_signal.emit(
+            f"[轉檔] ffmpeg 完成：耗時 {wall:.2f}s，{cpu_text}，-threads {threads}",
+            "action",
+        )
 
-        for ext in possible_extensions:
-            potential_path = f"{out_base}.{ext}"
-            if os.path.exists(potential_path):
-                self._update_download_timestamp(potential_path)
+    @traced("verify", "fs")
+    def _verify_download_result(self, final_path, expected_path, display_text):
+        if final_path and os.path.exists(final_path):
+            if expected_path and os.path.abspath(final_path) != os.path.abspath(
+                expected_path
+            ):
                 self.log_signal.emit(
-                    f"找到輸出檔案：{os.path.basename(potential_path)}", "success"
+                    f"輸出檔案與預定路徑不同：{os.path.basename(final_path)}", "info"
                 )
-                return True
+            self._update_download_timestamp(final_path)
+            self.log_signal.emit(
+                f"完成下載：{display_text} -> {os.path.basename(final_path)}",
+                "success",
+            )
+            return final_path
 
         self.log_signal.emit(f"無法找到任何輸出檔案：{display_text}", "error")
-        return False
+        return None
+
+    def _verified_manifest(self, directory):
+        directory = os.path.abspath(directory)
+        manifest = self._verified_manifests.get(directory)
+        if manifest is None:
+            manifest = self._verified_manifests[directory] = VerifiedManifest(directory)
+        return manifest
 
+    def _get_ffprobe_path(self):
+        ffmpeg_path = self._get_ffmpeg_path()
+        directory, name = os.path.split(ffmpeg_path)
+        return os.path.join(directory, name.replace("ffmpeg", "ffprobe"))
+
+    @traced("integrity", "fs")
+    def _check_integrity(self, path, hasher, metadata, manifest, key=None):
+        problems = hasher.size_problems()
+        if problems:
+            error = "檔案大小不符：" + "；".join(problems)
+            self.log_signal.emit(f"[驗證] {error}", "error")
+            return error
+
+        duration = None
+        if hasher.duration:
+            duration = probe_media_duration(self._get_ffprobe_path(), path)
+            if duration is not None:
+                tolerance = max(2.0, hasher.duration * 0.01)
+                if abs(duration - hasher.duration) > tolerance:
+                    error = f"影片長度不符：{duration:.1f}s / {hasher.duration:.1f}s"
+                    self.log_signal.emit(f"[驗證] {error}", "error")
+                    return error
+
+        digest = hasher.digest_for(path)
+        if digest is None:
+            # ffmpeg wrote this file after the download, so hash it in full.
+            digest = file_sha256(path)
+        st = os.stat(path)
+        stored = manifest.store(
+            key or metadata.get("queue_key") or os.path.basename(path),
+            {
+                "path": os.path.abspath(path),
+                "size": st.st_size,
+                "mtime": int(st.st_mtime),
+                "sha256": digest,
+                "duration": duration,
+                "video_id": metadata.get("video_id"),
+                "verified_at": time.time(),
+            },
+        )
+        if not stored:
+            self.log_signal.emit(
+                f"[驗證] 無法寫入驗證紀錄（紀錄檔被鎖定或無法寫入）：{manifest.path}", "error"
+            )
+        self.log_signal.emit(f"[驗證] 檔案完整：{os.path.basename(path)}", "success")
+        return None
+
+    @traced("fs.timestamps", "fs")
     def _update_download_timestamp(self, path, timestamp=None):
         if not path:
             return
@@ -963,15 +5172,21 @@ class YTMediaDownloader(QWidget):
             pass
         set_windows_creation_time(normalized_path, ts)
 
-    def _progress_hook(self, d):
+    def _progress_hook(self, d, report=True):
         status = d.get("status")
         if status == "downloading":
-            try:
-                total = d.get("total_bytes") or d.get("total_bytes_estimate") or 1
-                downloaded = d.get("downloaded_bytes", 0)
-                p = downloaded / total * 100
-            except Exception:
-                p = 0.0
+            if not report:
+                return
+            total = d.get("total_bytes") or d.get("total_bytes_estimate")
+            downloaded = d.get("downloaded_bytes") or 0
+            if not total:
+                speed = d.get("speed")
+                speed_text = f"，{speed / (1024 * 1024):.2f} MB/s" if speed else ""
+                self.status_signal.emit(
+                    f"下載中：已下載 {downloaded / (1024 * 1024):.1f} MB{speed_text}"
+                )
+                return
+            p = downloaded / total * 100
 
             self.progress_signal.emit(int(p))
             eta = d.get("_eta_str")
@@ -981,7 +5196,8 @@ class YTMediaDownloader(QWidget):
                 self.status_signal.emit(f"下載中：{p:.1f}%")
 
         elif status == "postprocessing":
-            self.status_signal.emit("正在使用 FFmpeg 轉檔 / 合併…")
+            if report:
+                self.status_signal.emit("正在使用 FFmpeg 轉檔 / 合併…")
             self.log_queue.put(("[轉檔] 執行 FFmpeg...", "action"))
 
         elif status == "finished":
@@ -992,29 +5208,622 @@ class YTMediaDownloader(QWidget):
                 or info_dict.get("filepath")
             )
             self._update_download_timestamp(filename)
-            self.status_signal.emit("單一項目處理完成")
             self.log_queue.put(("[完成] 檔案已成功處理", "success"))
-            self.progress_signal.emit(100)
+            if report:
+                self.status_signal.emit("單一項目處理完成")
+                self.progress_signal.emit(100)
 
         elif status == "error":
-            self.status_signal.emit("下載失敗")
+            if report:
+                self.status_signal.emit("下載失敗")
             self.log_queue.put(("[錯誤] 下載失敗", "error"))
 
     def _postprocessor_hook(self, d):
+        name = f"pp.{d.get('postprocessor')}"
+        if d.get("status") == "started":
+            TRACER.begin(name, "ffmpeg")
+            return
         if d.get("status") != "finished":
             return
+        TRACER.end(name, "ffmpeg")
         filepath = d.get("filepath")
         if not filepath:
             info_dict = d.get("info_dict") or {}
             filepath = info_dict.get("_filename") or info_dict.get("filepath")
         self._update_download_timestamp(filepath)
 
+    def start_inbox_daemon(self, directory):
+        if not os.path.isdir(directory):
+            self.log_signal.emit(f"[收件匣] 找不到監看資料夾：{directory}", "error")
+            return
+        if self._service_download_dir is None:
+            self._service_download_dir = self.dir_label.text()
+        self.inbox_watcher = InboxWatcher(directory, self._process_inbox_file)
+        self.inbox_watcher.start()
+        self.status.setText(f"監看收件匣：{directory}")
+        self.log_signal.emit(f"[收件匣] 開始監看資料夾：{directory}", "info")
+
+    def _parse_format_options(self, options):
+        def option(index):
+            return options[index] if len(options) > index else ""
+
+        mode = option(0).lower()
+        if mode == "preset":
+            preset = self.format_presets.get(option(1))
+            if preset is None:
+                raise ValueError(f"找不到預設組合：{option(1)}")
+            spec = self._parse_format_options(preset)
+            # Section and quality keep their usual columns on top of a preset.
+            section = parse_section(option(3), option(4))
+            if section:
+                spec["section"] = section
+            quality = option(7).lower().rstrip("k")
+            if quality:
+                if not spec.get("is_audio"):
+                    raise ValueError(f"預設組合「{option(1)}」不是音訊格式，無法指定音質")
+                spec["audio_quality"] = quality
+            return spec
+        if mode == "live":
+            return {"live_capture": True, "from_start": option(1).lower() == "start"}
+        section = parse_section(option(3), option(4))
+        if mode == "audio":
+            ext_param = option(1) or "m4a"
+            return {
+                "is_audio": True,
+                "format_param": {"m4a": "aac", "webm": "opus"}.get(ext_param, ext_param),
+                "ext_param": ext_param,
+                "section": section,
+                "audio_targets": parse_audio_targets(option(5)),
+                "loudnorm": option(6).lower() in ("1", "true", "yes", "loudnorm"),
+                "audio_quality": option(7).lower().rstrip("k") or "0",
+            }
+        resolution = option(1).lower().rstrip("p")
+        return {
+            "is_audio": False,
+            "format_param": resolution if resolution.isdigit() else None,
+            "ext_param": option(2) or "mp4",
+            "section": section,
+            "audio_targets": [],
+            "loudnorm": False,
+        }
+
+    def _claim_service_key(self, queue_key):
+        with self._service_lock:
+            if queue_key in self._service_keys or queue_key in self.queue_keys:
+                return False
+            self._service_keys.add(queue_key)
+            return True
+
+    def _release_service_key(self, queue_key):
+        with self._service_lock:
+            self._service_keys.discard(queue_key)
+
+    def _process_inbox_file(self, path):
+        # Lines go through the shared URL job queue so a long download never
+        # holds up the watcher; the manifest is written as each job finishes.
+        manifest_path = f"{path}.manifest.jsonl"
+        name = os.path.basename(path)
+        with self._service_lock:
+            done_line = max(
+                read_inbox_manifest(manifest_path), self._inbox_submitted.get(path, 0)
+            )
+        try:
+            entries = [
+                entry for entry in iter_inbox_urls(path) if entry[0] > done_line
+            ]
+        except OSError as e:
+            self.log_signal.emit(f"[收件匣] 無法處理清單 {path}：{e}", "error")
+            return
+        if not entries:
+            return
+        with self._service_lock:
+            self._inbox_submitted[path] = entries[-1][0]
+        counts = {"success": 0, "failed": 0, "duplicate": 0}
+        remaining = [len(entries)]
+
+        def finished(line_no, url, job_id, outcome):
+            record = {"line": line_no, "url": url, "job_id": job_id}
+            record.update(outcome)
+            record["time"] = time.time()
+            try:
+                with open(manifest_path, "a", encoding="utf-8") as manifest:
+                    manifest.write(json.dumps(record, ensure_ascii=False) + "\n")
+            except OSError as e:
+                self.log_signal.emit(f"[收件匣] 無法寫入結果紀錄 {manifest_path}：{e}", "error")
+            counts[record["status"]] = counts.get(record["status"], 0) + 1
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                self.log_signal.emit(
+                    f"[收件匣] {name} 完成："
+                    f"成功 {counts['success']}、失敗 {counts['failed']}、重複 {counts['duplicate']}",
+                    "success",
+                )
+
+        self.log_signal.emit(f"[收件匣] 處理清單：{name}（{len(entries)} 個網址）", "info")
+        for line_no, url, options in entries:
+            self.submit_url(
+                url,
+                options,
+                source="inbox",
+                on_done=functools.partial(finished, line_no, url),
+            )
+
+    def start_control_api(self, host="127.0.0.1", port=8765, token=None):
+        if self._service_download_dir is None:
+            self._service_download_dir = self.dir_label.text()
+        self.api_server = ControlAPIServer(
+            self.jobs,
+            self.submit_url,
+            self.network.loop,
+            host=host,
+            port=port,
+            token=token,
+        )
+        try:
+            self.api_server.start()
+        except (OSError, ValueError) as e:
+            self.api_server = None
+            self.log_signal.emit(f"[API] 無法啟動控制介面：{e}", "error")
+            return
+        self.log_signal.emit(f"[API] 控制介面已啟動：http://{host}:{port}", "info")
+
+    def submit_url(self, url, options=None, source="api", on_done=None):
+        job_id = self.jobs.create(url, source=source, options=options)
+        self._url_jobs.put((job_id, url, list(options or []), on_done))
+        return job_id
+
+    def _run_url_jobs(self):
+        while True:
+            job_id, url, options, on_done = self._url_jobs.get()
+            try:
+                outcome = self._process_url_job(job_id, url, options)
+            except Exception as e:
+                self.jobs.update(job_id, status="failed", error=str(e))
+                self.log_signal.emit(f"[API] 任務失敗：{url} - {e}", "error")
+                outcome = {"status": "failed", "error": str(e)}
+            if on_done is not None:
+                on_done(job_id, outcome)
+
+    def _options_from_spec(self, spec):
+        if spec["is_audio"]:
+            return [
+                "audio",
+                spec["ext_param"] or "",
+                "",
+                "",
+                "",
+                ",".join(spec.get("audio_targets") or []),
+                "loudnorm" if spec.get("loudnorm") else "",
+                spec.get("audio_quality") or "0",
+            ]
+        resolution = f"{spec['format_param']}p" if spec["format_param"] else ""
+        return ["video", resolution, spec["ext_param"] or "mp4"]
+
+    def subscribe_current_url(self):
+        url = self.url_input.text().strip()
+        if not url:
+            QMessageBox.warning(self, "提醒", "請輸入頻道或影片連結")
+            return
+        try:
+            spec = self._current_format_spec()
+        except ValueError as e:
+            QMessageBox.warning(self, "提醒", str(e))
+            return
+        if self._service_download_dir is None:
+            self._service_download_dir = self.dir_label.text()
+        self.network.submit(self._subscribe(url, self._options_from_spec(spec)))
+
+    def _resolve_channel(self, url, timeout=None):
+        opts = {"logger": ExtractionDeadline(timeout)} if timeout is not None else {}
+        with self.analysis_pool.acquire(opts) as ydl:
+            info = ydl.extract_info(url, download=False, process=False)
+        channel_id = info.get("channel_id")
+        if not channel_id:
+            raise ValueError("無法取得頻道 ID")
+        return channel_id, info.get("channel") or info.get("uploader") or channel_id
+
+    async def _subscribe(self, url, options):
+        match = CHANNEL_ID_RE.search(url)
+        try:
+            if match:
+                channel_id, title = match.group(1), ""
+            else:
+                channel_id, title = await self.network.run_blocking(
+                    self._resolve_channel,
+                    url,
+                    self.ANALYSIS_TIMEOUT,
+                    timeout=self.ANALYSIS_TIMEOUT,
+                )
+        except Exception as e:
+            self.log_signal.emit(f"[訂閱] 無法訂閱 {url}：{e}", "error")
+            return
+        self.subscriptions.add(channel_id, url, title, options)
+        stats = await self.subscription_poller.poll([channel_id])
+        if stats["failed"]:
+            self.log_signal.emit(
+                f"[訂閱] 已訂閱 {title or channel_id}，但讀取頻道動態失敗："
+                f"{stats['failed'][0][1]}",
+                "error",
+            )
+        else:
+            self.log_signal.emit(
+                f"[訂閱] 已訂閱 {title or channel_id}，之後的新影片會自動下載", "success"
+            )
+        self._start_subscription_polling()
+
+    def _start_subscription_polling(self):
+        if self._subscription_task is not None:
+            return
+        if self._service_download_dir is None:
+            self._service_download_dir = self.dir_label.text()
+        self._subscription_task = self.network.submit(self._subscription_loop())
+
+    def poll_subscriptions_now(self):
+        if not self.subscriptions.list():
+            self.status.setText("尚未訂閱任何頻道")
+            return
+        if self._service_download_dir is None:
+            self._service_download_dir = self.dir_label.text()
+        self.network.submit(self._poll_subscriptions())
+
+    async def _subscription_loop(self):
+        while True:
+            try:
+                await self._poll_subscriptions()
+            except Exception as e:
+                self.log_signal.emit(f"[訂閱] 檢查訂閱時發生錯誤：{e}", "error")
+            await asyncio.sleep(self.SUBSCRIPTION_POLL_INTERVAL)
+
+    async def _poll_subscriptions(self):
+        stats = await self.subscription_poller.poll()
+        for name, error in stats["failed"]:
+            self.log_signal.emit(f"[訂閱] {name} 檢查失敗：{error}", "error")
+        self.log_signal.emit(
+            f"[訂閱] 檢查 {stats['checked']} 個頻道：新影片 {stats['new']} 支，"
+            f"未變更 {stats['not_modified']} 個，耗時 {stats['elapsed']:.1f}s",
+            "info",
+        )
+
+    async def _fetch_feed(self, url, headers):
+        return await self.network.http.get(url, self.FEED_TIMEOUT, headers=headers)
+
+    def _on_subscription_upload(self, subscription, entry):
+        self.log_signal.emit(
+            f"[訂閱] {subscription.get('title') or subscription['channel_id']} "
+            f"新影片：{entry['title']}",
+            "success",
+        )
+        self.submit_url(
+            f"https://www.youtube.com/watch?v={entry['id']}",
+            subscription.get("options"),
+            source="subscription",
+        )
+
+    def _process_url_job(self, job_id, url, options):
+        if self.jobs.is_cancelled(job_id):
+            self.jobs.update(job_id, status="cancelled")
+            return {"status": "cancelled"}
+        try:
+            spec = self._parse_format_options(options)
+        except ValueError as e:
+            self.jobs.update(job_id, status="failed", error=str(e))
+            return {"status": "failed", "error": str(e)}
+        if spec.get("live_capture"):
+            self.start_capture(
+                url, spec["from_start"], self._service_download_dir, job_id=job_id
+            )
+            return {"status": "capturing"}
+        match = VIDEO_ID_RE.search(url)
+        claimed = self._queue_key_for(match.group(1), spec) if match else None
+        if claimed and not self._claim_service_key(claimed):
+            self.jobs.update(job_id, status="duplicate")
+            return {"status": "duplicate"}
+
+        # Only a finished download keeps its key; anything else releases it so
+        # the same URL can be submitted again.
+        outcome = {"status": "failed"}
+        try:
+            self.jobs.update(job_id, status="resolving")
+            try:
+                # Upcoming premieres have no formats yet; without this the extract
+                # raises before live_status can route the job to a capture.
+                with self.analysis_pool.acquire({"ignore_no_formats_error": True}) as ydl:
+                    info = ydl.extract_info(url, download=False)
+            except Exception as e:
+                self.log_signal.emit(f"[解析] 解析失敗：{url} - {e}", "error")
+                self.jobs.update(job_id, status="failed", error=str(e))
+                outcome = {"status": "failed", "error": str(e)}
+                return outcome
+            if info.get("live_status") in LIVE_STATES:
+                self.log_signal.emit(f"[直播] 偵測到直播，改為錄製任務：{url}", "info")
+                self.start_capture(
+                    url, False, self._service_download_dir, job_id=job_id, info=info
+                )
+                outcome = {"status": "capturing"}
+                return outcome
+            if not info.get("formats") and not info.get("url"):
+                error = "沒有可下載的格式"
+                self.log_signal.emit(f"[解析] {error}：{url}", "error")
+                self.jobs.update(job_id, status="failed", error=error)
+                outcome = {"status": "failed", "error": error}
+                return outcome
+
+            item_data, display_text = self._build_item_data(url, info, spec)
+            if not claimed:
+                if not self._claim_service_key(item_data["queue_key"]):
+                    self.jobs.update(job_id, status="duplicate")
+                    outcome = {"status": "duplicate"}
+                    return outcome
+                claimed = item_data["queue_key"]
+
+            self.resolved_info.put(
+                item_data["video_id"],
+                url,
+                info,
+                self._compiled_for_item(item_data).options["format"],
+            )
+            del info
+            try:
+                result = self._download_single_job(
+                    {"display_text": display_text, "data": item_data, "job_id": job_id},
+                    self._service_download_dir,
+                    interactive=False,
+                )
+            finally:
+                if not any(
+                    k.startswith(f"{item_data['video_id']}|") for k in self.queue_keys
+                ):
+                    self.resolved_info.discard(item_data["video_id"])
+            outcome = {
+                "status": result["status"],
+                "queue_key": item_data["queue_key"],
+                "path": result.get("path"),
+                "error": result.get("error"),
+            }
+            return outcome
+        finally:
+            if claimed and outcome["status"] != "success":
+                self._release_service_key(claimed)
+
+    def start_capture_from_input(self):
+        url = self.url_input.text().strip()
+        if not url:
+            QMessageBox.warning(self, "提醒", "請輸入直播或首播網址")
+            return
+        self.start_capture(
+            url, self.capture_from_start_checkbox.isChecked(), self.dir_label.text()
+        )
+
+    def start_capture(self, url, from_start, download_dir, job_id=None, info=None):
+        if job_id is None:
+            job_id = self.jobs.create(url, source="capture")
+        self.jobs.update(job_id, kind="capture", duration=0.0, bitrate=None)
+        self.capture_status_signal.emit(job_id, f"排隊中：{url}")
+        self.network.submit(
+            self._await_live(job_id, url, from_start, download_dir, info)
+        )
+        return job_id
+
+    def stop_selected_capture(self):
+        for item in self.capture_list.selectedItems():
+            job_id = item.data(Qt.UserRole)
+            if self.jobs.cancel(job_id):
+                self.log_signal.emit(f"[直播] 正在停止錄製：{item.text()}", "info")
+
+    def _on_capture_status(self, job_id, text):
+        self.capture_box.setVisible(True)
+        for row in range(self.capture_list.count()):
+            item = self.capture_list.item(row)
+            if item.data(Qt.UserRole) == job_id:
+                item.setText(text)
+                return
+        item = QListWidgetItem(text)
+        item.setData(Qt.UserRole, job_id)
+        self.capture_list.addItem(item)
+
+    async def _await_live(self, job_id, url, from_start, download_dir, info):
+        # Premieres wait on the network loop's timers; a capture-lane thread is
+        # only taken once the stream is actually live.
+        try:
+            while True:
+                if self.jobs.is_cancelled(job_id) or self._capture_stop.is_set():
+                    raise JobCancelled()
+                if info is None:
+                    self.jobs.update(job_id, status="resolving")
+                    info = await self.network.run_blocking(
+                        self._extract_for_analysis,
+                        url,
+                        self.ANALYSIS_TIMEOUT,
+                        timeout=self.ANALYSIS_TIMEOUT,
+                    )
+                if info.get("live_status") != "is_upcoming":
+                    break
+                release = info.get("release_timestamp")
+                delay = min(
+                    max((release or 0) - time.time(), self.PREMIERE_POLL_MIN),
+                    self.PREMIERE_POLL_MAX,
+                )
+                when = time.strftime("%m/%d %H:%M", time.localtime(release)) if release else "未知"
+                self.jobs.update(job_id, status="waiting_live")
+                self.capture_status_signal.emit(
+                    job_id, f"等待開播（{when}）：{info.get('title') or url}"
+                )
+                deadline = self.network.loop.time() + delay
+                while self.network.loop.time() < deadline:
+                    if self.jobs.is_cancelled(job_id) or self._capture_stop.is_set():
+                        raise JobCancelled()
+                    await asyncio.sleep(min(1.0, deadline - self.network.loop.time()))
+                info = None
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                e = RuntimeError("解析逾時")
+            self._capture_ended(job_id, url, e)
+            return
+        with self._captures_lock:
+            busy = self._captures_busy
+            self._captures_busy += 1
+        if busy >= self.CAPTURE_WORKERS:
+            # A stream that is already live loses footage while it waits.
+            title = info.get("title") or url
+            self.jobs.update(job_id, status="queued")
+            self.capture_status_signal.emit(
+                job_id, f"排隊中（{self.CAPTURE_WORKERS} 個錄製通道皆在使用中）：{title}"
+            )
+            self.log_signal.emit(
+                f"[直播] 錄製通道已滿，需等其他錄製結束才會開始：{title}", "error"
+            )
+        self.capture_pool.submit(
+            self._run_capture, job_id, url, from_start, download_dir, info
+        )
+
+    def _run_capture(self, job_id, url, from_start, download_dir, info):
+        try:
+            self._capture_live(job_id, url, from_start, download_dir, info)
+        except Exception as e:
+            self._capture_ended(job_id, url, e)
+        finally:
+            with self._captures_lock:
+                self._captures_busy -= 1
+
+    def _capture_ended(self, job_id, url, error):
+        if isinstance(error, JobCancelled):
+            self.jobs.update(job_id, status="cancelled")
+            self.capture_status_signal.emit(job_id, f"已取消：{url}")
+            return
+        self.jobs.update(job_id, status="failed", error=str(error))
+        self.capture_status_signal.emit(job_id, f"錄製失敗：{url}")
+        self.log_signal.emit(f"[直播] 錄製失敗：{url} - {error}", "error")
+
+    def _capture_live(self, job_id, url, from_start, download_dir, info):
+        if self.jobs.is_cancelled(job_id) or self._capture_stop.is_set():
+            raise JobCancelled()
+        title = info.get("title") or url
+        if info.get("live_status") not in LIVE_STATES and not info.get("is_live"):
+            raise RuntimeError("不是進行中的直播，請改用一般下載")
+        try:
+            with self.analysis_pool.acquire({"format": LIVE_FORMAT}) as ydl:
+                resolved = ydl.process_ie_result(info, download=False)
+        except Exception as e:
+            raise RuntimeError(f"找不到可錄製的直播串流：{e}") from e
+        selected = resolved if resolved.get("url") else next(
+            iter(resolved.get("requested_formats") or ()), None
+        )
+        if not selected or not selected.get("url"):
+            raise RuntimeError("找不到可錄製的直播串流")
+
+        started = time.strftime("%Y%m%d-%H%M%S")
+        components = self.path_planner.render(self.filename_template, info, f" {started}")
+        (out_base,) = self.path_planner.plan([(download_dir, components, info.get("id"))])
+        capture = LiveCapture(self._get_ffmpeg_path(), selected, out_base, from_start)
+        try:
+            os.makedirs(os.path.dirname(out_base), exist_ok=True)
+            capture.start()
+            threading.Thread(
+                target=self._watch_capture, args=(job_id, capture), daemon=True
+            ).start()
+            self.jobs.update(job_id, status="recording", display_text=title)
+            self.log_signal.emit(
+                f"[直播] 開始錄製{'（從頭）' if from_start else ''}：{title}", "info"
+            )
+            for _ in capture.updates():
+                bitrate = f"{capture.bitrate / 1000:.2f} Mbps" if capture.bitrate else "—"
+                self.jobs.update(
+                    job_id, duration=capture.duration, bitrate=capture.bitrate
+                )
+                self.capture_status_signal.emit(
+                    job_id,
+                    f"錄製中 {formatSeconds(int(capture.duration))}｜{bitrate}｜"
+                    f"{capture.total_size / (1024 * 1024):.1f} MB：{title}",
+                )
+            if capture.process.returncode not in (0, 255) and capture.errors:
+                self.log_signal.emit(f"[直播] ffmpeg：{capture.errors[-1]}", "error")
+            self.capture_status_signal.emit(job_id, f"正在合併片段：{title}")
+            try:
+                path = capture.finalize(self.transcode_manager.run)
+            except RuntimeError as e:
+                raise RuntimeError(f"合併片段失敗，已保留 .ts 片段檔：{e}") from e
+        finally:
+            self.path_planner.release(out_base)
+        if path is None:
+            raise RuntimeError(capture.errors[-1] if capture.errors else "沒有錄到任何資料")
+        self._update_download_timestamp(path)
+        self.jobs.update(job_id, status="success", path=path)
+        self.capture_status_signal.emit(
+            job_id, f"已完成 {formatSeconds(int(capture.duration))}：{os.path.basename(path)}"
+        )
+        self.log_signal.emit(f"[直播] 錄製完成：{path}", "success")
+
+    def _watch_capture(self, job_id, capture):
+        while capture.running():
+            if self.jobs.is_cancelled(job_id) or self._capture_stop.wait(0.2):
+                capture.stop()
+                return
+
+    def closeEvent(self, event):
+        self._refresh_stop.set()
+        self._capture_stop.set()
+        self.trace_checkbox.setChecked(False)
+        self.profile_checkbox.setChecked(False)
+        if self.inbox_watcher:
+            self.inbox_watcher.stop()
+        if self.api_server:
+            self.api_server.stop()
+        for leases in self._leases.values():
+            leases.release_all()
+        self.network.close()
+        self.post_pipeline.close()
+        self.capture_pool.shutdown(wait=False)
+        self.analysis_pool.close()
+        self.download_pool.close()
+        super().closeEvent(event)
+
     def _show_error(self, msg):
         clean = re.sub(r"\x1b\[[0-9;]*m", "", msg)
         QMessageBox.critical(self, "錯誤", clean)
         self.status_signal.emit(clean)
         self.log_queue.put((clean, "error"))
 
+    def _diagnostics_path(self, kind, ext):
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        return os.path.join(self.dir_label.text(), f"ytmd-{kind}-{stamp}.{ext}")
+
+    def toggle_tracing(self, checked):
+        if checked:
+            TRACER.start()
+            self.log_signal.emit("[追蹤] 開始記錄各階段耗時", "info")
+            return
+        path = self.trace_output or self._diagnostics_path("trace", "json")
+        try:
+            count = TRACER.stop(path)
+        except OSError as e:
+            self.log_signal.emit(f"[追蹤] 無法寫出追蹤檔：{e}", "error")
+            return
+        message = f"[追蹤] 已寫出 {count} 個事件（可用 Perfetto 或 chrome://tracing 開啟）：{path}"
+        if TRACER.dropped:
+            message += f"，超出上限捨棄 {TRACER.dropped} 個"
+        self.log_signal.emit(message, "success")
+
+    def toggle_profiler(self, checked):
+        if checked:
+            self.profiler = SamplingProfiler()
+            self.profiler.start()
+            self.log_signal.emit("[分析] 取樣分析器已啟動", "info")
+            return
+        if self.profiler is None:
+            return
+        path = self.profile_output or self._diagnostics_path("profile", "folded")
+        try:
+            samples = self.profiler.stop(path)
+        except OSError as e:
+            self.log_signal.emit(f"[分析] 無法寫出取樣結果：{e}", "error")
+            return
+        finally:
+            self.profiler = None
+        self.log_signal.emit(
+            f"[分析] 已寫出 {samples} 次取樣的堆疊（flamegraph / speedscope 格式）：{path}",
+            "success",
+        )
+
     def toggle_log_output(self, checked):
         self.log_output.setVisible(checked)
 
@@ -1040,6 +5849,7 @@ class YTMediaDownloader(QWidget):
         self.status_signal.emit(msg)
         self.log_queue.put((msg, "info"))
 
+    @traced("ui.log_flush", "ui")
     def _process_log_queue(self):
         while not self.log_queue.empty():
             try:
@@ -1165,10 +5975,38 @@ class YTMediaDownloader(QWidget):
 
 
 if __name__ == "__main__":
+    import argparse
+
     sys.excepthook = _global_excepthook
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--watch", metavar="DIR")
+    parser.add_argument("--api", metavar="PORT", type=int)
+    parser.add_argument("--api-host", default="127.0.0.1")
+    parser.add_argument("--api-token")
+    parser.add_argument("--scratch", metavar="DIR")
+    parser.add_argument("--library", metavar="DIR")
+    parser.add_argument("--trace", metavar="FILE")
+    parser.add_argument("--profile", metavar="FILE")
+    args, qt_args = parser.parse_known_args()
     QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
-    app = QApplication(sys.argv)
+    app = QApplication(sys.argv[:1] + qt_args)
     app.setStyleSheet(dark_qss)
     win = YTMediaDownloader()
-    win.show()
+    if args.scratch:
+        win.set_scratch_directory(args.scratch, persist=False)
+    if args.library:
+        win.set_library_directory(args.library, persist=False)
+    if args.trace:
+        win.trace_output = args.trace
+        win.trace_checkbox.setChecked(True)
+    if args.profile:
+        win.profile_output = args.profile
+        win.profile_checkbox.setChecked(True)
+    if args.api:
+        win.start_control_api(args.api_host, args.api, args.api_token)
+    if args.watch:
+        win.start_inbox_daemon(args.watch)
+        win.showMinimized()
+    else:
+        win.show()
     sys.exit(app.exec_())
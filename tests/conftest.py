@@ -0,0 +1,34 @@
+import importlib.util
+import os
+import pathlib
+
+import pytest
+
+APP_PATH = pathlib.Path(__file__).resolve().parents[1] / "YT Media Downloader.py"
+
+
+@pytest.fixture(scope="session")
+def ytmd():
+    pytest.importorskip("PyQt5")
+    pytest.importorskip("yt_dlp")
+    spec = importlib.util.spec_from_file_location("yt_media_downloader", APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def qapp(ytmd):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    return ytmd.QApplication.instance() or ytmd.QApplication([])
+
+
+@pytest.fixture
+def window(ytmd, qapp, tmp_path):
+    ytmd.QSettings.setPath(
+        ytmd.QSettings.NativeFormat, ytmd.QSettings.UserScope, str(tmp_path / "settings")
+    )
+    win = ytmd.YTMediaDownloader()
+    win.dir_label.setText(str(tmp_path))
+    yield win
+    win.close()
@@ -0,0 +1,118 @@
+def test_throttle_logger_forwards_output_and_only_observes_errors(ytmd):
+    throttled, logged = [], []
+    logger = ytmd.ThrottleLogger(lambda: throttled.append(1), lambda *entry: logged.append(entry))
+    ydl = ytmd.YoutubeDL({"logger": logger, "ignoreerrors": True})
+
+    ydl.to_screen("[download] Destination: a.mp4")
+    ydl.to_screen("[download]  42.0% of 10.00MiB at 1.00MiB/s ETA 00:06")
+    ydl.report_warning("Unable to download format 137. Skipping...")
+    ydl.report_error("HTTP Error 429: Too Many Requests")
+
+    assert logged == [
+        ("[yt-dlp] [download] Destination: a.mp4", "info"),
+        ("[yt-dlp] WARNING: Unable to download format 137. Skipping...", "info"),
+    ]
+    assert throttled == [1]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_controller(ytmd, **kwargs):
+    clock = FakeClock()
+    controller = ytmd.AdaptiveConcurrency(clock=clock, **kwargs)
+    return controller, clock
+
+
+def tick(controller, clock, mbps, pending=10, throttles=0):
+    # Keep every slot busy so the controller sees demand at its limit.
+    while controller.active < controller.limit:
+        controller.acquire()
+    while controller.active > controller.limit:
+        controller.release()
+    clock.now += controller.INTERVAL
+    controller.record_progress(clock.now, int(mbps * 1e6 * controller.INTERVAL))
+    for _ in range(throttles):
+        controller.record_throttle()
+    return controller.tick(pending)
+
+
+def test_probe_is_kept_only_when_throughput_improves(ytmd):
+    controller, clock = make_controller(ytmd, maximum=6, initial=1)
+
+    assert tick(controller, clock, 4)["action"] == "increase"
+    assert tick(controller, clock, 8)["action"] == "keep"
+    assert tick(controller, clock, 8)["action"] == "increase"
+    decision = tick(controller, clock, 8.2)
+    assert (decision["action"], decision["limit"]) == ("revert", 2)
+
+    actions = [tick(controller, clock, 8)["action"] for _ in range(controller.COOLDOWN_TICKS)]
+    assert actions == ["hold"] * (controller.COOLDOWN_TICKS - 1) + ["increase"]
+
+
+def test_throttling_halves_then_recovers_to_remembered_ceiling(ytmd):
+    controller, clock = make_controller(ytmd, maximum=6, initial=4)
+
+    decision = tick(controller, clock, 16, throttles=1)
+    assert (decision["action"], decision["limit"]) == ("decrease", 2)
+    assert tick(controller, clock, 8, throttles=1)["action"] == "hold"
+
+    decision = tick(controller, clock, 8)
+    assert (decision["action"], decision["limit"]) == ("increase", 3)
+    assert decision["reason"].endswith("3")
+    limits = [tick(controller, clock, 12)["limit"] for _ in range(controller.CEILING_TICKS - 3)]
+    assert set(limits) == {3}
+    assert tick(controller, clock, 12)["action"] == "increase"
+
+
+def test_no_probe_without_pending_work_or_under_transcode_load(ytmd):
+    load = [0.0]
+    controller, clock = make_controller(ytmd, maximum=6, initial=2, postprocess_load=lambda: load[0])
+
+    assert tick(controller, clock, 8, pending=0)["action"] == "hold"
+    load[0] = 1.5
+    decision = tick(controller, clock, 8)
+    assert (decision["action"], decision["limit"]) == ("decrease", 1)
+
+
+def test_transfer_reports_outcome_and_ignores_cancellation(ytmd):
+    controller, clock = make_controller(ytmd, maximum=2, initial=2)
+
+    for error in (ytmd.JobCancelled(), RuntimeError("HTTP Error 429: Too Many Requests")):
+        try:
+            with controller.transfer():
+                assert controller.active == 1
+                raise error
+        except type(error):
+            pass
+    with controller.transfer():
+        pass
+
+    assert controller.active == 0
+    clock.now += controller.INTERVAL
+    decision = controller.tick(0)
+    assert (decision["errors"], decision["throttled"]) == (1, 1)
+
+
+def test_batch_reports_aggregate_progress(window):
+    ids = [window.jobs.create(f"https://example.com/{n}") for n in range(4)]
+    progress, status = [], []
+    window.progress_signal.connect(progress.append)
+    window.status_signal.connect(status.append)
+    listener = window._batch_progress_listener(ids)
+    window.jobs.add_listener(listener)
+    try:
+        window.jobs.update(ids[0], status="success", progress=100.0)
+        window.jobs.update(ids[1], status="running", progress=50.0)
+        window.jobs.update(ids[2], status="running", progress=10.0)
+        window.jobs.update(window.jobs.create("https://example.com/other"), status="running")
+    finally:
+        window.jobs.remove_listener(listener)
+
+    assert progress == [25, 37, 40]
+    assert status[-1] == "下載中：1/4 完成，2 個進行中，總進度 40.0%"
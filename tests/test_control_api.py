@@ -0,0 +1,117 @@
+import asyncio
+import http.client
+import json
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def api(ytmd):
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    registry = ytmd.JobRegistry()
+    submitted = []
+
+    def submit(url, options):
+        submitted.append((url, options))
+        return registry.create(url, source="api", options=options)
+
+    server = ytmd.ControlAPIServer(registry, submit, loop, port=0)
+    server.start()
+    port = server._server.sockets[0].getsockname()[1]
+    yield port, submitted
+    server.stop()
+
+    async def drain():
+        tasks = asyncio.all_tasks() - {asyncio.current_task()}
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(drain(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+def post(port, body):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    try:
+        conn.request("POST", "/jobs", body=body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize(
+    "body",
+    [b"{not json", b"[]", b'"https://example.com"', b"\xff\xfe", b'{"url": 5}',
+     b'{"url": "https://example.com", "targets": "mp3"}'],
+)
+def test_rejects_malformed_job_bodies(api, body):
+    port, submitted = api
+    status, payload = post(port, body)
+    assert status == 400
+    assert "error" in payload
+    assert submitted == []
+
+
+def test_accepts_job_object(api):
+    port, submitted = api
+    status, payload = post(port, json.dumps({"url": "https://example.com/v", "audio": True, "targets": ["mp3"]}))
+    assert status == 202
+    assert payload["url"] == "https://example.com/v"
+    assert submitted == [("https://example.com/v", ["audio", "", "", "", "", "mp3", "", ""])]
+
+
+def test_preset_job_keeps_section_and_quality(api):
+    port, submitted = api
+    body = {"url": "https://example.com/v", "preset": "音樂 mp3", "start": "0:30", "end": "1:00", "quality": "192"}
+    status, _ = post(port, json.dumps(body))
+    assert status == 202
+    assert submitted == [("https://example.com/v", ["preset", "音樂 mp3", "", "0:30", "1:00", "", "", "192"])]
+
+
+def test_preset_job_rejects_conflicting_format_fields(api):
+    port, submitted = api
+    status, payload = post(port, json.dumps({"url": "https://example.com/v", "preset": "x", "ext": "mkv"}))
+    assert status == 400
+    assert "ext" in payload["error"]
+    assert submitted == []
+
+
+def test_token_is_required_when_configured(ytmd):
+    server_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=server_loop.run_forever, daemon=True)
+    thread.start()
+    server = ytmd.ControlAPIServer(ytmd.JobRegistry(), None, server_loop, port=0, token="s3cret")
+    server.start()
+    port = server._server.sockets[0].getsockname()[1]
+
+    def get(path, headers=None):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        try:
+            conn.request("GET", path, headers=headers or {})
+            return conn.getresponse().status
+        finally:
+            conn.close()
+
+    try:
+        assert get("/jobs") == 401
+        assert get("/jobs", {"Authorization": "Bearer wrong"}) == 401
+        assert get("/jobs?token=s3cre") == 401
+        assert get("/jobs", {"Authorization": "Bearer s3cret"}) == 200
+        assert get("/jobs?token=s3cret") == 200
+    finally:
+        server.stop()
+        server_loop.call_soon_threadsafe(server_loop.stop)
+        thread.join(5)
+        server_loop.close()
+
+
+@pytest.mark.parametrize("host", ["0.0.0.0", "192.168.1.10", "::", "example.com"])
+def test_non_loopback_host_needs_a_token(ytmd, host):
+    server = ytmd.ControlAPIServer(ytmd.JobRegistry(), None, None, host=host, port=0)
+    with pytest.raises(ValueError):
+        server.start()
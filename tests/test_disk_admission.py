@@ -0,0 +1,57 @@
+import collections
+import os
+
+import pytest
+
+Usage = collections.namedtuple("Usage", "total used free")
+
+
+@pytest.fixture
+def disk(ytmd, monkeypatch):
+    state = {"free": 1000}
+    monkeypatch.setattr(ytmd.shutil, "disk_usage", lambda path: Usage(0, 0, state["free"]))
+    admission = ytmd.DiskAdmission()
+    admission.SAFETY_MARGIN = 0
+    admission.RECHECK_INTERVAL = 0.01
+    return admission, state
+
+
+def test_written_bytes_are_not_counted_twice(ytmd, disk, tmp_path):
+    admission, state = disk
+    first = admission.reserve({str(tmp_path): 600})
+    admission.record_written(first, str(tmp_path), "a.mp4", 400)
+    state["free"] -= 400
+
+    second = admission.reserve({str(tmp_path): 350}, cancelled=lambda: True)
+
+    assert admission._shortfall({str(tmp_path): 100}) == {str(tmp_path): 50}
+    admission.release(first)
+    admission.release(second)
+    assert admission._shortfall({str(tmp_path): 600}) == {}
+
+
+def test_progress_for_the_same_file_replaces_earlier_counts(ytmd, disk, tmp_path):
+    admission, state = disk
+    reservation = admission.reserve({str(tmp_path): 600})
+    for written in (100, 300, 500):
+        admission.record_written(reservation, str(tmp_path), "a.mp4", written)
+    assert reservation.outstanding(os.stat(tmp_path).st_dev) == 100
+
+
+def test_waiting_job_raises_when_nothing_can_free_space(ytmd, disk, tmp_path):
+    admission, _ = disk
+    with pytest.raises(ytmd.DiskSpaceError):
+        admission.reserve({str(tmp_path): 2000})
+    running = admission.reserve({str(tmp_path): 900})
+    with pytest.raises(ytmd.JobCancelled):
+        admission.reserve({str(tmp_path): 500}, cancelled=lambda: True)
+    admission.release(running)
+
+
+def test_missing_output_folder_uses_nearest_existing_ancestor(ytmd, disk, tmp_path):
+    admission, _ = disk
+    missing = tmp_path / "Artist" / "Album"
+    assert admission._device(str(missing)) == os.stat(tmp_path).st_dev
+    reservation = admission.reserve({str(missing): 10})
+    admission.release(reservation)
+    assert not missing.exists()
@@ -0,0 +1,53 @@
+import pytest
+
+
+def test_builtin_presets_match_their_yt_dlp_command_line(ytmd, window):
+    yt_dlp = pytest.importorskip("yt_dlp")
+    for name, options in ytmd.BUILTIN_FORMAT_PRESETS.items():
+        spec = window._parse_format_options(options)
+        compiled = ytmd.compile_format(
+            spec["is_audio"],
+            spec["format_param"],
+            spec["ext_param"],
+            tuple(spec["audio_targets"]),
+            spec.get("audio_quality") or "0",
+        )
+        parsed = yt_dlp.parse_options(list(compiled.cli_args)).ydl_opts
+        assert parsed["format"] == compiled.options["format"], name
+        assert parsed["merge_output_format"] == compiled.options.get("merge_output_format"), name
+        assert parsed["postprocessor_args"].get("default") == (
+            list(compiled.options["postprocessor_args"])
+            if "postprocessor_args" in compiled.options
+            else None
+        ), name
+        extract = [pp for pp in parsed["postprocessors"] if pp["key"] == "FFmpegExtractAudio"]
+        expected = [dict(pp) for pp in compiled.options.get("postprocessors", ())]
+        assert [
+            {key: pp[key] for key in ("key", "preferredcodec", "preferredquality")} for pp in extract
+        ] == expected, name
+
+
+def test_compiled_formats_are_shared_and_immutable(ytmd):
+    first = ytmd.compile_format(False, "720", "mp4")
+    assert ytmd.compile_format(False, "720", "mp4") is first
+    with pytest.raises(TypeError):
+        first.options["format"] = "worst"
+    opts = first.job_options()
+    opts["format"] = "worst"
+    assert first.options["format"] != "worst"
+
+
+def test_preset_takes_section_and_quality_from_the_request(window):
+    spec = window._parse_format_options(["preset", "Podcast opus 64k", "", "0:30", "1:00", "", "", "48k"])
+    assert spec["is_audio"]
+    assert (spec["section"]["start"], spec["section"]["end"]) == (30, 60)
+    assert spec["audio_quality"] == "48"
+
+    plain = window._parse_format_options(["preset", "Podcast opus 64k"])
+    assert plain["section"] is None
+    assert plain["audio_quality"] == "64"
+
+
+def test_video_preset_rejects_audio_quality(window):
+    with pytest.raises(ValueError):
+        window._parse_format_options(["preset", "720p mp4", "", "", "", "", "", "128"])
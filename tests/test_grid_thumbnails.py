@@ -0,0 +1,61 @@
+import asyncio
+import concurrent.futures
+
+
+def deliver(window, ytmd, video_id, image=None, missing=False):
+    window._grid_futures[video_id] = concurrent.futures.Future()
+    window._on_queue_thumbnail_loaded(video_id, image or ytmd.QImage(), missing)
+
+
+def test_failed_grid_thumbnails_back_off_exponentially(window, ytmd, monkeypatch):
+    monkeypatch.setattr(window, "_refresh_grid_thumbnails", lambda: None)
+    now = [1000.0]
+    monkeypatch.setattr(ytmd.time, "monotonic", lambda: now[0])
+
+    delays = []
+    for _ in range(7):
+        deliver(window, ytmd, "vid")
+        retry_at, attempts = window._grid_failed["vid"]
+        delays.append(retry_at - now[0])
+        assert window._grid_backing_off("vid")
+        now[0] = retry_at + 1
+        assert not window._grid_backing_off("vid")
+    assert delays == [30, 60, 120, 240, 480, 600, 600]
+    assert attempts == 7
+
+    image = ytmd.QImage(8, 8, ytmd.QImage.Format_RGB32)
+    deliver(window, ytmd, "vid", image)
+    assert "vid" not in window._grid_failed
+    assert window._grid_thumbnails.get("vid") is not None
+
+
+def test_missing_grid_thumbnail_is_not_retried(window, ytmd, monkeypatch):
+    monkeypatch.setattr(window, "_refresh_grid_thumbnails", lambda: None)
+    deliver(window, ytmd, "gone", missing=True)
+    assert window._grid_failed["gone"] == (None, 0)
+    assert window._grid_backing_off("gone")
+
+
+def test_stale_grid_result_is_ignored(window, ytmd, monkeypatch):
+    monkeypatch.setattr(window, "_refresh_grid_thumbnails", lambda: None)
+    window._on_queue_thumbnail_loaded("late", ytmd.QImage(), False)
+    assert "late" not in window._grid_failed
+
+
+class FailingNetwork:
+    def __init__(self, error):
+        self.error = error
+
+    async def fetch(self, url, timeout):
+        raise self.error
+
+
+def test_only_http_404_marks_thumbnail_missing(window, ytmd, monkeypatch):
+    emitted = []
+    window.queue_thumbnail_signal.connect(lambda *args: emitted.append(args))
+    for error in (ytmd.HTTPStatusError(404), ytmd.HTTPStatusError(503), TimeoutError()):
+        monkeypatch.setattr(window, "network", FailingNetwork(error))
+        asyncio.run(window._fetch_queue_thumbnail("vid"))
+    assert [(video_id, image.isNull(), missing) for video_id, image, missing in emitted] == [
+        ("vid", True, True), ("vid", True, False), ("vid", True, False)
+    ]
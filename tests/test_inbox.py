@@ -0,0 +1,41 @@
+import json
+import threading
+import time
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_inbox_jobs_run_on_the_url_queue(window, tmp_path, monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def process(job_id, url, options):
+        calls.append((url, options))
+        release.wait(5)
+        return {"status": "success", "path": url.rsplit("/", 1)[-1]}
+
+    monkeypatch.setattr(window, "_process_url_job", process)
+    inbox = tmp_path / "list.txt"
+    inbox.write_text("https://example.com/a audio mp3\nhttps://example.com/b\n", encoding="utf-8")
+    manifest = tmp_path / "list.txt.manifest.jsonl"
+
+    started = time.monotonic()
+    window._process_inbox_file(str(inbox))
+    assert time.monotonic() - started < 1
+    wait_for(lambda: calls)
+    assert not manifest.exists()
+
+    window._process_inbox_file(str(inbox))
+    release.set()
+    wait_for(lambda: manifest.exists() and len(manifest.read_text(encoding="utf-8").splitlines()) == 2)
+
+    records = [json.loads(line) for line in manifest.read_text(encoding="utf-8").splitlines()]
+    assert [(r["line"], r["status"], r["path"]) for r in records] == [(1, "success", "a"), (2, "success", "b")]
+    assert [url for url, _ in calls] == ["https://example.com/a", "https://example.com/b"]
+    assert calls[0][1][:2] == ["audio", "mp3"]
+    assert {window.jobs.get(r["job_id"])["source"] for r in records} == {"inbox"}
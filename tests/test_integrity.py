@@ -0,0 +1,69 @@
+def test_section_download_checks_clip_length_not_full_size(ytmd, tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(b"x" * 4096)
+    info = {"duration": 600, "filesize": 50_000_000, "section_start": 30.0, "section_end": 90.0}
+    hasher = ytmd.StreamHasher()
+    hasher.progress_hook({"status": "finished", "filename": str(path), "info_dict": info})
+    assert hasher.size_problems() == []
+    assert hasher.duration == 60.0
+    assert hasher.digest_for(str(path)) == ytmd.file_sha256(str(path))
+
+
+def test_open_ended_section_is_capped_at_video_duration(ytmd, tmp_path):
+    path = tmp_path / "tail.mp4"
+    path.write_bytes(b"x")
+    info = {"duration": 120, "section_start": 100.0, "section_end": float("inf")}
+    hasher = ytmd.StreamHasher()
+    hasher.progress_hook({"status": "finished", "filename": str(path), "info_dict": info})
+    assert hasher.duration == 20.0
+
+
+def test_full_download_still_reports_truncated_file(ytmd, tmp_path):
+    path = tmp_path / "full.mp4"
+    path.write_bytes(b"x" * 10)
+    hasher = ytmd.StreamHasher()
+    hasher.progress_hook(
+        {"status": "finished", "filename": str(path), "info_dict": {"duration": 5, "filesize": 20}}
+    )
+    assert hasher.size_problems() == ["full.mp4: 10 / 20 bytes"]
+
+
+def _downloading(part, final):
+    return {
+        "status": "downloading",
+        "tmpfilename": str(part),
+        "filename": str(final),
+        "downloaded_bytes": part.stat().st_size,
+        "info_dict": {},
+    }
+
+
+def test_part_file_is_hashed_incrementally(ytmd, tmp_path):
+    part, final = tmp_path / "v.mp4.part", tmp_path / "v.mp4"
+    hasher = ytmd.StreamHasher()
+    with open(part, "wb") as f:
+        for block in (b"a" * 100, b"b" * 50):
+            f.write(block)
+            f.flush()
+            hasher.progress_hook(_downloading(part, final))
+    assert hasher.streams[str(part)]["offset"] == 150
+    part.rename(final)
+    hasher.progress_hook(
+        {"status": "finished", "tmpfilename": str(part), "filename": str(final), "info_dict": {}}
+    )
+    assert hasher.digest_for(str(final)) == ytmd.file_sha256(str(final))
+
+
+def test_restarted_download_resets_the_digest(ytmd, tmp_path):
+    part, final = tmp_path / "v.mp4.part", tmp_path / "v.mp4"
+    hasher = ytmd.StreamHasher()
+    part.write_bytes(b"stale" * 40)
+    hasher.progress_hook(_downloading(part, final))
+    part.write_bytes(b"fresh")
+    hasher.progress_hook(_downloading(part, final))
+    assert hasher.streams[str(part)]["offset"] == 5
+    part.rename(final)
+    hasher.progress_hook(
+        {"status": "finished", "tmpfilename": str(part), "filename": str(final), "info_dict": {}}
+    )
+    assert hasher.digest_for(str(final)) == ytmd.file_sha256(str(final))
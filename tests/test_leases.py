@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+
+def lease_record(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_only_one_instance_holds_a_lease(ytmd, tmp_path):
+    first = ytmd.DirectoryLeases(str(tmp_path), "first")
+    second = ytmd.DirectoryLeases(str(tmp_path), "second")
+    assert first.acquire("video|720")
+    assert not second.acquire("video|720")
+    assert second.holder("video|720")["owner"] == "first"
+    first.release("video|720")
+    assert second.acquire("video|720")
+    second.release_all()
+
+
+def test_stale_lease_is_broken_by_exactly_one_contender(ytmd, tmp_path):
+    crashed = ytmd.DirectoryLeases(str(tmp_path), "crashed")
+    assert crashed.acquire("video|720")
+    path = crashed._lease_path("video|720")
+    record = lease_record(path)
+    record["expires"] = time.time() - 1
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(record, f)
+
+    contenders = [ytmd.DirectoryLeases(str(tmp_path), f"peer{n}") for n in range(8)]
+    barrier = threading.Barrier(len(contenders))
+    won = []
+
+    def contend(leases):
+        barrier.wait()
+        if leases.acquire("video|720"):
+            won.append(leases.owner)
+
+    threads = [threading.Thread(target=contend, args=(leases,)) for leases in contenders]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(won) == 1
+    assert lease_record(path)["owner"] == won[0]
+
+
+def test_renew_does_not_overwrite_a_lease_taken_over_by_a_peer(ytmd, tmp_path):
+    leases = ytmd.DirectoryLeases(str(tmp_path), "me")
+    assert leases.acquire("video|720")
+    path = leases._lease_path("video|720")
+    assert leases._renew("video|720", path)
+    assert lease_record(path)["owner"] == "me"
+
+    peer = dict(lease_record(path), owner="peer")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(peer, f)
+
+    assert not leases._renew("video|720", path)
+    assert lease_record(path)["owner"] == "peer"
+    leases.release("video|720")
+    assert lease_record(path)["owner"] == "peer"
+
+
+def test_renew_waits_for_the_lease_lock(ytmd, tmp_path):
+    leases = ytmd.DirectoryLeases(str(tmp_path), "me")
+    leases.LOCK_TIMEOUT = 0.2
+    assert leases.acquire("video|720")
+    path = leases._lease_path("video|720")
+    before = lease_record(path)["renewed"]
+    with ytmd.exclusive_lock_file(f"{path}.lock", 1.0):
+        assert leases._renew("video|720", path)
+    assert lease_record(path)["renewed"] == before
+    leases.release_all()
+
+
+def test_lock_file_timeout_raises_instead_of_proceeding(ytmd, tmp_path):
+    lock = str(tmp_path / "manifest.lock")
+    with ytmd.exclusive_lock_file(lock, 1.0):
+        with pytest.raises(TimeoutError):
+            with ytmd.exclusive_lock_file(lock, 0.1):
+                pass
+    with ytmd.exclusive_lock_file(lock, 0.1):
+        pass
+
+
+def test_manifest_store_reports_a_held_lock(ytmd, tmp_path):
+    manifest = ytmd.VerifiedManifest(str(tmp_path))
+    manifest.LOCK_TIMEOUT = 0.1
+    target = tmp_path / "a.mp4"
+    target.write_bytes(b"x")
+    record = {"path": str(target), "size": 1, "mtime": int(target.stat().st_mtime)}
+    with ytmd.exclusive_lock_file(f"{manifest.path}.lock", 1.0):
+        assert manifest.store("a", record) is False
+    assert manifest.store("a", record) is True
+    assert manifest.lookup("a")["path"] == str(target)
+
+
+def _make_stale(path, age):
+    open(path, "w").close()
+    old = time.time() - age
+    os.utime(path, (old, old))
+
+
+def test_breaking_a_stale_lock_keeps_a_fresh_one_created_meanwhile(ytmd, tmp_path):
+    lock = str(tmp_path / "a.lock")
+    _make_stale(lock, 60)
+    seen = os.stat(lock)
+    # Another waiter broke the stale lock and a third took the lock since.
+    os.remove(lock)
+    with ytmd.exclusive_lock_file(lock, 1.0):
+        fresh = os.stat(lock)
+        ytmd._break_stale_lock(lock, seen)
+        assert ytmd._same_file(os.stat(lock), fresh)
+    assert not os.path.exists(lock)
+    assert os.listdir(tmp_path) == []
+
+
+def test_stale_lock_admits_one_holder_at_a_time(ytmd, tmp_path):
+    lock = str(tmp_path / "a.lock")
+    _make_stale(lock, 60)
+    barrier = threading.Barrier(8)
+    inside, overlaps = [], []
+    guard = threading.Lock()
+
+    def contend():
+        barrier.wait()
+        with ytmd.exclusive_lock_file(lock, 2.0):
+            with guard:
+                inside.append(1)
+                if len(inside) > 1:
+                    overlaps.append(len(inside))
+            time.sleep(0.01)
+            with guard:
+                inside.pop()
+
+    threads = [threading.Thread(target=contend) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert overlaps == []
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,157 @@
+import asyncio
+import os
+import time
+import types
+
+import pytest
+
+
+def test_command_segments_an_hls_stream(ytmd, tmp_path):
+    fmt = {
+        "url": "https://example.com/live.m3u8",
+        "protocol": "m3u8_native",
+        "http_headers": {"User-Agent": "UA", "Referer": "https://example.com"},
+    }
+    base = str(tmp_path / "100% live")
+    cmd = ytmd.LiveCapture("ffmpeg", fmt, base).command()
+
+    assert cmd[cmd.index("-headers") + 1] == "User-Agent: UA\r\nReferer: https://example.com\r\n"
+    assert cmd[cmd.index("-live_start_index") + 1] == "-3"
+    assert cmd[cmd.index("-i") + 1] == fmt["url"]
+    assert cmd[cmd.index("-segment_format") + 1] == "mpegts"
+    assert cmd[-1] == str(tmp_path / "100%% live") + ".part%03d.ts"
+
+    from_start = ytmd.LiveCapture("ffmpeg", fmt, base, from_start=True).command()
+    assert from_start[from_start.index("-live_start_index") + 1] == "0"
+    direct = ytmd.LiveCapture("ffmpeg", {"url": "https://example.com/a.ts"}, base).command()
+    assert "-live_start_index" not in direct and "-headers" not in direct
+
+
+def test_segments_are_ordered_numerically(ytmd, tmp_path):
+    for name in ("show.part010.ts", "show.part002.ts", "show.part1000.ts", "show.part000.ts",
+                 "other.part001.ts", "show.part001.ts.tmp", "show.part01.ts"):
+        (tmp_path / name).write_bytes(b"x")
+    capture = ytmd.LiveCapture("ffmpeg", {"url": "u"}, str(tmp_path / "show"))
+    assert [os.path.basename(path) for path in capture.segments()] == [
+        "show.part000.ts", "show.part002.ts", "show.part010.ts", "show.part1000.ts",
+    ]
+
+
+def test_finalize_keeps_segments_when_concat_fails(ytmd, tmp_path):
+    base = str(tmp_path / "show")
+    for n in range(2):
+        (tmp_path / f"show.part00{n}.ts").write_bytes(b"ts")
+    (tmp_path / "show.part002.ts").write_bytes(b"")
+    calls = []
+
+    def failing_run(cmd):
+        calls.append(cmd)
+        return "", "warning\nInvalid data found when processing input\n", 1
+
+    capture = ytmd.LiveCapture("ffmpeg", {"url": "u"}, base)
+    with pytest.raises(RuntimeError, match="Invalid data"):
+        capture.finalize(failing_run)
+    assert len(capture.segments()) == 3
+    assert not (tmp_path / "show.concat.txt").exists()
+    assert calls[0][calls[0].index("-f") + 1] == "concat"
+
+    def ok_run(cmd):
+        listing = open(cmd[cmd.index("-i") + 1][len("file:"):], encoding="utf-8").read()
+        assert listing.count("file '") == 2
+        return "", "", 0
+
+    assert capture.finalize(ok_run) == base + ".mp4"
+    assert capture.segments() == []
+
+
+def test_finalize_without_data_returns_none(ytmd, tmp_path):
+    (tmp_path / "show.part000.ts").write_bytes(b"")
+    capture = ytmd.LiveCapture("ffmpeg", {"url": "u"}, str(tmp_path / "show"))
+    assert capture.finalize(lambda cmd: pytest.fail("nothing to join")) is None
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = 0.0
+
+    def time(self):
+        return self.now
+
+    async def sleep(self, delay):
+        self.now += delay
+        self.slept += delay
+
+
+@pytest.fixture
+def premiere(window, monkeypatch):
+    clock = FakeClock()
+    extractions = []
+    submitted = []
+
+    async def run_blocking(fn, *args, timeout=None):
+        return extractions.pop(0)
+
+    real_network, real_pool = window.network, window.capture_pool
+    window.network = types.SimpleNamespace(loop=clock, run_blocking=run_blocking)
+    window.capture_pool = types.SimpleNamespace(submit=lambda *args: submitted.append(args))
+    monkeypatch.setattr(asyncio, "sleep", clock.sleep)
+    yield window, clock, extractions, submitted
+    window.network, window.capture_pool = real_network, real_pool
+
+
+def test_await_live_polls_until_the_premiere_starts(premiere):
+    window, clock, extractions, submitted = premiere
+    release = time.time() + 120
+    upcoming = {"live_status": "is_upcoming", "release_timestamp": release, "title": "P"}
+    live = {"live_status": "is_live", "title": "P"}
+    extractions.extend([dict(upcoming), live])
+    job_id = window.jobs.create("https://example.com/p", source="capture")
+
+    asyncio.run(window._await_live(job_id, "https://example.com/p", False, "/tmp", upcoming))
+
+    assert extractions == []
+    # Two polls, each sleeping until the announced start.
+    assert 235 <= clock.slept <= 245
+    assert [args[1:] for args in submitted] == [(job_id, "https://example.com/p", False, "/tmp", live)]
+
+
+def test_await_live_poll_interval_is_bounded(premiere):
+    window, clock, extractions, submitted = premiere
+    far = {"live_status": "is_upcoming", "release_timestamp": time.time() + 86400}
+    extractions.extend([dict(far), {"live_status": "is_live"}])
+    job_id = window.jobs.create("u", source="capture")
+    asyncio.run(window._await_live(job_id, "u", False, "/tmp", dict(far)))
+    assert clock.slept == pytest.approx(2 * window.PREMIERE_POLL_MAX)
+
+
+def test_cancelled_premiere_never_takes_a_capture_lane(premiere, monkeypatch):
+    window, clock, extractions, submitted = premiere
+    upcoming = {"live_status": "is_upcoming", "release_timestamp": time.time() + 600}
+    job_id = window.jobs.create("u", source="capture")
+    window.jobs.update(job_id, status="waiting_live")
+
+    real_sleep = clock.sleep
+
+    async def sleep_then_cancel(delay):
+        await real_sleep(delay)
+        window.jobs.cancel(job_id)
+
+    monkeypatch.setattr(asyncio, "sleep", sleep_then_cancel)
+    asyncio.run(window._await_live(job_id, "u", False, "/tmp", upcoming))
+
+    assert submitted == []
+    assert window.jobs.get(job_id)["status"] == "cancelled"
+
+
+def test_full_capture_lane_is_reported(premiere):
+    window, clock, extractions, submitted = premiere
+    logged = []
+    window.log_signal.connect(lambda text, level: logged.append((text, level)))
+    window._captures_busy = window.CAPTURE_WORKERS
+    job_id = window.jobs.create("u", source="capture")
+    asyncio.run(window._await_live(job_id, "u", False, "/tmp", {"live_status": "is_live", "title": "L"}))
+
+    assert len(submitted) == 1
+    assert window.jobs.get(job_id)["status"] == "queued"
+    assert any("錄製通道已滿" in text and level == "error" for text, level in logged)
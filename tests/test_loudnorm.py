@@ -0,0 +1,53 @@
+import json
+
+STATS = {
+    "input_i": "-23.1",
+    "input_tp": "-4.0",
+    "input_lra": "6.2",
+    "input_thresh": "-33.5",
+    "target_offset": "0.3",
+}
+
+
+class FakeTranscodes:
+    threads = 2
+
+    def __init__(self):
+        self.commands = []
+
+    def run(self, cmd):
+        self.commands.append(cmd)
+        if "null" in cmd:
+            return "", "[Parsed_loudnorm_0]\n" + json.dumps(STATS), 0
+        return "", "", 0
+
+
+def test_single_format_item_is_normalized(window, tmp_path):
+    spec = window._parse_format_options(["audio", "m4a", "", "", "", "", "loudnorm"])
+    item, text = window._build_item_data("https://youtu.be/abc", {"id": "abc", "title": "T"}, spec)
+    assert item["audio_targets"] == ("m4a",)
+    assert item["queue_key"] == "abc|audio|m4a|loudnorm"
+    assert "標準化" in text
+
+    source = tmp_path / "T.source.webm"
+    source.write_bytes(b"audio")
+    window.transcode_manager = FakeTranscodes()
+    window._get_ffmpeg_path = lambda: "ffmpeg"
+    outputs = window._fan_out_audio(
+        str(source), str(tmp_path / "T"), item["audio_targets"], item["loudnorm"], 1.0
+    )
+
+    assert outputs == [str(tmp_path / "T.m4a")]
+    measure, encode = window.transcode_manager.commands
+    assert "loudnorm=I=-16:TP=-1.5:LRA=11:print_format=json" in measure
+    graph = encode[encode.index("-filter_complex") + 1]
+    assert graph.startswith("[0:a]loudnorm=I=-16:TP=-1.5:LRA=11:measured_I=-23.1")
+    assert graph.endswith("asplit=1[a0]")
+
+
+def test_plain_audio_item_keeps_extract_audio(window):
+    spec = window._parse_format_options(["audio", "mp3"])
+    item, _ = window._build_item_data("https://youtu.be/abc", {"id": "abc", "title": "T"}, spec)
+    assert "audio_targets" not in item
+    assert item["queue_key"] == "abc|audio|mp3"
+
@@ -0,0 +1,71 @@
+import asyncio
+import http.server
+import threading
+import time
+
+import pytest
+
+
+def test_chunked_trailers_do_not_desync_keep_alive(ytmd):
+    response = (
+        b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+        b"5\r\nhello\r\n6;ext=1\r\n world\r\n0\r\nX-Checksum: abc\r\nX-Other: 1\r\n\r\n"
+    )
+
+    async def scenario():
+        connections = []
+
+        async def handle(reader, writer):
+            connections.append(writer)
+            try:
+                while True:
+                    await reader.readuntil(b"\r\n\r\n")
+                    writer.write(response)
+                    await writer.drain()
+            except (asyncio.IncompleteReadError, ConnectionError):
+                writer.close()
+
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/"
+        pool = ytmd.AsyncHTTPPool()
+        try:
+            first = await pool.get(url, 2.0)
+            second = await pool.get(url, 2.0)
+        finally:
+            pool.close()
+            server.close()
+            await server.wait_closed()
+        return first, second, len(connections)
+
+    first, second, connections = asyncio.run(scenario())
+    assert first[0] == second[0] == 200
+    assert first[2] == second[2] == b"hello world"
+    assert connections == 1
+
+
+class SlowPage(http.server.BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(0.3)
+        body = b"<html><head><title>slow</title></head><body>nothing</body></html>"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def test_extraction_stops_at_its_deadline(ytmd, window):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SlowPage)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/page"
+    try:
+        started = time.monotonic()
+        with pytest.raises(ytmd.ExtractionTimeout):
+            window._extract_for_analysis(url, 0.1)
+        assert time.monotonic() - started < 2
+    finally:
+        server.shutdown()
+        server.server_close()
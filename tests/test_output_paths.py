@@ -0,0 +1,59 @@
+import os
+
+
+def test_batch_gets_distinct_names_next_to_existing_files(ytmd, tmp_path):
+    (tmp_path / "Song.mp4").write_bytes(b"x")
+    planner = ytmd.OutputPathPlanner()
+    bases = planner.plan(
+        [(str(tmp_path), ["Song"], "a1"), (str(tmp_path), ["Song"], "b2"), (str(tmp_path), ["Song"], None)]
+    )
+    assert [os.path.basename(b) for b in bases] == ["Song [a1]", "Song [b2]", "Song (2)"]
+
+
+def test_render_sanitizes_fields_and_keeps_template_folders(ytmd):
+    planner = ytmd.OutputPathPlanner()
+    info = {"id": "x", "title": 'a/b: "c"?', "uploader": "CON"}
+    assert planner.render("%(uploader)s/%(title)s.%(ext)s", info, " [0-30]") == [
+        "_CON",
+        "a⧸b： ＂c＂？ [0-30]",
+    ]
+
+
+def test_instances_sharing_a_folder_claim_different_names(ytmd, tmp_path):
+    first, second = ytmd.OutputPathPlanner(), ytmd.OutputPathPlanner()
+    (mine,) = first.plan([(str(tmp_path), ["Song"], "a1")])
+    (theirs,) = second.plan([(str(tmp_path), ["Song"], "a1")])
+    assert mine != theirs
+    assert os.path.exists(mine + first.MARKER_SUFFIX)
+
+    first.release(mine)
+    second.release(theirs)
+    assert os.listdir(tmp_path) == []
+    (again,) = second.plan([(str(tmp_path), ["Song"], "a1")])
+    assert again == mine
+
+
+def test_claim_lost_to_another_instance_moves_to_next_name(ytmd, tmp_path):
+    planner = ytmd.OutputPathPlanner()
+    real_existing = planner._existing_stems
+
+    def listing_before_peer(folder):
+        stems = real_existing(folder)
+        # A peer creates its marker after this instance listed the folder.
+        (tmp_path / f"Song{planner.MARKER_SUFFIX}").write_bytes(b"")
+        return stems
+
+    planner._existing_stems = listing_before_peer
+    (base,) = planner.plan([(str(tmp_path), ["Song"], "a1")])
+    assert os.path.basename(base) == "Song [a1]"
+
+
+def test_windows_names_leave_room_for_job_suffixes(ytmd, tmp_path, monkeypatch):
+    planner = ytmd.OutputPathPlanner()
+    folder = str(tmp_path)
+    with monkeypatch.context() as patch:
+        patch.setattr(ytmd.os, "name", "nt")
+        name = planner._fit(folder, "x" * 300, " (2)")
+    longest = os.path.join(os.path.abspath(folder), name) + ".source.f251.webm.part"
+    assert name.endswith(" (2)")
+    assert len(longest) <= planner.MAX_PATH_CHARS
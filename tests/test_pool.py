@@ -0,0 +1,44 @@
+def test_format_selectors_are_cached_per_instance(ytmd):
+    pool = ytmd.YoutubeDLPool({"quiet": True}, size=2)
+    try:
+        with pool.acquire({"format": "bestvideo+bestaudio/best"}) as first:
+            with pool.acquire({"format": "bestvideo+bestaudio/best"}) as second:
+                assert first is not second
+                assert first.format_selector is not second.format_selector
+            reused_selector = first.format_selector
+        with pool.acquire({"format": "bestvideo+bestaudio/best"}) as again:
+            assert again.format_selector in (reused_selector, second.format_selector)
+            assert again.format_selector is again._pool_selectors[
+                ("bestvideo+bestaudio/best", None, None, None)
+            ]
+    finally:
+        pool.close()
+
+
+def test_selector_rebuilt_when_build_time_params_change(ytmd):
+    pool = ytmd.YoutubeDLPool({"quiet": True}, size=1)
+    try:
+        with pool.acquire({"format": "bv+ba"}) as ydl:
+            plain = ydl.format_selector
+        with pool.acquire({"format": "bv+ba", "allow_multiple_audio_streams": True}) as ydl:
+            assert ydl.format_selector is not plain
+        with pool.acquire({"format": "bv+ba"}) as ydl:
+            assert ydl.format_selector is plain
+    finally:
+        pool.close()
+
+
+def test_build_time_options_get_a_fresh_instance(ytmd):
+    pool = ytmd.YoutubeDLPool({"quiet": True}, size=1)
+    try:
+        with pool.acquire({"format": "best"}) as pooled:
+            pass
+        headers = {"User-Agent": "ytmd-test"}
+        with pool.acquire({"format": "best", "http_headers": headers}) as ydl:
+            assert ydl is not pooled
+            assert ydl.params["http_headers"]["User-Agent"] == "ytmd-test"
+        with pool.acquire({"format": "best", "quiet": True}) as ydl:
+            assert ydl is pooled
+        assert pool.stats["created"] == 2
+    finally:
+        pool.close()
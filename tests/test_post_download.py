@@ -0,0 +1,143 @@
+import pytest
+
+
+def move_into_library(ytmd, planner, library, source, info):
+    ctx = ytmd.PostDownloadContext(str(source), info)
+    ytmd.LibraryStep(str(library), "%(uploader)s", planner).run(ctx)
+    return ctx.path
+
+
+def test_library_move_never_overwrites_existing_file(ytmd, tmp_path):
+    planner = ytmd.OutputPathPlanner()
+    library = tmp_path / "library"
+    (library / "Band").mkdir(parents=True)
+    (library / "Band" / "Song.m4a").write_bytes(b"existing")
+    source = tmp_path / "Song.m4a"
+    source.write_bytes(b"new")
+
+    moved = move_into_library(ytmd, planner, library, source, {"id": "abc123", "uploader": "Band"})
+
+    assert moved == str(library / "Band" / "Song [abc123].m4a")
+    assert (library / "Band" / "Song.m4a").read_bytes() == b"existing"
+    assert (library / "Band" / "Song [abc123].m4a").read_bytes() == b"new"
+    assert not source.exists()
+
+
+def test_library_move_keeps_name_when_free_and_releases_reservation(ytmd, tmp_path):
+    planner = ytmd.OutputPathPlanner()
+    library = tmp_path / "library"
+    source = tmp_path / "Song.m4a"
+    source.write_bytes(b"new")
+
+    moved = move_into_library(ytmd, planner, library, source, {"id": "abc123", "uploader": "Band"})
+
+    assert moved == str(library / "Band" / "Song.m4a")
+    assert planner._reserved == set()
+
+
+def test_ffmetadata_text_escapes_values_and_writes_chapters(ytmd):
+    text = ytmd.ffmetadata_text(
+        {"title": "a=b; #1\\2", "album": None, "comment": "line\nbreak"},
+        [{"start_time": 0, "end_time": 61.5, "title": "Intro"}],
+    )
+    assert text.splitlines() == [
+        ";FFMETADATA1",
+        r"title=a\=b\; \#1\\2",
+        "comment=line\\",
+        "break",
+        "[CHAPTER]",
+        "TIMEBASE=1/1000",
+        "START=0",
+        "END=61500",
+        "title=Intro",
+    ]
+
+
+def test_tag_step_skips_chapters_for_clips(ytmd):
+    info = {
+        "title": "Song",
+        "uploader": "Band",
+        "upload_date": "20240131",
+        "chapters": [{"start_time": 0, "end_time": 10, "title": "A"}, {"start_time": 10}],
+    }
+    ctx = ytmd.PostDownloadContext("x.m4a", info)
+    ytmd.TagStep().run(ctx)
+    assert ctx.metadata == {"title": "Song", "artist": "Band", "date": "2024-01-31"}
+    assert [chapter["title"] for chapter in ctx.chapters] == ["A"]
+
+    clipped = ytmd.PostDownloadContext("x.m4a", info, clipped=True)
+    ytmd.TagStep().run(clipped)
+    assert clipped.chapters == []
+
+
+def tag_writer(ytmd, runs, returncode=0):
+    class Manager:
+        def run(self, cmd):
+            runs.append(cmd)
+            output = cmd[-1][len("file:"):]
+            with open(output, "wb") as f:
+                f.write(b"tagged")
+            return "", "boom", returncode
+
+    writer = ytmd.FFmpegTagWriter(Manager(), lambda: "ffmpeg", lambda: "ffprobe")
+    writer._stream_count = lambda path: 2
+    return writer
+
+
+@pytest.mark.parametrize("ext, expected", [
+    ("mkv", ["-attach", "COVER", "-metadata:s:2", "mimetype=image/jpeg"]),
+    ("mp3", ["-map", "2", "-disposition:2", "attached_pic", "-id3v2_version", "3"]),
+    ("m4a", ["-map", "2", "-disposition:2", "attached_pic"]),
+])
+def test_tag_writer_command_places_cover_per_container(ytmd, ext, expected):
+    writer = tag_writer(ytmd, [])
+    ctx = ytmd.PostDownloadContext(f"song.{ext}", {})
+    cmd = writer.command(ctx, "META", "COVER", f"out.{ext}", 2)
+    joined = " ".join(cmd)
+    assert " ".join(expected) in joined
+    assert cmd[-3:] == ["-c", "copy", f"file:out.{ext}"]
+    assert "-map_metadata 1 -map_chapters 1" in joined
+
+
+@pytest.mark.parametrize("returncode", [0, 1])
+def test_tag_writer_replaces_file_and_cleans_up(ytmd, tmp_path, returncode):
+    source = tmp_path / "song.m4a"
+    source.write_bytes(b"original")
+    runs = []
+    ctx = ytmd.PostDownloadContext(str(source), {})
+    ctx.metadata = {"title": "Song"}
+    ctx.cover = b"jpeg"
+
+    if returncode:
+        with pytest.raises(RuntimeError, match="boom"):
+            tag_writer(ytmd, runs, returncode).write(ctx)
+        assert source.read_bytes() == b"original"
+    else:
+        tag_writer(ytmd, runs).write(ctx)
+        assert source.read_bytes() == b"tagged"
+        assert not ctx.dirty
+    assert len(runs) == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["song.m4a"]
+
+
+def test_pipeline_writes_tags_before_moving_into_library(ytmd, tmp_path):
+    source = tmp_path / "Song.m4a"
+    source.write_bytes(b"original")
+    runs = []
+    pipeline = ytmd.PostDownloadPipeline(tag_writer(ytmd, runs), max_workers=1)
+    pipeline.register(ytmd.TagStep())
+    planner = ytmd.OutputPathPlanner()
+    pipeline.register(ytmd.LibraryStep(str(tmp_path / "library"), "%(uploader)s", planner))
+    try:
+        ctx = pipeline.submit(
+            str(source), {"id": "abc123", "title": "Song", "uploader": "Band"}, ["tags", "library"]
+        ).result(5)
+    finally:
+        pipeline.close()
+
+    assert ctx.notes == []
+    assert len(runs) == 1
+    assert runs[0][6] == f"file:{source}"
+    assert ctx.path == str(tmp_path / "library" / "Band" / "Song.m4a")
+    assert (tmp_path / "library" / "Band" / "Song.m4a").read_bytes() == b"tagged"
+    assert [label for label, _ in ctx.timings] == ["標籤", "寫入", "移入媒體庫"]
@@ -0,0 +1,87 @@
+import pytest
+from yt_dlp.utils import DownloadError
+
+
+def make_item(ytmd, **fields):
+    base = dict(
+        url="https://www.youtube.com/watch?v=abcdefghijk",
+        title="Video",
+        video_id="abcdefghijk",
+        is_audio_only=True,
+        format_param="mp3",
+        ext_param="mp3",
+        queue_key=("abcdefghijk", "audio"),
+    )
+    base.update(fields)
+    return ytmd.QueueItem(**base)
+
+
+def test_queue_item_is_immutable(ytmd):
+    item = make_item(ytmd)
+    with pytest.raises(AttributeError):
+        item.title = "Other"
+    with pytest.raises(AttributeError):
+        item.extra = 1
+    with pytest.raises(TypeError):
+        make_item(ytmd, unknown="x")
+
+
+def test_queue_item_maps_only_set_fields(ytmd):
+    item = make_item(ytmd, audio_targets=("mp3", "opus"))
+    assert item["title"] == "Video"
+    assert item.get("section") is None
+    assert "section" not in item
+    assert "is_audio_only" in item
+    with pytest.raises(KeyError):
+        item["loudnorm"]
+    with pytest.raises(KeyError):
+        item["__slots__"]
+    assert dict(item)["audio_targets"] == ("mp3", "opus")
+    assert len(item) == len(dict(item)) == 8
+    assert dict(make_item(ytmd, is_audio_only=False))["is_audio_only"] is False
+
+
+class FakeYDL:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+
+    def download(self, urls):
+        self.calls.append(("download", urls))
+
+    def process_ie_result(self, info, download):
+        self.calls.append(("process", info["id"]))
+        if self.fail:
+            raise DownloadError("expired")
+
+
+def cached_info():
+    return {
+        "id": "abcdefghijk",
+        "title": "Video",
+        "extractor": "youtube",
+        "extractor_key": "Youtube",
+        "webpage_url": "https://www.youtube.com/watch?v=abcdefghijk",
+        "formats": [{
+            "format_id": "140",
+            "ext": "m4a",
+            "acodec": "mp4a.40.2",
+            "vcodec": "none",
+            "url": "https://example.invalid/140?expire=4102444800",
+            "protocol": "https",
+        }],
+    }
+
+
+@pytest.mark.parametrize("cached, fail, expected", [
+    (False, False, [("download", ["URL"])]),
+    (True, False, [("process", "abcdefghijk")]),
+    (True, True, [("process", "abcdefghijk"), ("download", ["URL"])]),
+])
+def test_download_uses_resolved_info_when_cached(window, ytmd, cached, fail, expected):
+    item = make_item(ytmd, format_param="aac", ext_param="m4a")
+    if cached:
+        window.resolved_info.put("abcdefghijk", item["url"], cached_info())
+    ydl = FakeYDL(fail)
+    window._download_with_cached_info(ydl, "URL", item)
+    assert ydl.calls == expected
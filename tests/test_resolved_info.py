@@ -0,0 +1,46 @@
+def fake_info():
+    formats = [
+        {"format_id": "140", "ext": "m4a", "acodec": "mp4a.40.2", "vcodec": "none", "abr": 128},
+        {"format_id": "251", "ext": "webm", "acodec": "opus", "vcodec": "none", "abr": 160},
+        {"format_id": "18", "ext": "mp4", "acodec": "mp4a.40.2", "vcodec": "avc1", "height": 360},
+        {"format_id": "136", "ext": "mp4", "acodec": "none", "vcodec": "avc1", "height": 720},
+        {"format_id": "137", "ext": "mp4", "acodec": "none", "vcodec": "avc1", "height": 1080},
+        {"format_id": "248", "ext": "webm", "acodec": "none", "vcodec": "vp9", "height": 1080},
+    ]
+    for f in formats:
+        f["url"] = f"https://example.invalid/{f['format_id']}?expire=4102444800"
+        f["protocol"] = "https"
+    return {
+        "id": "abcdefghijk",
+        "title": "Video",
+        "extractor": "youtube",
+        "extractor_key": "Youtube",
+        "webpage_url": "https://www.youtube.com/watch?v=abcdefghijk",
+        "formats": formats,
+        "subtitles": {"en": [{"url": "https://example.invalid/subs"}]},
+    }
+
+
+SPEC = "bestvideo[height<=720][ext=mp4]+bestaudio[ext=m4a]/best[height<=720]"
+
+
+def test_trimmed_entry_keeps_what_the_spec_selects(ytmd):
+    cache = ytmd.ResolvedInfoCache()
+    cache.put("abcdefghijk", "https://www.youtube.com/watch?v=abcdefghijk", fake_info(), SPEC)
+
+    cached = cache.get("abcdefghijk", format_spec=SPEC)
+    assert sorted(f["format_id"] for f in cached["formats"]) == ["136", "140", "18"]
+    assert "subtitles" not in cached
+    assert cache.get("abcdefghijk", format_spec="bestaudio") is None
+
+    with ytmd.YoutubeDL({"quiet": True, "format": SPEC}) as ydl:
+        resolved = ydl.process_ie_result(cached, download=False)
+    assert resolved["format_id"] == "136+140"
+
+
+def test_untrimmed_entry_serves_any_spec(ytmd):
+    cache = ytmd.ResolvedInfoCache()
+    cache.put("abcdefghijk", "https://www.youtube.com/watch?v=abcdefghijk", fake_info())
+
+    assert len(cache.get("abcdefghijk", format_spec="bestaudio")["formats"]) == 6
+    assert cache.expiring(within=0) == []
@@ -0,0 +1,19 @@
+def test_command_line_scratch_is_not_saved(window, tmp_path):
+    saved = str(tmp_path / "saved")
+    window.set_scratch_directory(saved)
+    window.set_scratch_directory(str(tmp_path / "one-off"), persist=False)
+    assert window.scratch_dir == str(tmp_path / "one-off")
+    assert window.settings.value("scratch_path") == saved
+
+    window.set_scratch_directory(None)
+    assert window.settings.value("scratch_path") == ""
+
+
+def test_command_line_library_is_not_saved(window, tmp_path):
+    saved = str(tmp_path / "saved")
+    window.set_library_directory(saved)
+    window.set_library_directory(str(tmp_path / "one-off"), persist=False)
+    window.library_template_input.setText("%(channel)s")
+    window._on_library_template_changed()
+    assert window.library_dir == str(tmp_path / "one-off")
+    assert window.settings.value("library_path") == saved
@@ -0,0 +1,64 @@
+import asyncio
+
+FEED = b"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" xmlns="http://www.w3.org/2005/Atom">
+ <title>Channel</title>
+ <entry><yt:videoId>vid00000002</yt:videoId><title>Two</title><published>2026-01-02</published></entry>
+ <entry><yt:videoId>vid00000001</yt:videoId><title>One</title><published>2026-01-01</published></entry>
+</feed>"""
+
+
+async def serve_feed(requests, connections):
+    async def handle(reader, writer):
+        connections.append(writer)
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            requests.append(head.decode("latin-1").lower())
+            if b'if-none-match: "v1"' in head.lower():
+                writer.write(b'HTTP/1.1 304 Not Modified\r\nETag: "v1"\r\n\r\n')
+            else:
+                writer.write(
+                    b'HTTP/1.1 200 OK\r\nETag: "v1"\r\nContent-Type: application/atom+xml\r\n'
+                    + f"Content-Length: {len(FEED)}\r\n\r\n".encode()
+                    + FEED
+                )
+            await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+def test_conditional_poll_reuses_keep_alive_connection(ytmd, tmp_path):
+    async def scenario():
+        requests, connections, uploads = [], [], []
+        server = await serve_feed(requests, connections)
+        port = server.sockets[0].getsockname()[1]
+        pool = ytmd.AsyncHTTPPool()
+        store = ytmd.SubscriptionStore(str(tmp_path / "subscriptions.json"))
+        store.add("UCchannel", "https://example.invalid", "Channel", [])
+        store.update("UCchannel", feed_url=f"http://127.0.0.1:{port}/feed")
+        poller = ytmd.SubscriptionPoller(
+            store,
+            lambda url, headers: pool.get(url, 2.0, headers=headers),
+            lambda sub, entry: uploads.append(entry["id"]),
+        )
+        try:
+            first = await poller.poll()
+            second = await poller.poll()
+        finally:
+            pool.close()
+            server.close()
+            await server.wait_closed()
+        return first, second, requests, connections, uploads, store.get("UCchannel")
+
+    first, second, requests, connections, uploads, sub = asyncio.run(scenario())
+    assert first["failed"] == [] and second["failed"] == []
+    assert second["not_modified"] == 1
+    assert 'if-none-match: "v1"' in requests[1]
+    assert len(connections) == 1
+    assert uploads == []
+    assert sub["etag"] == '"v1"'
+    assert sub["seen"] == ["vid00000002", "vid00000001"]
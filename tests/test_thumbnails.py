@@ -0,0 +1,38 @@
+import pytest
+
+
+def encoded_image(ytmd, width, height):
+    image = ytmd.QImage(width, height, ytmd.QImage.Format_RGB32)
+    image.fill(0x3366CC)
+    data = ytmd.QByteArray()
+    buffer = ytmd.QBuffer(data)
+    buffer.open(ytmd.QIODevice.WriteOnly)
+    image.save(buffer, "PNG")
+    buffer.close()
+    return bytes(data)
+
+
+@pytest.mark.parametrize("source, expected", [
+    ((1280, 720), (160, 90)),
+    ((400, 400), (90, 90)),
+    ((90, 180), (45, 90)),
+])
+def test_decode_thumbnail_scales_into_the_box(ytmd, qapp, source, expected):
+    image = ytmd.decode_thumbnail(encoded_image(ytmd, *source), 160, 90)
+    assert (image.width(), image.height()) == expected
+
+
+def test_decode_thumbnail_rejects_garbage(ytmd, qapp):
+    assert ytmd.decode_thumbnail(b"not an image", 160, 90) is None
+
+
+def test_thumbnail_cache_evicts_least_recently_used(ytmd):
+    cache = ytmd.ThumbnailCache(capacity=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert cache.get("b") is None
+    assert len(cache) == 2
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
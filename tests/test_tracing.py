@@ -0,0 +1,96 @@
+import json
+import threading
+import time
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["traceEvents"]
+
+
+def test_disabled_tracer_records_nothing(ytmd, tmp_path):
+    tracer = ytmd.Tracer()
+    with tracer.span("idle"):
+        pass
+    tracer.counter("workers", limit=1)
+    assert tracer.stop(tmp_path / "trace.json") == 0
+
+
+def test_tracer_writes_chrome_trace_events(ytmd, tmp_path):
+    tracer = ytmd.Tracer()
+    tracer.start()
+    with tracer.span("job.download", video_id="abc"):
+        time.sleep(0.01)
+    with tracer.async_span("thumbnail.fetch"):
+        pass
+    tracer.counter("workers", limit=2)
+    worker = threading.Thread(target=lambda: tracer.begin("worker.run"), name="download-1")
+    worker.start()
+    worker.join()
+    path = tmp_path / "trace.json"
+    assert tracer.stop(path) == 5
+    assert not tracer.enabled
+
+    events = load(path)
+    phases = [event["ph"] for event in events if event["ph"] != "M"]
+    assert phases == ["X", "b", "e", "C", "B"]
+    span = next(event for event in events if event["ph"] == "X")
+    assert span["name"] == "job.download"
+    assert span["args"] == {"video_id": "abc"}
+    assert span["dur"] >= 10_000
+    begin, end = (event for event in events if event["ph"] in "be")
+    assert begin["id"] == end["id"]
+    names = {event["args"]["name"] for event in events if event["name"] == "thread_name"}
+    assert {"download-1", threading.current_thread().name} <= names
+
+
+def test_tracer_drops_events_past_the_cap(ytmd, tmp_path):
+    tracer = ytmd.Tracer()
+    tracer.MAX_EVENTS = 3
+    tracer.start()
+    for _ in range(5):
+        tracer.counter("tick", n=1)
+    assert tracer.stop(tmp_path / "trace.json") == 3
+    assert tracer.dropped == 2
+
+
+def test_traced_decorator_uses_the_global_tracer(ytmd, tmp_path):
+    @ytmd.traced("helper.work", "ui")
+    def work(value):
+        return value * 2
+
+    assert work(2) == 4
+    ytmd.TRACER.start()
+    try:
+        assert work(3) == 6
+    finally:
+        ytmd.TRACER.stop(tmp_path / "trace.json")
+    spans = [event for event in load(tmp_path / "trace.json") if event["ph"] == "X"]
+    assert [(event["name"], event["cat"]) for event in spans] == [("helper.work", "ui")]
+
+
+def spin_in_profiled_function(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampling_profiler_writes_folded_stacks(ytmd, tmp_path):
+    stop = threading.Event()
+    busy = threading.Thread(target=spin_in_profiled_function, args=(stop,), name="busy-worker")
+    busy.start()
+    profiler = ytmd.SamplingProfiler(interval=0.001)
+    profiler.start()
+    time.sleep(0.1)
+    path = tmp_path / "profile.folded"
+    samples = profiler.stop(path)
+    stop.set()
+    busy.join()
+
+    assert samples > 0
+    lines = path.read_text(encoding="utf-8").splitlines()
+    _, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+    busy_stacks = [line for line in lines if line.startswith("busy-worker;")]
+    assert busy_stacks
+    assert any("spin_in_profiled_function (test_tracing.py:" in line for line in busy_stacks)
+    assert not any("ytmd-profiler" in line for line in lines)
@@ -0,0 +1,76 @@
+import os
+import sys
+import threading
+
+import pytest
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="uses a POSIX script as ffmpeg")
+
+FAKE_FFMPEG = """#!{python}
+import sys, time
+end = time.process_time() + {burn}
+while time.process_time() < end:
+    pass
+print(" ".join(sys.argv[1:]))
+"""
+
+
+def fake_ffmpeg(tmp_path, burn=0.3):
+    path = tmp_path / "ffmpeg"
+    path.write_text(FAKE_FFMPEG.format(python=sys.executable, burn=burn))
+    path.chmod(0o755)
+    return str(path)
+
+
+def test_run_limits_threads_and_reports_child_cpu_time(ytmd, tmp_path):
+    completed = []
+    manager = ytmd.TranscodeManager(
+        workers=1, on_complete=lambda *entry: completed.append(entry)
+    )
+    stdout, stderr, returncode = manager.run([fake_ffmpeg(tmp_path), "-i", "in.webm", "out.mp3"])
+
+    assert returncode == 0 and stderr == ""
+    assert stdout.split() == ["-i", "in.webm", "-threads", str(manager.threads), "out.mp3"]
+    (_, wall, cpu_times, threads), = completed
+    assert cpu_times is not None and sum(cpu_times) >= 0.25
+    assert wall >= sum(cpu_times) * 0.5
+    assert manager.active == 0
+
+
+def test_overlapping_transcodes_do_not_claim_shared_cpu_time(ytmd, tmp_path):
+    completed = []
+    manager = ytmd.TranscodeManager(
+        workers=2, on_complete=lambda *entry: completed.append(entry)
+    )
+    manager.cpu_count = max(manager.cpu_count, 2)
+    manager.configure(2)
+    ffmpeg = fake_ffmpeg(tmp_path)
+    threads = [
+        threading.Thread(target=manager.run, args=([ffmpeg, "-i", f"{n}.webm", f"{n}.mp3"],))
+        for n in range(2)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [entry[2] for entry in completed] == [None, None]
+
+
+def test_install_routes_only_popen_run(ytmd, tmp_path, monkeypatch):
+    from yt_dlp.postprocessor import ffmpeg as ffmpeg_pp
+    from yt_dlp.utils import Popen
+
+    monkeypatch.setattr(ffmpeg_pp, "Popen", ffmpeg_pp.Popen)
+    completed = []
+    manager = ytmd.TranscodeManager(on_complete=lambda *entry: completed.append(entry))
+    manager.install()
+
+    assert issubclass(ffmpeg_pp.Popen, Popen)
+    assert "_try_wait" not in vars(ffmpeg_pp.Popen) and "wait" not in vars(ffmpeg_pp.Popen)
+    stdout, _, _ = ffmpeg_pp.Popen.run(
+        [fake_ffmpeg(tmp_path, 0), "-i", "a", "b"], text=True, stdout=-1, stderr=-1, stdin=-1
+    )
+    assert "-threads" in stdout
+    ffmpeg_pp.Popen.run([sys.executable, "-c", "pass"], stdout=-1, stderr=-1)
+    assert len(completed) == 1
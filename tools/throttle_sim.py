@@ -0,0 +1,198 @@
+"""Throttling CDN simulator for AdaptiveConcurrency.
+
+Serves fixed-size files from a local HTTP server that caps each connection
+and the total bandwidth, and answers 429 above a connection limit, then
+downloads a batch through the app's AdaptiveConcurrency gate the same way
+_start_batch_download does.
+
+    python tools/throttle_sim.py --per-conn 4 --total 40 --max-conn 4
+    python tools/throttle_sim.py --fixed 6   # compare with a fixed limit
+"""
+
+import argparse
+import collections
+import http.server
+import importlib.util
+import pathlib
+import socketserver
+import threading
+import time
+import urllib.error
+import urllib.request
+
+APP_PATH = pathlib.Path(__file__).resolve().parents[1] / "YT Media Downloader.py"
+CHUNK = 64 * 1024
+
+
+def load_app():
+    spec = importlib.util.spec_from_file_location("yt_media_downloader", APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class ThrottlingCDN(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, per_conn, total, max_conn, size):
+        super().__init__(("127.0.0.1", 0), ThrottlingHandler)
+        self.per_conn = per_conn
+        self.total = total
+        self.max_conn = max_conn
+        self.size = size
+        self.active = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._tokens = 0.0
+        self._refilled = time.monotonic()
+
+    def take(self, n):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.total * 0.05, self._tokens + (now - self._refilled) * self.total
+                )
+                self._refilled = now
+                if self._tokens >= n:
+                    self._tokens -= n
+                    return
+            time.sleep(0.002)
+
+
+class ThrottlingHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        cdn = self.server
+        with cdn._lock:
+            if cdn.max_conn and cdn.active >= cdn.max_conn:
+                cdn.rejected += 1
+                self.send_response(429)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            cdn.active += 1
+        try:
+            self.send_response(200)
+            self.send_header("Content-Length", str(cdn.size))
+            self.end_headers()
+            started, sent, buf = time.monotonic(), 0, b"\0" * CHUNK
+            while sent < cdn.size:
+                cdn.take(CHUNK)
+                ahead = sent / cdn.per_conn - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+                self.wfile.write(buf)
+                sent += CHUNK
+        except ConnectionError:
+            pass
+        finally:
+            with cdn._lock:
+                cdn.active -= 1
+
+
+def fetch(controller, url, key, retries=4):
+    for _ in range(retries):
+        try:
+            with urllib.request.urlopen(url, timeout=30) as response:
+                got, started = 0, time.monotonic()
+                while True:
+                    block = response.read(256 * 1024)
+                    if not block:
+                        break
+                    got += len(block)
+                    controller.record_progress(
+                        key, got, got / max(time.monotonic() - started, 1e-3)
+                    )
+            controller.forget(key)
+            return
+        except urllib.error.HTTPError as e:
+            if e.code != 429:
+                raise
+            # yt-dlp retries and logs a warning that ThrottleLogger reports.
+            controller.record_throttle()
+            time.sleep(1)
+    raise RuntimeError("HTTP Error 429: Too Many Requests")
+
+
+def run(app, args):
+    cdn = ThrottlingCDN(
+        args.per_conn * 1e6, args.total * 1e6, args.max_conn, int(args.size * 1e6)
+    )
+    threading.Thread(target=cdn.serve_forever, daemon=True).start()
+    port = cdn.server_address[1]
+    controller = app.AdaptiveConcurrency(
+        minimum=args.fixed or 1,
+        maximum=args.fixed or args.max_workers,
+        initial=args.fixed or 1,
+    )
+    controller.INTERVAL = args.interval
+    pending = collections.deque(range(args.jobs))
+    pending_lock = threading.Lock()
+    finished = threading.Event()
+    failed = []
+
+    def worker():
+        while True:
+            with pending_lock:
+                if not pending:
+                    return
+                index = pending.popleft()
+            try:
+                with controller.transfer():
+                    fetch(controller, f"http://127.0.0.1:{port}/f{index}", index)
+            except Exception:
+                failed.append(index)
+
+    def monitor():
+        while not finished.wait(controller.INTERVAL):
+            with pending_lock:
+                remaining = len(pending)
+            decision = controller.tick(remaining + controller.waiting)
+            if decision["action"] != "hold":
+                print(
+                    f"  {decision['previous']} -> {decision['limit']} {decision['action']:8}"
+                    f" {decision['throughput'] / 1e6:6.1f} MB/s"
+                    f" per-job {decision['per_job'] / 1e6:5.1f}"
+                    f" throttled {decision['throttled']} ({decision['reason']})"
+                )
+
+    started = time.monotonic()
+    threading.Thread(target=monitor, daemon=True).start()
+    workers = [threading.Thread(target=worker) for _ in range(controller.maximum)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    finished.set()
+    elapsed = time.monotonic() - started
+    cdn.shutdown()
+
+    done = args.jobs - len(failed)
+    print(
+        f"failed {len(failed)}/{args.jobs}; {done * args.size:.0f} MB in {elapsed:.1f}s"
+        f" = {done * args.size / elapsed:.1f} MB/s; 429 responses {cdn.rejected}"
+    )
+    print("limit", controller.sparkline("limit"))
+    print("tput ", controller.sparkline("throughput"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--per-conn", type=float, default=4, help="MB/s per connection")
+    parser.add_argument("--total", type=float, default=40, help="MB/s across all connections")
+    parser.add_argument("--max-conn", type=int, default=4, help="connections before 429 (0 = none)")
+    parser.add_argument("--size", type=float, default=8, help="MB per file")
+    parser.add_argument("--jobs", type=int, default=60)
+    parser.add_argument("--max-workers", type=int, default=6)
+    parser.add_argument("--fixed", type=int, default=0, help="fixed limit instead of adaptive")
+    parser.add_argument("--interval", type=float, default=1.0, help="controller tick seconds")
+    run(load_app(), parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()